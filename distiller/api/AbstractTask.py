@@ -2,6 +2,7 @@ import json
 
 from distiller.helpers.extend import extend
 from distiller.api.DynamicClass import DynamicClass, class_id
+from distiller.api.SpiritId import SpiritId
 
 
 def parameter_id(parameters):
@@ -19,6 +20,9 @@ class AbstractTask(DynamicClass):
         self.parameters = self.default_parameters()
         extend(self.parameters, self.manual_parameters)
 
+        # Created on first use, parameters must not be changed afterwards
+        self.__spirit_id = None
+
     def default_parameters(self):
         """Returns a list of default parameters.
         Those values should be static to avoid side effects.
@@ -37,22 +41,25 @@ class AbstractTask(DynamicClass):
         This should always return the same value
         """
 
-        return spirit_id_to_label(self.name(), self.parameters)
+        return self.spirit_id().label
 
     def spirit_id(self):
-        return self.name(), self.parameters
+        if self.__spirit_id is None:
+            self.__spirit_id = SpiritId((self.name(), self.parameters))
+
+        return self.__spirit_id
 
     def parameter_id(self):
-        return parameter_id(self.parameters)
+        return self.spirit_id().parameter_id
 
     def __repr__(self):
         return self.label()
 
     def __hash__(self):
-        return hash(self.label())
+        return hash(self.spirit_id())
 
     def __eq__(self, other):
-        return self.name() == other.name() and self.parameters == other.parameters
+        return self.spirit_id() == other.spirit_id()
 
     def requires(self):
         """Should return a list of tasks as dependencies, use [] or None for no dependency.
@@ -85,6 +92,21 @@ class AbstractTask(DynamicClass):
         """
         return 1
 
+    def definition_files(self):
+        """This returns a list of file names (relative to the still directory) besides `definition.py`
+        the results of the still depend on, e.g. the script executed by its runner.
+        Together with the definition, those files make up the fingerprint of the still.
+        If the fingerprint changes, all casks of the still are considered expired.
+        """
+        return []
+
+    def shared_modules(self):
+        """This returns a list of paths (relative to the task root) of files or directories outside of the still
+        directory the still needs to be executed, e.g. a module shared by several stills.
+        Those are sent to workers together with the still definition.
+        """
+        return []
+
     def locks(self):
         """This returns a list of strings, each indicating an ID for a lock.
         A lock manages external dependencies (e.g. a crawler of a specific web site) by disallowing
@@ -25,6 +25,16 @@ class DataDriver(DynamicClass):
 
         raise NotImplementedError
 
+    def cask_size(self, spirit, config):
+        """Returns the size of the cask of a specific spirit in bytes, None if it is unknown
+
+        Arguments:
+        spirit -- The spirit to get the cask size of
+        config -- System configuration
+        """
+
+        return None
+
     def delete_cask(self, spirit, config):
         """Delete the cask of a specific spirit.
 
@@ -0,0 +1,99 @@
+import json
+import hashlib
+import threading
+import collections
+
+
+class SpiritId(tuple):
+    """Identity of a spirit as a tuple (still id, parameters)
+
+    The parameters are canonicalised only once: label, hash and parameter id are computed on creation,
+    the storage digests on first use. Spirit ids are compared by their label, the parameters must not be
+    modified afterwards.
+
+    Spirit ids are interned, i.e. `SpiritId(spirit_id)` returns the existing instance for the same spirit
+    (for the last `max_interned` spirits), and a spirit id is returned as is.
+    """
+
+    max_interned = 100000
+
+    # (Still id, parameter id) -> spirit id, in order of last use
+    interned = collections.OrderedDict()
+    lock = threading.Lock()
+
+    def __new__(cls, spirit_id):
+        if isinstance(spirit_id, SpiritId):
+            return spirit_id
+
+        still_id, parameters = spirit_id
+        parameter_id = json.dumps(parameters, sort_keys=True)
+        key = (still_id, parameter_id)
+
+        with cls.lock:
+            instance = cls.interned.get(key, None)
+
+            if instance is not None:
+                cls.interned.move_to_end(key)
+                return instance
+
+            instance = super().__new__(cls, (still_id, parameters))
+            instance.still_id = still_id
+            instance.parameters = parameters
+            instance.parameter_id = parameter_id
+            instance.label = "%s(%s)" % key
+            instance.label_hash = hash(instance.label)
+            instance.__parameter_digest = None
+            instance.__label_digest = None
+
+            cls.interned[key] = instance
+
+            while len(cls.interned) > cls.max_interned:
+                cls.interned.popitem(last=False)
+
+            return instance
+
+    @property
+    def parameter_digest(self):
+        """SHA-256 hex digest of the parameter id"""
+
+        if self.__parameter_digest is None:
+            self.__parameter_digest = hashlib.sha256(self.parameter_id.encode("utf-8")).hexdigest()
+
+        return self.__parameter_digest
+
+    @property
+    def label_digest(self):
+        """SHA-256 hex digest of the label"""
+
+        if self.__label_digest is None:
+            self.__label_digest = hashlib.sha256(self.label.encode("utf-8")).hexdigest()
+
+        return self.__label_digest
+
+    def __hash__(self):
+        return self.label_hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+
+        if isinstance(other, SpiritId):
+            return self.label_hash == other.label_hash and self.label == other.label
+
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return self.label
+
+    def __reduce__(self):
+        # Interned again on unpickling
+        return SpiritId, (tuple(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
@@ -28,6 +28,13 @@ class Writer:
         """Commits the change. Write operations after this lead to an error"""
         raise NotImplementedError
 
+    def digest(self):
+        """Returns a digest (hex string) of the whole cask content after commit, None if it is unknown.
+        Casks with the same digest are considered to have the same content
+        (e.g. dependents do not need to be rebuilt if none of their input digests changed).
+        """
+        return None
+
     def open(self):
         return self.__enter__()
 
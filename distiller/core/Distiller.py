@@ -1,6 +1,6 @@
+import importlib
 import os
 
-from distiller.core.impl.HttpServer import HttpServer
 from distiller.core.impl.CoreHandler import CoreHandler
 
 
@@ -10,7 +10,10 @@ class Distiller:
         self.logger = self.env.logger.claim("Core")
         self.shutdown = False
 
-        self.srv = HttpServer(CoreHandler(), self.env)
+        server_module = importlib.import_module(
+            self.env.config.get("distiller.server.module", "distiller.core.impl.HttpServer")
+        )
+        self.srv = server_module.module_class(CoreHandler(), self.env)
         self.pidfile = self.env.config.get("distiller.pidfile", path=True)
 
     def is_running(self):
@@ -61,6 +64,9 @@ class Distiller:
         # Stop watchdog (non-blocking)
         self.env.watchdog.stop()
 
+        # Write pending cask updates and close meta db
+        self.env.meta.close()
+
         os.remove(self.pidfile)
 
         self.logger.notice("Daemon shutdown done")
@@ -0,0 +1,174 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import http.client
+import io
+import threading
+
+from distiller.helpers.BufferedRequestHandler import BufferedRequestHandler
+from distiller.helpers.HttpRequestHandler import HttpRequestHandler
+
+
+class AsyncHttpServer:
+    """HTTP/1.1 server with keep-alive connections on an asyncio event loop
+
+    Connections are handled on the event loop, while the handlers of the `RequestHandler` routes
+    are blocking and run on a pool of at most `distiller.server.max_concurrent_requests` threads.
+    Further requests wait on the event loop until a thread is free.
+    Idle connections are closed after `distiller.server.keep_alive_timeout` seconds.
+    """
+
+    max_header_length = 64 * 1024
+    backlog = 1024
+
+    # Requests are handled concurrently, e.g. requests waiting for jobs do not block others
+    concurrent_requests = True
+
+    def __init__(self, request_handler, env):
+        self.env = env
+        self.request_handler = request_handler
+        self.logger = self.env.logger.claim("HttpServer")
+
+        self.max_concurrent_requests = self.env.config.get("distiller.server.max_concurrent_requests", 32)
+        self.keep_alive_timeout = self.env.config.get("distiller.server.keep_alive_timeout", 60)
+
+        self.loop = None
+        self.server = None
+        self.executor = None
+        self.thread = None
+        self.connections = set()
+
+        # Bound port, e.g. if the configured port is 0
+        self.port = None
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_requests)
+
+        self.server = self.loop.run_until_complete(asyncio.start_server(
+            self.__accept,
+            self.env.config.get("distiller.socket.ip"),
+            self.env.config.get("distiller.socket.port"),
+            limit=self.max_header_length,
+            backlog=self.backlog
+        ))
+        self.port = self.server.sockets[0].getsockname()[1]
+
+        self.thread = threading.Thread(target=self.__run_thread)
+        self.thread.start()
+
+    def __run_thread(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def stop(self):
+        if self.server is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(self.__shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+        self.loop.close()
+        self.executor.shutdown(wait=False)
+        self.server = None
+
+    async def __shutdown(self):
+        self.server.close()
+
+        # Close open (e.g. idle keep-alive) connections first, since wait_closed waits for them (Python 3.12+)
+        connections = list(self.connections)
+
+        for connection in connections:
+            connection.cancel()
+
+        await asyncio.gather(*connections, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def __accept(self, reader, writer):
+        connection = self.loop.create_task(self.__serve(reader, writer))
+        self.connections.add(connection)
+        connection.add_done_callback(self.connections.discard)
+
+    async def __serve(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.keep_alive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    # Connection closed by the client or idle
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(self.__error(431))
+                    break
+
+                try:
+                    request_line, header_lines = head.split(b"\r\n", 1)
+                    command, path, request_version = request_line.decode("latin-1").split(" ")
+                    headers = http.client.parse_headers(io.BytesIO(header_lines))
+                    content_length = int(headers.get("content-length", 0))
+                except ValueError:
+                    writer.write(self.__error(400))
+                    break
+
+                if content_length > HttpRequestHandler.max_length:
+                    writer.write(self.__error(413))
+                    break
+
+                body = await reader.readexactly(content_length) if content_length > 0 else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if request_version == "HTTP/1.1" else connection == "keep-alive"
+
+                handle = BufferedRequestHandler(self, command, path, request_version, headers, body)
+
+                writer.write(await self.loop.run_in_executor(self.executor, self.__handle, handle, keep_alive))
+
+                try:
+                    await writer.drain()
+
+                    if handle.pending_file is not None:
+                        await self.__send_file(writer, handle.pending_file)
+                finally:
+                    handle.close_file()
+
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def __send_file(self, writer, file):
+        if hasattr(self.loop, "sendfile"):
+            # Zero-copy with os.sendfile where the transport supports it (Python 3.7+)
+            await self.loop.sendfile(writer.transport, file)
+            return
+
+        while True:
+            chunk = await self.loop.run_in_executor(self.executor, file.read, 1024 * 1024)
+
+            if len(chunk) == 0:
+                break
+
+            writer.write(chunk)
+            await writer.drain()
+
+    def __handle(self, handle, keep_alive):
+        """Run the handler of a request (on the thread pool), returns the serialized response"""
+
+        try:
+            handle.handle()
+        except Exception as e:
+            self.logger.error("Request %s %s failed: %s" % (handle.command, handle.path, e))
+            handle.error(500)
+
+        return handle.response(keep_alive)
+
+    def __error(self, code):
+        handle = BufferedRequestHandler(self, None, None, None, None, b"")
+        handle.error(code)
+
+        return handle.response(False)
+
+
+module_class = AsyncHttpServer
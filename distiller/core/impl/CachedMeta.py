@@ -0,0 +1,281 @@
+import importlib
+import datetime
+from threading import Lock, Event, Thread
+
+from ..interfaces.Meta import Meta
+from distiller.api.SpiritId import SpiritId
+
+
+class CachedMeta(Meta):
+    """Meta decorator keeping all cask information in memory.
+
+    All casks are loaded from the backend (`meta.backend`) at startup, cask lookups are served from memory.
+    If `meta.max_staleness` (seconds) is set, the casks are reloaded from the backend once the cache
+    is older than that, e.g. if another process writes to the same meta db.
+
+    Cask updates are applied to the cache directly and written to the backend in groups
+    at most `meta.flush_interval` seconds later (or written through if it is not set, or once the cache is closed).
+    Invalidations are always written through.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.logger = self.env.logger.claim("Meta Cache")
+
+        backend_module = importlib.import_module(self.env.config.get("meta.backend", "distiller.core.impl.SQLiteMeta"))
+        self.backend = backend_module.module_class(self.env)
+
+        self.max_staleness = self.env.config.get("meta.max_staleness", None)
+        self.flush_interval = self.env.config.get("meta.flush_interval", None)
+
+        self.lock = Lock()
+        self.casks = {}
+        self.loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+        # Cask updates not yet written to the backend (label -> cask), flushes are serialized by flush_lock
+        self.pending = {}
+        self.flushing = {}
+        self.flush_lock = Lock()
+        self.flush_count = 0
+        self.flush_event = Event()
+        self.flush_thread = None
+        self.closed = False
+
+        with self.lock:
+            self.__load()
+
+        self.logger.notice("%i casks loaded into cache" % len(self.casks))
+
+    def get_cask(self, spirit_id):
+        with self.lock:
+            self.__revalidate()
+
+            cask = self.__lookup(SpiritId(spirit_id).label)
+
+            if cask is None:
+                return None
+
+            return dict(cask)
+
+    def get_casks(self, spirit_ids):
+        with self.lock:
+            self.__revalidate()
+
+            casks = [self.__lookup(SpiritId(spirit_id).label) for spirit_id in spirit_ids]
+
+            return [None if cask is None else dict(cask) for cask in casks]
+
+    def get_all_casks(self):
+        with self.lock:
+            self.__revalidate()
+            self.hits += 1
+
+            return [dict(cask) for cask in self.casks.values()]
+
+    def update_cask(self, spirit_id, completion=None, digest=None, input_digests=None, fingerprint=None):
+        self.update_casks(
+            [spirit_id],
+            completion=completion,
+            digests=[digest],
+            input_digests=[input_digests],
+            fingerprints=[fingerprint]
+        )
+
+    def update_casks(
+            self, spirit_ids, completion=None, completions=None, digests=None, input_digests=None, fingerprints=None
+    ):
+        if completions is None:
+            if completion is None:
+                completion = datetime.datetime.now()
+
+            completions = [completion] * len(spirit_ids)
+
+        if digests is None:
+            digests = [None] * len(spirit_ids)
+
+        if input_digests is None:
+            input_digests = [None] * len(spirit_ids)
+
+        if fingerprints is None:
+            fingerprints = [None] * len(spirit_ids)
+
+        casks = {
+            SpiritId(spirit_id).label: {
+                "spirit_id": spirit_id,
+                "last_completion": spirit_completion,
+                "digest": digest,
+                "input_digests": spirit_inputs,
+                "fingerprint": fingerprint
+            }
+            for spirit_id, spirit_completion, digest, spirit_inputs, fingerprint in zip(
+                spirit_ids, completions, digests, input_digests, fingerprints
+            )
+        }
+
+        with self.lock:
+            # Nothing flushes pending updates after close, checked under the lock so the final flush sees them
+            write_through = self.flush_interval is None or self.closed
+
+            if write_through:
+                self.__write(list(casks.values()))
+                self.casks.update(casks)
+            else:
+                self.casks.update(casks)
+                self.pending.update(casks)
+
+        if not write_through and self.flush_thread is None:
+            self.__start_flush_thread()
+
+    def invalidate_cask(self, spirit_id):
+        with self.flush_lock:
+            self.__flush()
+
+            with self.lock:
+                try:
+                    self.backend.invalidate_cask(spirit_id)
+                finally:
+                    # Backend raises if the cask does not exist (anymore), so it must not be cached either
+                    self.casks.pop(SpiritId(spirit_id).label, None)
+
+    def invalidate_casks(self, spirit_ids):
+        with self.flush_lock:
+            self.__flush()
+
+            with self.lock:
+                try:
+                    return self.backend.invalidate_casks(spirit_ids)
+                finally:
+                    for spirit_id in spirit_ids:
+                        self.casks.pop(SpiritId(spirit_id).label, None)
+
+    def add_execution(self, execution):
+        return self.backend.add_execution(execution)
+
+    def get_executions(self, **kwargs):
+        return self.backend.get_executions(**kwargs)
+
+    def compact_executions(self):
+        return self.backend.compact_executions()
+
+    def get_scheduled_infos(self):
+        return self.backend.get_scheduled_infos()
+
+    def remove_scheduled_spirit(self, spirit_id):
+        return self.backend.remove_scheduled_spirit(spirit_id)
+
+    def add_scheduled_spirit(self, schedule_info):
+        return self.backend.add_scheduled_spirit(schedule_info)
+
+    def flush(self):
+        with self.flush_lock:
+            self.__flush()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+
+        self.flush_event.set()
+
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+
+        self.flush()
+        self.backend.close()
+
+    def stats(self):
+        with self.lock:
+            accesses = self.hits + self.misses
+
+            return {
+                "casks": len(self.casks),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / accesses if accesses > 0 else None,
+                "reloads": self.reloads,
+                "staleness": (datetime.datetime.now() - self.loaded_at).total_seconds(),
+                "pending": len(self.pending),
+                "flushes": self.flush_count
+            }
+
+    def __revalidate(self):
+        """Reload the casks if the cache is older than max_staleness, lock has to be held"""
+
+        if self.max_staleness is not None and \
+                datetime.datetime.now() - self.loaded_at > datetime.timedelta(seconds=self.max_staleness):
+            self.reloads += 1
+            self.__load()
+
+    def __lookup(self, label):
+        """Cached cask of label or None if it is not cached, lock has to be held"""
+
+        cask = self.casks.get(label, None)
+
+        if cask is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return cask
+
+    def __load(self):
+        self.casks = {
+            SpiritId(cask["spirit_id"]).label: cask
+            for cask in self.backend.get_all_casks()
+        }
+
+        # Pending updates are newer than anything the backend knows about
+        self.casks.update(self.flushing)
+        self.casks.update(self.pending)
+        self.loaded_at = datetime.datetime.now()
+
+    def __flush(self):
+        """Write all pending updates with one backend request, flush_lock has to be held"""
+
+        with self.lock:
+            casks = self.flushing = self.pending
+            self.pending = {}
+
+        if len(casks) == 0:
+            return
+
+        try:
+            self.__write(list(casks.values()))
+        except Exception as e:
+            self.logger.error("Cannot write %i cask update(s): %s" % (len(casks), e))
+
+            # Retry with the next flush unless there is a newer update already
+            with self.lock:
+                for label, cask in casks.items():
+                    self.pending.setdefault(label, cask)
+        else:
+            self.flush_count += 1
+        finally:
+            with self.lock:
+                self.flushing = {}
+
+    def __write(self, casks):
+        self.backend.update_casks(
+            [cask["spirit_id"] for cask in casks],
+            completions=[cask["last_completion"] for cask in casks],
+            digests=[cask["digest"] for cask in casks],
+            input_digests=[cask["input_digests"] for cask in casks],
+            fingerprints=[cask["fingerprint"] for cask in casks]
+        )
+
+    def __start_flush_thread(self):
+        with self.flush_lock:
+            if self.flush_thread is None and not self.closed:
+                self.flush_thread = Thread(target=self.__flush_loop, name="MetaFlush", daemon=True)
+                self.flush_thread.start()
+
+    def __flush_loop(self):
+        while not self.closed:
+            self.flush_event.wait(self.flush_interval)
+
+            self.flush()
+
+
+module_class = CachedMeta
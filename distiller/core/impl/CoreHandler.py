@@ -1,52 +1,146 @@
-import os
-import tempfile
-import tarfile
+import collections
+import threading
 import dateutil.parser
 
 from distiller.helpers.RequestHandler import RequestHandler
 from distiller.utils.PathFinder import PathFinder
 from distiller.utils.TaskLoader import TaskLoader
+from distiller.utils.DependencyCache import DependencyCache
 from distiller.utils.Configuration import Configuration
 from distiller.core.interfaces.Scheduler import FinishState
+from distiller.core.impl.TaskBundle import TaskBundle
 
 
 class CoreHandler(RequestHandler):
+    # Maximum number of kept bundles of spirit dependency closures
+    max_spirit_bundles = 100
+
     def __init__(self):
         super().__init__()
 
+        self.bundle = TaskBundle()
+
+        # Tuple of bundled paths -> TaskBundle, in order of last use
+        self.spirit_bundles = collections.OrderedDict()
+        # TaskBundle -> number of requests using it, evicted bundles are closed once they are not used anymore
+        self.spirit_bundle_users = collections.Counter()
+        self.spirit_bundles_lock = threading.Lock()
+
+        # Number of requests waiting for jobs (see `__acquire_jobs`)
+        self.waiting = 0
+        self.waiting_lock = threading.Lock()
+
         self.get("/healthcheck", self.healthcheck)
         self.get("/tasks/definitions.tar.gz", self.get_tasks)
         self.get("/config/accumulated/worker.json", self.get_config("worker"))
+        self.get("/meta/stats", self.meta_stats)
+        self.post("/tasks/definitions/spirit", self.get_spirit_tasks)
         self.post("/tasks/run", self.run_next)
-        self.post("/tasks/finish/(?P<transaction_id>[0-9]+)", self.finish)
-        self.post("/tasks/heartbeat/(?P<transaction_id>[0-9]+)", self.heartbeat)
+        self.post("/tasks/finish/<int:transaction_id>", self.finish)
+        self.post("/tasks/heartbeat/<int:transaction_id>", self.heartbeat)
         self.post("/targets/add", self.add_target)
         self.post("/targets/remove", self.remove_target)
         self.post("/casks/remove/spirit", self.remove_cask_spirit)
         self.post("/casks/remove/(?P<mode>all|corrupt|unused)", self.remove_casks)
+        self.post("/executions", self.get_executions)
 
     def healthcheck(self, handle, params):
         handle.text(str(handle.server.env.distiller.is_running()))
 
+    def meta_stats(self, handle, params):
+        handle.json(handle.server.env.meta.stats())
+
     def get_tasks(self, handle, params):
-        task_path = PathFinder.get_task_root()
+        self.__send_bundle(handle, self.bundle)
+
+    def get_spirit_tasks(self, handle, params, body):
+        """Send a bundle of only the still definitions (and their shared modules) needed to execute a spirit"""
+
+        spirit_id = body.get("spirit_id", None)
+
+        if spirit_id is None:
+            return handle.error(400)
+
+        try:
+            explored = DependencyCache.explored_spirits((spirit_id[0], spirit_id[1]))
+        except Exception as e:
+            handle.server.env.logger.claim("CoreHandler").warning(e)
+            return handle.error(404)
+
+        paths = set()
+        still_ids = set()
+
+        for spirit in explored:
+            if spirit.name() not in still_ids:
+                still_ids.add(spirit.name())
+                paths.add(PathFinder.get_task_path(spirit.name(), relative=True))
+                paths.update(spirit.shared_modules())
+
+        paths = tuple(sorted(paths))
+        bundle = self.__acquire_spirit_bundle(paths)
+
+        try:
+            self.__send_bundle(handle, bundle)
+        finally:
+            self.__release_spirit_bundle(paths, bundle)
+
+    def __acquire_spirit_bundle(self, paths):
+        with self.spirit_bundles_lock:
+            bundle = self.spirit_bundles.get(paths, None)
+
+            if bundle is not None:
+                self.spirit_bundles.move_to_end(paths)
+            else:
+                bundle = TaskBundle(paths)
+                self.spirit_bundles[paths] = bundle
 
-        if os.path.exists(task_path) and os.path.isdir(task_path):
-            _, tmp_file = tempfile.mkstemp()
+                # Drop least recently used bundles, unless they are in use (see `__release_spirit_bundle`)
+                while len(self.spirit_bundles) > self.max_spirit_bundles:
+                    _, old_bundle = self.spirit_bundles.popitem(last=False)
 
-            with tarfile.open(tmp_file, "w:gz") as tar:
-                tar.add(task_path, arcname=".")
+                    if self.spirit_bundle_users[old_bundle] == 0:
+                        old_bundle.close()
 
-            handle.send_response(200)
-            handle.send_header("content-type", "application/gzip")
-            handle.end_headers()
+            self.spirit_bundle_users[bundle] += 1
 
-            with open(tmp_file, "br") as f:
-                handle.wfile.write(f.read())
+            return bundle
 
-            os.remove(tmp_file)
-        else:
-            handle.error(404)
+    def __release_spirit_bundle(self, paths, bundle):
+        with self.spirit_bundles_lock:
+            self.spirit_bundle_users[bundle] -= 1
+
+            if self.spirit_bundle_users[bundle] > 0:
+                return
+
+            del self.spirit_bundle_users[bundle]
+
+            # Evicted while in use, responses that are still being sent keep their opened file
+            if self.spirit_bundles.get(paths, None) is not bundle:
+                bundle.close()
+
+    @staticmethod
+    def __send_bundle(handle, bundle):
+        task_root = PathFinder.get_task_root()
+        etags = {etag.strip() for etag in handle.headers.get("if-none-match", "").split(",")}
+
+        # The bundle is only rebuilt if the task tree changed, its digest is the ETag
+        digest = bundle.current(task_root)
+
+        if digest is None:
+            return handle.error(404)
+
+        if "\"%s\"" % digest in etags or "*" in etags:
+            handle.send_response(304)
+            handle.send_header("etag", "\"%s\"" % digest)
+            return handle.end_headers()
+
+        opened = bundle.open(task_root)
+
+        if opened is None:
+            return handle.error(404)
+
+        bundle_file, digest = opened
+        handle.file(bundle_file, "application/gzip", headers={"etag": "\"%s\"" % digest})
 
     def get_config(self, mode):
         def get(handle, params):
@@ -61,42 +155,125 @@ class CoreHandler(RequestHandler):
         return get
 
     def run_next(self, handle, params, body):
+        """Reserve the next spirit to execute
+        With `wait` in the body, the request waits up to as many seconds for a spirit to become runnable.
+        """
+
+        if body.get("max_jobs", None) is not None:
+            return self.run_batch(handle, params, body)
+
+        wait = body.get("wait", None)
+
+        if wait is not None and (not isinstance(wait, (int, float)) or wait < 0):
+            return handle.error(400)
+
         try:
-            next_spirit = handle.server.env.scheduler.run_next()
+            transactions = self.__acquire_jobs(handle.server, 1, wait)
+        except Exception as e:
+            handle.server.env.logger.claim("CoreHandler").error(e)
+            return handle.error(500)
+
+        handle.json(self.__jobs_response(handle.server.env, transactions))
 
-            if next_spirit is not None:
-                handle.server.env.watchdog.add(next_spirit["transaction_id"])
+    def run_batch(self, handle, params, body):
+        max_jobs = body["max_jobs"]
+        wait = body.get("wait", None)
+
+        if not isinstance(max_jobs, int) or max_jobs < 1:
+            return handle.error(400)
+
+        if wait is not None and (not isinstance(wait, (int, float)) or wait < 0):
+            return handle.error(400)
+
+        try:
+            transactions = self.__acquire_jobs(handle.server, max_jobs, wait)
         except Exception as e:
             handle.server.env.logger.claim("CoreHandler").error(e)
             return handle.error(500)
 
-        if next_spirit is None:
-            time_until = handle.server.env.scheduler.time_until_next()
+        handle.json(self.__jobs_response(handle.server.env, transactions, batch=True))
 
-            handle.json({
-                "wait_until": time_until
-            })
-        else:
-            handle.json(next_spirit)
+    def __acquire_jobs(self, server, max_jobs, wait):
+        """Reserve up to max_jobs spirits and watch them
+        Waits up to wait seconds (limited by `distiller.long_poll.max_wait`) for a spirit to become runnable,
+        unless `distiller.long_poll.max_waiting` requests are waiting already, since each holds a server thread.
+        Servers which handle one request at a time (without `concurrent_requests`) never wait,
+        since a waiting request would block the requests that wake it up.
+        """
+
+        env = server.env
+
+        if not getattr(server, "concurrent_requests", False):
+            wait = 0
+
+        wait = min(wait or 0, env.config.get("distiller.long_poll.max_wait", 30))
+
+        if wait > 0:
+            with self.waiting_lock:
+                if self.waiting < env.config.get("distiller.long_poll.max_waiting", 16):
+                    self.waiting += 1
+                else:
+                    wait = 0
+
+        try:
+            transactions = env.scheduler.run_batch(max_jobs, wait=wait)
+        finally:
+            if wait > 0:
+                with self.waiting_lock:
+                    self.waiting -= 1
+
+        env.watchdog.add_all([transaction["transaction_id"] for transaction in transactions])
+
+        return transactions
+
+    @staticmethod
+    def __jobs_response(env, transactions, batch=False):
+        if batch:
+            if len(transactions) == 0:
+                return {
+                    "transactions": [],
+                    "wait_until": env.scheduler.time_until_next()
+                }
+
+            return {
+                "transactions": transactions
+            }
+
+        if len(transactions) == 0:
+            return {
+                "wait_until": env.scheduler.time_until_next()
+            }
+
+        return transactions[0]
 
     def finish(self, handle, params, body):
+        """Finish a running spirit
+        With `next_job` in the body, the response contains the next spirit to execute (as from `/tasks/run`)
+        under `next`, if one is runnable right away.
+        """
+
         status = body.get("status", None)
-        transaction_id = int(params["transaction_id"])
+        transaction_id = params["transaction_id"]
         message = body.get("message", None)
+        stats = body.get("stats", None)
 
         try:
             finish_state = FinishState[status]
         except Exception:
             return handle.error(400)
 
+        if stats is not None and not isinstance(stats, dict):
+            return handle.error(400)
+
         try:
             handle.server.env.watchdog.remove(transaction_id)
             handle.server.env.scheduler.finish_spirit(
                 transaction_id,
                 finish_state=finish_state,
-                message=message
+                message=message,
+                stats=stats
             )
-        except ValueError | KeyError as e:
+        except (ValueError, KeyError) as e:
             return handle.json({
                 "error": str(e)
             })
@@ -104,10 +281,20 @@ class CoreHandler(RequestHandler):
             handle.server.env.logger.claim("CoreHandler").error(e)
             return handle.error(500)
 
-        handle.json({"status": "ok"})
+        response = {"status": "ok"}
+
+        if body.get("next_job", False):
+            # The spirit is finished either way, without a next job the worker requests one as usual
+            with handle.server.env.logger.claim("CoreHandler").catch(Exception).error():
+                response["next"] = self.__jobs_response(
+                    handle.server.env,
+                    self.__acquire_jobs(handle.server, 1, None)
+                )
+
+        handle.json(response)
 
     def heartbeat(self, handle, params, body):
-        transaction_id = int(params["transaction_id"])
+        transaction_id = params["transaction_id"]
 
         try:
             handle.server.env.watchdog.heartbeat(transaction_id)
@@ -206,3 +393,48 @@ class CoreHandler(RequestHandler):
             return handle.error(500)
 
         handle.json({"status": "ok"})
+
+    def get_executions(self, handle, params, body):
+        try:
+            spirit = body.get("spirit_id", None)
+            since = body.get("since", None)
+
+            query = {
+                "spirit_id": None if spirit is None else (spirit[0], spirit[1]),
+                "still": body.get("still", None),
+                "since": None if since is None else dateutil.parser.parse(since),
+                "finish_state": body.get("finish_state", None),
+                "order_by": body.get("order_by", "end_date"),
+                "limit": int(body.get("limit", 100))
+            }
+        except Exception as e:
+            handle.server.env.logger.claim("CoreHandler").warning(e)
+            return handle.error(400)
+
+        if query["order_by"] not in ("end_date", "duration") or query["limit"] < 1:
+            return handle.error(400)
+
+        try:
+            executions = handle.server.env.meta.get_executions(**query)
+        except Exception as e:
+            handle.server.env.logger.claim("CoreHandler").error(e)
+            return handle.error(500)
+
+        handle.json({"executions": [serialize_execution(execution) for execution in executions]})
+
+
+def serialize_execution(execution):
+    """Convert execution from the meta db to a json serializable dictionary"""
+
+    def iso(date):
+        return None if date is None else date.isoformat()
+
+    return dict(
+        execution,
+        start_date=iso(execution["start_date"]),
+        end_date=iso(execution["end_date"]),
+        inputs=[
+            {"spirit_id": spirit_input["spirit_id"], "last_completion": iso(spirit_input["last_completion"])}
+            for spirit_input in execution["inputs"]
+        ]
+    )
@@ -1,6 +1,6 @@
 import importlib
 
-from distiller.utils.DependencyExplorer import DependencyExplorer
+from distiller.utils.DependencyCache import DependencyCache
 from distiller.utils.TaskLoader import TaskLoader
 
 
@@ -52,12 +52,18 @@ class GarbageCollector:
 
             # # Delete meta about cask
             cask_spirits = self.__cask_spirits()
+            invalid_ids = [
+                spirit.spirit_id()
+                for spirit in cask_spirits
+                if spirit is not None and spirit.label() not in whitelist_labels
+            ]
 
-            for spirit in cask_spirits:
-                if spirit is not None and spirit.label() not in whitelist_labels:
-                    self.env.meta.invalidate_cask(spirit.spirit_id())
+            deleted_count = self.env.meta.invalidate_casks(invalid_ids)
 
-            self.logger.notice("Deleted %i cask(s) from meta db" % len(cask_spirits))
+            for spirit_id in invalid_ids:
+                self.env.scheduler.event_cask_updated(spirit_id)
+
+            self.logger.notice("Deleted %i cask(s) from meta db" % deleted_count)
 
     def delete_corrupt(self):
         self.logger.notice("Delete corrupt requested")
@@ -84,6 +90,7 @@ class GarbageCollector:
 
             driver.delete_cask(spirit, self.env.config)
             self.env.meta.invalidate_cask(spirit.spirit_id())
+            self.env.scheduler.event_cask_updated(spirit.spirit_id())
 
     def delete_unused(self):
         self.logger.notice("Delete unused requested")
@@ -91,7 +98,7 @@ class GarbageCollector:
         scheduled_spirits = {
             spirit
             for info in self.env.meta.get_scheduled_infos()
-            for spirit in DependencyExplorer.involved_spirits(info.spirit_id)
+            for spirit in DependencyCache.involved_spirits(info.spirit_id)
         }
 
         self.delete_all(whitelist=scheduled_spirits)
@@ -106,5 +113,5 @@ class GarbageCollector:
         return {
             spirit
             for target_id in self.env.scheduler.get_active_targets()
-            for spirit in DependencyExplorer.involved_spirits(target_id)
+            for spirit in DependencyCache.involved_spirits(target_id)
         }
@@ -7,11 +7,17 @@ from distiller.helpers.HttpRequestHandler import HttpRequestHandler
 class HttpServer:
     poll_interval = 0.5
 
+    # Requests are handled one at a time
+    concurrent_requests = False
+
     def __init__(self, request_handler, env):
         self.env = env
         self.request_handler = request_handler
         self.server = None
 
+        # Bound port, e.g. if the configured port is 0
+        self.port = None
+
     def run(self):
         sock = (
             self.env.config.get("distiller.socket.ip"),
@@ -21,6 +27,8 @@ class HttpServer:
         self.server = HTTPServer(sock, HttpRequestHandler)
         self.server.request_handler = self.request_handler
         self.server.env = self.env
+        self.server.concurrent_requests = self.concurrent_requests
+        self.port = self.server.server_address[1]
 
         srv_thread = threading.Thread(target=self.__run_thread)
         srv_thread.start()
@@ -31,3 +39,6 @@ class HttpServer:
     def stop(self):
         if self.server is not None:
             self.server.shutdown()
+
+
+module_class = HttpServer
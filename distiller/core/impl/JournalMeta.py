@@ -0,0 +1,517 @@
+import os
+import json
+import datetime
+import threading
+import dateutil.parser
+
+from ..interfaces.Meta import Meta
+from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
+from distiller.api.SpiritId import SpiritId
+
+
+class JournalMeta(Meta):
+    """Meta backend keeping all state in memory, persisted in an append-only journal.
+
+    Every change is appended as one json record (line) to the journal (`meta.journal_path`).
+    After `meta.snapshot_every` records the whole state is written to a snapshot (`<journal_path>.snapshot`)
+    and the journal is truncated.
+    On start-up the latest snapshot is loaded and the journal is replayed on top of it.
+    Records carry a sequence number, so records that are already part of the snapshot are skipped.
+    """
+
+    def __init__(self, env):
+        self.env = env
+        self.logger = self.env.logger.claim("Meta Journal")
+
+        self.journal_path = self.env.config.get("meta.journal_path", "!:d/meta.journal", path=True)
+        self.snapshot_path = self.journal_path + ".snapshot"
+        self.snapshot_every = self.env.config.get("meta.snapshot_every", 10000)
+        self.fsync = self.env.config.get("meta.fsync", False)
+
+        self.execution_retention = self.env.config.get("meta.executions.retention", 30 * 24 * 3600)
+        self.execution_max_per_spirit = self.env.config.get("meta.executions.max_per_spirit", 1000)
+        self.execution_compact_every = self.env.config.get("meta.executions.compact_every", 1000)
+        self.executions_added = 0
+
+        self.lock = threading.RLock()
+
+        # Cask key (spirit name, parameter id) -> (last completion, digest, input digests, fingerprint)
+        self.casks = {}
+        # Schedule id -> scheduled target
+        self.schedules = {}
+        self.next_schedule_id = 1
+        # Execution id -> execution (in order of insertion)
+        self.executions = {}
+        self.next_execution_id = 1
+
+        self.seq = 0
+        self.journal_records = 0
+        self.journal = None
+
+        with self.lock:
+            if self.env.config.get("meta.volatile"):
+                for path in (self.journal_path, self.snapshot_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+            self.__recover()
+            self.__open_journal()
+
+        self.logger.notice("Meta journal loaded (%i casks, %i records replayed)" % (
+            len(self.casks), self.journal_records
+        ))
+
+    def get_cask(self, spirit_id):
+        return self.get_casks([spirit_id])[0]
+
+    def get_casks(self, spirit_ids):
+        with self.lock:
+            casks = [self.casks.get(cask_key(spirit_id), None) for spirit_id in spirit_ids]
+
+        return [
+            None if cask is None else cask_info(spirit_id, cask)
+            for spirit_id, cask in zip(spirit_ids, casks)
+        ]
+
+    def get_all_casks(self):
+        with self.lock:
+            return [
+                cask_info((spirit_name, json.loads(parameters)), cask)
+                for (spirit_name, parameters), cask in self.casks.items()
+            ]
+
+    def update_cask(self, spirit_id, completion=None, digest=None, input_digests=None, fingerprint=None):
+        self.update_casks(
+            [spirit_id],
+            completion=completion,
+            digests=[digest],
+            input_digests=[input_digests],
+            fingerprints=[fingerprint]
+        )
+
+    def update_casks(
+            self, spirit_ids, completion=None, completions=None, digests=None, input_digests=None, fingerprints=None
+    ):
+        if completions is None:
+            if completion is None:
+                completion = datetime.datetime.now()
+
+            completions = [completion] * len(spirit_ids)
+
+        if digests is None:
+            digests = [None] * len(spirit_ids)
+
+        if input_digests is None:
+            input_digests = [None] * len(spirit_ids)
+
+        if fingerprints is None:
+            fingerprints = [None] * len(spirit_ids)
+
+        keys = [cask_key(spirit_id) for spirit_id in spirit_ids]
+        casks = list(zip(completions, digests, input_digests, fingerprints))
+
+        self.__commit({
+            "op": "update_casks",
+            "casks": [serialize_cask(key, cask) for key, cask in zip(keys, casks)]
+        }, apply=lambda: self.casks.update(zip(keys, casks)))
+
+    def invalidate_cask(self, spirit_id):
+        with self.lock:
+            if cask_key(spirit_id) not in self.casks:
+                raise ValueError("Cask for spirit %s does not exist" % str(spirit_id))
+
+            self.invalidate_casks([spirit_id])
+
+        self.logger.notice("Delete cask for spirit %s" % str(spirit_id))
+
+    def invalidate_casks(self, spirit_ids):
+        with self.lock:
+            keys = [list(cask_key(spirit_id)) for spirit_id in spirit_ids]
+            count = len({tuple(key) for key in keys if tuple(key) in self.casks})
+
+            self.__commit({"op": "invalidate_casks", "casks": keys})
+
+        return count
+
+    def add_execution(self, execution):
+        with self.lock:
+            start_date = execution.get("start_date", None)
+
+            self.__commit({
+                "op": "add_execution",
+                "execution_id": self.next_execution_id,
+                "execution": {
+                    "transaction_id": execution.get("transaction_id", None),
+                    "spirit": list(cask_key(execution["spirit_id"])),
+                    "start_date": None if start_date is None else start_date.isoformat(),
+                    "end_date": execution["end_date"].isoformat(),
+                    "finish_state": execution["finish_state"],
+                    "worker": execution.get("worker", None),
+                    "rows": execution.get("rows", None),
+                    "bytes": execution.get("bytes", None),
+                    "inputs": [
+                        [list(cask_key(spirit_input["spirit_id"])), spirit_input["last_completion"].isoformat()]
+                        for spirit_input in execution.get("inputs", [])
+                    ]
+                }
+            })
+
+            # Keep execution history bounded
+            self.executions_added += 1
+
+            if self.executions_added >= self.execution_compact_every:
+                self.executions_added = 0
+                self.compact_executions()
+
+    def get_executions(self, spirit_id=None, still=None, since=None, finish_state=None, order_by="end_date", limit=100):
+        orders = {
+            "end_date": lambda execution: execution["end_date"],
+            "duration": lambda execution: -1 if execution["duration"] is None else execution["duration"]
+        }
+
+        if order_by not in orders:
+            raise ValueError("Invalid order %s" % order_by)
+
+        key = None if spirit_id is None else cask_key(spirit_id)
+
+        with self.lock:
+            executions = [
+                execution
+                for execution in self.executions.values()
+                if (key is None or tuple(execution["spirit"]) == key) and
+                (still is None or execution["spirit"][0] == still) and
+                (since is None or execution["end_date"] >= since) and
+                (finish_state is None or execution["finish_state"] == finish_state)
+            ]
+
+        executions.sort(key=orders[order_by], reverse=True)
+
+        return [
+            {
+                "transaction_id": execution["transaction_id"],
+                "spirit_id": (execution["spirit"][0], json.loads(execution["spirit"][1])),
+                "start_date": execution["start_date"],
+                "end_date": execution["end_date"],
+                "duration": execution["duration"],
+                "finish_state": execution["finish_state"],
+                "worker": execution["worker"],
+                "rows": execution["rows"],
+                "bytes": execution["bytes"],
+                "inputs": [
+                    {
+                        "spirit_id": (spirit_name, json.loads(parameters)),
+                        "last_completion": completion
+                    }
+                    for (spirit_name, parameters), completion in execution["inputs"]
+                ]
+            }
+            for execution in executions[:limit]
+        ]
+
+    def compact_executions(self):
+        with self.lock:
+            count = len(self.executions)
+
+            self.__commit({
+                "op": "compact_executions",
+                "cutoff": (
+                    datetime.datetime.now() - datetime.timedelta(seconds=self.execution_retention)
+                ).isoformat(),
+                "max_per_spirit": self.execution_max_per_spirit
+            })
+
+            removed = count - len(self.executions)
+
+        if removed > 0:
+            self.logger.notice("Removed %i execution(s) from history" % removed)
+
+        return removed
+
+    def get_scheduled_infos(self):
+        now = datetime.datetime.now()
+
+        with self.lock:
+            return [
+                SchedulingInfo(
+                    (schedule["spirit"][0], json.loads(schedule["spirit"][1])),
+                    schedule["age_requirement"],
+                    None,
+                    priority=schedule["priority"],
+                    reoccurring=True,
+                    start_date=parse_date(schedule["start_date"]),
+                    end_date=parse_date(schedule["end_date"]),
+                    schedule_id=schedule_id
+                )
+                for schedule_id, schedule in self.schedules.items()
+                if schedule["end_date"] is None or parse_date(schedule["end_date"]) >= now
+            ]
+
+    def remove_scheduled_spirit(self, spirit_id):
+        with self.lock:
+            key = list(cask_key(spirit_id))
+
+            if not any(schedule["spirit"] == key for schedule in self.schedules.values()):
+                raise ValueError("Schedule spirit %s does not exist" % str(spirit_id))
+
+            self.__commit({"op": "remove_schedules", "spirit": key})
+
+    def add_scheduled_spirit(self, schedule_info):
+        with self.lock:
+            schedule_id = self.next_schedule_id
+
+            self.__commit({
+                "op": "add_schedule",
+                "schedule_id": schedule_id,
+                "schedule": {
+                    "spirit": list(cask_key(schedule_info.spirit_id)),
+                    "start_date": None if schedule_info.start_date is None else schedule_info.start_date.isoformat(),
+                    "end_date": None if schedule_info.end_date is None else schedule_info.end_date.isoformat(),
+                    "age_requirement": schedule_info.age_requirement,
+                    "priority": schedule_info.priority
+                }
+            })
+
+        schedule_info.schedule_id = schedule_id
+
+        return schedule_info
+
+    def snapshot(self):
+        """Write the current state to the snapshot and truncate the journal"""
+
+        with self.lock:
+            temp_path = self.snapshot_path + "~"
+
+            with open(temp_path, "w") as f:
+                json.dump({
+                    "seq": self.seq,
+                    "casks": [serialize_cask(key, cask) for key, cask in self.casks.items()],
+                    "schedules": [[schedule_id, schedule] for schedule_id, schedule in self.schedules.items()],
+                    "next_schedule_id": self.next_schedule_id,
+                    "executions": [
+                        [execution_id, serialize_execution(execution)]
+                        for execution_id, execution in self.executions.items()
+                    ],
+                    "next_execution_id": self.next_execution_id
+                }, f)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Records up to seq are in the snapshot now, even if the journal is not truncated (crash)
+            os.replace(temp_path, self.snapshot_path)
+
+            self.journal.close()
+            self.journal = open(self.journal_path, "w")
+            self.journal_records = 0
+
+    def flush(self):
+        with self.lock:
+            if self.journal is not None:
+                self.journal.flush()
+
+    def close(self):
+        with self.lock:
+            if self.journal is not None:
+                self.snapshot()
+                self.journal.close()
+                self.journal = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "casks": len(self.casks),
+                "schedules": len(self.schedules),
+                "executions": len(self.executions),
+                "journal_records": self.journal_records,
+                "seq": self.seq
+            }
+
+    def __commit(self, record, apply=None):
+        """Apply a record to the in-memory state and append it to the journal
+
+        Arguments:
+        record -- Journal record
+
+        Keyword arguments:
+        apply -- Function applying the record directly (without parsing it), None to use `__apply`
+        """
+
+        with self.lock:
+            self.seq += 1
+            record["seq"] = self.seq
+
+            if apply is None:
+                self.__apply(record)
+            else:
+                apply()
+
+            self.journal.write(json.dumps(record) + "\n")
+            self.journal.flush()
+
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+
+            self.journal_records += 1
+
+            if self.journal_records >= self.snapshot_every:
+                self.snapshot()
+
+    def __apply(self, record):
+        op = record["op"]
+
+        if op == "update_casks":
+            self.casks.update(deserialize_cask(cask) for cask in record["casks"])
+        elif op == "invalidate_casks":
+            for key in record["casks"]:
+                self.casks.pop(tuple(key), None)
+        elif op == "add_schedule":
+            self.schedules[record["schedule_id"]] = record["schedule"]
+            self.next_schedule_id = max(self.next_schedule_id, record["schedule_id"] + 1)
+        elif op == "remove_schedules":
+            self.schedules = {
+                schedule_id: schedule
+                for schedule_id, schedule in self.schedules.items()
+                if schedule["spirit"] != record["spirit"]
+            }
+        elif op == "add_execution":
+            self.executions[record["execution_id"]] = deserialize_execution(record["execution"])
+            self.next_execution_id = max(self.next_execution_id, record["execution_id"] + 1)
+        elif op == "compact_executions":
+            self.__compact_executions(parse_date(record["cutoff"]), record["max_per_spirit"])
+        else:
+            raise ValueError("Unknown journal record %s" % op)
+
+    def __compact_executions(self, cutoff, max_per_spirit):
+        counts = {}
+
+        # Latest executions first
+        for execution_id, execution in sorted(
+                self.executions.items(), key=lambda item: item[1]["end_date"], reverse=True
+        ):
+            key = tuple(execution["spirit"])
+            counts[key] = counts.get(key, 0) + 1
+
+            if execution["end_date"] < cutoff or counts[key] > max_per_spirit:
+                del self.executions[execution_id]
+
+    def __recover(self):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+
+            self.seq = snapshot["seq"]
+            self.casks = dict(deserialize_cask(cask) for cask in snapshot["casks"])
+            self.schedules = {schedule_id: schedule for schedule_id, schedule in snapshot["schedules"]}
+            self.next_schedule_id = snapshot["next_schedule_id"]
+            self.executions = {
+                execution_id: deserialize_execution(execution)
+                for execution_id, execution in snapshot["executions"]
+            }
+            self.next_execution_id = snapshot["next_execution_id"]
+
+        if not os.path.exists(self.journal_path):
+            return
+
+        valid_length = 0
+
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write of the last record before a crash
+                    self.logger.warning("Corrupt journal record dropped")
+                    break
+
+                valid_length += len(line.encode("utf-8"))
+
+                # Record is already contained in the snapshot
+                if record["seq"] <= self.seq:
+                    continue
+
+                self.__apply(record)
+                self.seq = record["seq"]
+                self.journal_records += 1
+
+        # Cut off everything after the last valid record
+        with open(self.journal_path, "r+") as f:
+            f.truncate(valid_length)
+
+    def __open_journal(self):
+        data_root = os.path.dirname(self.journal_path)
+
+        if not os.path.exists(data_root):
+            os.makedirs(data_root)
+
+        self.journal = open(self.journal_path, "a")
+
+
+def cask_key(spirit_id):
+    spirit_id = SpiritId(spirit_id)
+
+    return spirit_id.still_id, spirit_id.parameter_id
+
+
+def cask_info(spirit_id, cask):
+    completion, digest, input_digests, fingerprint = cask
+
+    return {
+        "spirit_id": spirit_id,
+        "last_completion": completion,
+        "digest": digest,
+        "input_digests": input_digests,
+        "fingerprint": fingerprint
+    }
+
+
+def serialize_cask(key, cask):
+    completion, digest, input_digests, fingerprint = cask
+
+    return [list(key), completion.isoformat(), digest, input_digests, fingerprint]
+
+
+def deserialize_cask(cask):
+    """Returns a (key, cask) tuple of a serialized cask, casks of previous versions lack the trailing fields"""
+
+    key, completion = cask[:2]
+    digest, input_digests, fingerprint = (cask[2:] + [None] * 3)[:3]
+
+    return tuple(key), (parse_date(completion), digest, input_digests, fingerprint)
+
+
+def parse_date(date):
+    if date is None:
+        return None
+
+    # Fast path for dates written by `isoformat`
+    for date_format in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.datetime.strptime(date, date_format)
+        except ValueError:
+            pass
+
+    return dateutil.parser.parse(date)
+
+
+def serialize_execution(execution):
+    return dict(
+        execution,
+        start_date=None if execution["start_date"] is None else execution["start_date"].isoformat(),
+        end_date=execution["end_date"].isoformat(),
+        inputs=[[key, completion.isoformat()] for key, completion in execution["inputs"]]
+    )
+
+
+def deserialize_execution(execution):
+    start_date = parse_date(execution["start_date"])
+    end_date = parse_date(execution["end_date"])
+
+    return dict(
+        execution,
+        start_date=start_date,
+        end_date=end_date,
+        duration=None if start_date is None else (end_date - start_date).total_seconds(),
+        inputs=[[key, parse_date(completion)] for key, completion in execution["inputs"]]
+    )
+
+
+module_class = JournalMeta
@@ -2,60 +2,154 @@ import os
 import sqlite3
 import json
 import datetime
+import threading
+import dateutil.parser
 
 from ..interfaces.Meta import Meta
 from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
-from distiller.api.AbstractTask import parameter_id
+from distiller.api.SpiritId import SpiritId
 
 
 class SQLiteMeta(Meta):
+    # Maximum number of spirits per statement (SQLite allows at least 999 host parameters)
+    BATCH_SIZE = 400
+
+    UPSERT_CASK = """
+        INSERT INTO Casks (spirit_name, parameters, last_completion, digest, input_digests, fingerprint)
+        VALUES (?,?,?,?,?,?)
+        ON CONFLICT(spirit_name, parameters) DO UPDATE SET
+            last_completion=excluded.last_completion,
+            digest=excluded.digest,
+            input_digests=excluded.input_digests,
+            fingerprint=excluded.fingerprint
+    """
+
+    SELECT_CASK_COLUMNS = \
+        'spirit_name, parameters, last_completion AS "[timestamp]", digest, input_digests, fingerprint'
+
     def __init__(self, env):
         self.env = env
         self.logger = self.env.logger.claim("Meta DB")
 
         self.db_path = self.env.config.get("meta.file_path", path=True)
+        self.synchronous = self.env.config.get("meta.synchronous", "NORMAL")
+
+        # Retention of the execution history
+        self.execution_retention = self.env.config.get("meta.executions.retention", 30 * 24 * 3600)
+        self.execution_max_per_spirit = self.env.config.get("meta.executions.max_per_spirit", 1000)
+        self.execution_compact_every = self.env.config.get("meta.executions.compact_every", 1000)
+        self.executions_added = 0
+
+        # Connections are kept open per thread, sqlite3 connections must not be shared between threads
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
 
         self.__try_create_db()
 
         with self.__connect_db():
             self.logger.notice("Meta database loaded")
 
+    def close(self):
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+
+            self.connections = []
+
+        self.local = threading.local()
+
     def __connect_db(self):
+        conn = getattr(self.local, "conn", None)
+
+        if conn is not None:
+            return conn
+
         data_root = os.path.dirname(self.db_path)
 
         try:
             if not os.path.exists(data_root):
                 os.makedirs(data_root)
 
-            db = sqlite3.connect(
+            # Statements are compiled once per connection and reused from its statement cache
+            conn = sqlite3.connect(
                 self.db_path,
-                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES
+                detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+                check_same_thread=False,
+                cached_statements=256
             )
- 
-            return db
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=%s" % self.synchronous)
         except Exception as e:
             self.logger.critical(e)
             return
 
+        with self.connections_lock:
+            self.connections.append(conn)
+
+        self.local.conn = conn
+
+        return conn
+
     def __try_create_db(self):
         # Is database set to volatile?
         # Volatile: with each restart the meta data is reset
         if self.env.config.get("meta.volatile"):
-            if os.path.exists(self.db_path):
-                os.remove(self.db_path)
+            for path in (self.db_path, self.db_path + "-wal", self.db_path + "-shm"):
+                if os.path.exists(path):
+                    os.remove(path)
 
         with self.__connect_db() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS Casks (
                     spirit_name VARCHAR NOT NULL,
                     parameters VARCHAR NOT NULL,
-                    last_completion DATETIME
+                    last_completion DATETIME,
+                    digest VARCHAR,
+                    input_digests VARCHAR,
+                    fingerprint VARCHAR
                 )
             """)
             conn.execute("""
                 CREATE UNIQUE INDEX IF NOT EXISTS spirit_id
                 ON Casks(spirit_name, parameters)
             """)
+
+            # Add columns missing in meta dbs of previous versions
+            cask_columns = [row[1] for row in conn.execute("PRAGMA table_info(Casks)")]
+
+            for column in ("digest", "input_digests", "fingerprint"):
+                if column not in cask_columns:
+                    conn.execute("ALTER TABLE Casks ADD COLUMN %s VARCHAR" % column)
+
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS Executions (
+                    execution_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    transaction_id INTEGER,
+                    spirit_name VARCHAR NOT NULL,
+                    parameters VARCHAR NOT NULL,
+                    start_date DATETIME,
+                    end_date DATETIME NOT NULL,
+                    duration REAL,
+                    finish_state VARCHAR NOT NULL,
+                    worker VARCHAR,
+                    rows_written INTEGER,
+                    bytes_written INTEGER,
+                    inputs VARCHAR
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS execution_spirit
+                ON Executions(spirit_name, parameters, end_date)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS execution_end
+                ON Executions(end_date)
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS execution_duration
+                ON Executions(duration)
+            """)
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS ScheduledTargets (
                     schedule_id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -71,76 +165,257 @@ class SQLiteMeta(Meta):
 
     def get_cask(self, spirit_id):
         with self.__connect_db() as conn:
-            spirit_name, parameters = spirit_id
-
             csr = conn.execute(
-                'SELECT last_completion AS "[timestamp]" FROM Casks WHERE spirit_name=? AND parameters=?',
-                (spirit_name, parameter_id(parameters))
+                "SELECT %s FROM Casks WHERE spirit_name=? AND parameters=?" % self.SELECT_CASK_COLUMNS,
+                spirit_key(spirit_id)
             )
             row = csr.fetchone()
 
             if row is None:
                 return None
 
-            return {
-                "spirit_id": (spirit_name, parameters),
-                "last_completion": row[0]
-            }
+            return self.__row_to_cask(spirit_id, row)
+
+    def get_casks(self, spirit_ids):
+        keys = [spirit_key(spirit_id) for spirit_id in spirit_ids]
+        rows = {}
+
+        with self.__connect_db() as conn:
+            # Stay below the maximum number of host parameters per statement
+            for i in range(0, len(keys), self.BATCH_SIZE):
+                chunk = keys[i:i + self.BATCH_SIZE]
+
+                csr = conn.execute(
+                    "SELECT %s FROM Casks WHERE (spirit_name, parameters) IN (VALUES %s)" % (
+                        self.SELECT_CASK_COLUMNS, ",".join(["(?,?)"] * len(chunk))
+                    ),
+                    [value for key in chunk for value in key]
+                )
+
+                for row in csr:
+                    rows[(row[0], row[1])] = row
+
+        return [
+            self.__row_to_cask(spirit_id, rows[key]) if key in rows else None
+            for spirit_id, key in zip(spirit_ids, keys)
+        ]
 
     def get_all_casks(self):
         with self.__connect_db() as conn:
-            csr = conn.execute(
-                'SELECT spirit_name, parameters, last_completion AS "[timestamp]" FROM Casks'
-            )
+            csr = conn.execute("SELECT %s FROM Casks" % self.SELECT_CASK_COLUMNS)
 
-            return [
-                {
-                    "spirit_id": (row[0], json.loads(row[1])),
-                    "last_completion": row[2]
-                }
-                for row in csr.fetchall()
-            ]
+            return [self.__row_to_cask((row[0], json.loads(row[1])), row) for row in csr.fetchall()]
 
-    def update_cask(self, spirit_id, completion=None):
+    def update_cask(self, spirit_id, completion=None, digest=None, input_digests=None, fingerprint=None):
         if completion is None:
             completion = datetime.datetime.now()
 
         with self.__connect_db() as conn:
-            spirit_name, parameters = spirit_id
-            enc_parameters = parameter_id(parameters)
+            conn.execute(self.UPSERT_CASK, spirit_key(spirit_id) + (
+                completion,
+                digest,
+                None if input_digests is None else json.dumps(input_digests, sort_keys=True),
+                fingerprint
+            ))
 
-            csr = conn.execute(
-                "SELECT 1 FROM Casks WHERE spirit_name=? AND parameters=?",
-                (spirit_name, enc_parameters)
+    def update_casks(
+            self, spirit_ids, completion=None, completions=None, digests=None, input_digests=None, fingerprints=None
+    ):
+        if completions is None:
+            if completion is None:
+                completion = datetime.datetime.now()
+
+            completions = [completion] * len(spirit_ids)
+
+        if digests is None:
+            digests = [None] * len(spirit_ids)
+
+        if input_digests is None:
+            input_digests = [None] * len(spirit_ids)
+
+        if fingerprints is None:
+            fingerprints = [None] * len(spirit_ids)
+
+        with self.__connect_db() as conn:
+            conn.executemany(
+                self.UPSERT_CASK,
+                [
+                    spirit_key(spirit_id) + (
+                        spirit_completion,
+                        digest,
+                        None if spirit_inputs is None else json.dumps(spirit_inputs, sort_keys=True),
+                        fingerprint
+                    )
+                    for spirit_id, spirit_completion, digest, spirit_inputs, fingerprint in zip(
+                        spirit_ids, completions, digests, input_digests, fingerprints
+                    )
+                ]
             )
-            row = csr.fetchone()
 
-            if row is None:
-                conn.execute(
-                    "INSERT INTO Casks (spirit_name, parameters, last_completion) VALUES (?,?,?)",
-                    (spirit_name, enc_parameters, completion)
-                )
-            else:
-                conn.execute(
-                    "UPDATE Casks SET last_completion=? WHERE spirit_name=? AND parameters=?",
-                    (completion, spirit_name, enc_parameters)
-                )
+    @staticmethod
+    def __row_to_cask(spirit_id, row):
+        return {
+            "spirit_id": spirit_id,
+            "last_completion": row[2],
+            "digest": row[3],
+            "input_digests": None if row[4] is None else json.loads(row[4]),
+            "fingerprint": row[5]
+        }
 
     def invalidate_cask(self, spirit_id):
         with self.logger.catch(sqlite3.OperationalError).critical():
             with self.__connect_db() as conn:
-                spirit_name, parameters = spirit_id
-
-                csr = conn.execute(
-                    "DELETE FROM Casks WHERE spirit_name=? AND parameters=?",
-                    (spirit_name, parameter_id(parameters))
-                )
+                csr = conn.execute("DELETE FROM Casks WHERE spirit_name=? AND parameters=?", spirit_key(spirit_id))
 
         if csr.rowcount < 1:
             raise ValueError("Cask for spirit %s does not exist" % str(spirit_id))
 
         self.logger.notice("Delete cask for spirit %s" % str(spirit_id))
 
+    def invalidate_casks(self, spirit_ids):
+        with self.logger.catch(sqlite3.OperationalError).critical():
+            with self.__connect_db() as conn:
+                csr = conn.executemany(
+                    "DELETE FROM Casks WHERE spirit_name=? AND parameters=?",
+                    [spirit_key(spirit_id) for spirit_id in spirit_ids]
+                )
+
+        self.logger.notice("Delete %i cask(s)" % csr.rowcount)
+
+        return csr.rowcount
+
+    def add_execution(self, execution):
+        spirit_name, parameters = spirit_key(execution["spirit_id"])
+        start_date = execution.get("start_date", None)
+        end_date = execution["end_date"]
+        inputs = json.dumps([
+            [spirit_input["spirit_id"][0], spirit_input["spirit_id"][1], spirit_input["last_completion"].isoformat()]
+            for spirit_input in execution.get("inputs", [])
+        ])
+
+        with self.__connect_db() as conn:
+            conn.execute("""
+                INSERT INTO Executions (
+                    transaction_id, spirit_name, parameters, start_date, end_date, duration,
+                    finish_state, worker, rows_written, bytes_written, inputs
+                ) VALUES (?,?,?,?,?,?,?,?,?,?,?)
+            """, (
+                execution.get("transaction_id", None),
+                spirit_name,
+                parameters,
+                start_date,
+                end_date,
+                None if start_date is None else (end_date - start_date).total_seconds(),
+                execution["finish_state"],
+                execution.get("worker", None),
+                execution.get("rows", None),
+                execution.get("bytes", None),
+                inputs
+            ))
+
+        # Keep execution history bounded
+        self.executions_added += 1
+
+        if self.executions_added >= self.execution_compact_every:
+            self.executions_added = 0
+            self.compact_executions()
+
+    def get_executions(self, spirit_id=None, still=None, since=None, finish_state=None, order_by="end_date", limit=100):
+        orders = {
+            "end_date": "end_date DESC",
+            "duration": "duration DESC"
+        }
+
+        if order_by not in orders:
+            raise ValueError("Invalid order %s" % order_by)
+
+        conditions = []
+        values = []
+
+        if spirit_id is not None:
+            conditions.append("spirit_name=? AND parameters=?")
+            values += spirit_key(spirit_id)
+
+        if still is not None:
+            conditions.append("spirit_name=?")
+            values.append(still)
+
+        if since is not None:
+            conditions.append("end_date>=?")
+            values.append(since)
+
+        if finish_state is not None:
+            conditions.append("finish_state=?")
+            values.append(finish_state)
+
+        with self.__connect_db() as conn:
+            csr = conn.execute("""
+                SELECT
+                    transaction_id,
+                    spirit_name,
+                    parameters,
+                    start_date AS "[timestamp] start",
+                    end_date AS "[timestamp] end",
+                    duration,
+                    finish_state,
+                    worker,
+                    rows_written,
+                    bytes_written,
+                    inputs
+                FROM Executions
+                %s
+                ORDER BY %s
+                LIMIT ?
+            """ % (
+                "" if len(conditions) == 0 else "WHERE " + " AND ".join(conditions),
+                orders[order_by]
+            ), values + [limit])
+
+            return [self.__row_to_execution(row) for row in csr]
+
+    def compact_executions(self):
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=self.execution_retention)
+
+        with self.__connect_db() as conn:
+            removed = conn.execute("DELETE FROM Executions WHERE end_date<?", (cutoff,)).rowcount
+
+            removed += conn.execute("""
+                DELETE FROM Executions WHERE execution_id IN (
+                    SELECT execution_id FROM (
+                        SELECT
+                            execution_id,
+                            ROW_NUMBER() OVER (PARTITION BY spirit_name, parameters ORDER BY end_date DESC) AS age
+                        FROM Executions
+                    ) WHERE age>?
+                )
+            """, (self.execution_max_per_spirit,)).rowcount
+
+        if removed > 0:
+            self.logger.notice("Removed %i execution(s) from history" % removed)
+
+        return removed
+
+    @staticmethod
+    def __row_to_execution(row):
+        return {
+            "transaction_id": row[0],
+            "spirit_id": (row[1], json.loads(row[2])),
+            "start_date": row[3],
+            "end_date": row[4],
+            "duration": row[5],
+            "finish_state": row[6],
+            "worker": row[7],
+            "rows": row[8],
+            "bytes": row[9],
+            "inputs": [
+                {
+                    "spirit_id": (spirit_name, parameters),
+                    "last_completion": dateutil.parser.parse(completion)
+                }
+                for spirit_name, parameters, completion in json.loads(row[10])
+            ]
+        }
+
     def get_scheduled_infos(self):
         with self.logger.catch(sqlite3.Error).critical():
             with self.__connect_db() as conn:
@@ -182,11 +457,9 @@ class SQLiteMeta(Meta):
     def remove_scheduled_spirit(self, spirit_id):
         with self.logger.catch(sqlite3.OperationalError).critical():
             with self.__connect_db() as conn:
-                spirit_name, parameters = spirit_id
-
                 csr = conn.execute(
                     "DELETE FROM ScheduledTargets WHERE spirit_name=? AND parameters=?",
-                    (spirit_name, parameter_id(parameters))
+                    spirit_key(spirit_id)
                 )
 
         if csr.rowcount < 1:
@@ -199,9 +472,7 @@ class SQLiteMeta(Meta):
                     INSERT INTO ScheduledTargets
                     (spirit_name, parameters, execution_start, execution_end, age_requirement, priority)
                     VALUES (?,?,?,?,?,?)
-                """, (
-                    schedule_info.spirit_id[0],
-                    parameter_id(schedule_info.spirit_id[1]),
+                """, spirit_key(schedule_info.spirit_id) + (
                     schedule_info.start_date,
                     schedule_info.end_date,
                     schedule_info.age_requirement,
@@ -215,4 +486,12 @@ class SQLiteMeta(Meta):
         return None
 
 
+def spirit_key(spirit_id):
+    """Returns the (spirit_name, parameters) column values of a spirit id"""
+
+    spirit_id = SpiritId(spirit_id)
+
+    return spirit_id.still_id, spirit_id.parameter_id
+
+
 module_class = SQLiteMeta
@@ -0,0 +1,128 @@
+import heapq
+import itertools
+
+from distiller.api.SpiritId import SpiritId
+
+
+class BacklogQueue:
+    """Addressable priority queue of scheduling infos ordered by their next execution date.
+
+    Scheduling infos are indexed by spirit id and schedule id, so they can be removed or
+    rescheduled in O(log n) without rebuilding the heap.
+    Removal is lazy: heap entries are only marked as invalid and dropped when they surface,
+    the heap is compacted once most of its entries are invalid.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.spirit_index = {}
+        self.schedule_index = {}
+        self.counter = itertools.count()
+
+    def push(self, scheduling_info):
+        """Add a scheduling info to the queue, ordered by its next_exec_date"""
+
+        if scheduling_info in self.entries:
+            raise ValueError("Scheduling info already in backlog")
+
+        self.__push_entry(scheduling_info)
+
+        self.spirit_index.setdefault(self.__spirit_key(scheduling_info.spirit_id), {})[scheduling_info] = True
+
+        if scheduling_info.schedule_id is not None:
+            self.schedule_index[scheduling_info.schedule_id] = scheduling_info
+
+    def peek(self):
+        """Returns the scheduling info with the earliest next execution date, None if the queue is empty"""
+
+        while self.heap and self.heap[0][2] is None:
+            heapq.heappop(self.heap)
+
+        if self.heap:
+            return self.heap[0][2]
+
+        return None
+
+    def pop(self):
+        """Remove and return the scheduling info with the earliest next execution date"""
+
+        head = self.peek()
+
+        if head is not None:
+            self.remove(head)
+
+        return head
+
+    def reschedule(self, scheduling_info, next_exec_date):
+        """Change the next execution date of a queued scheduling info"""
+
+        self.__invalidate(scheduling_info)
+
+        scheduling_info.next_exec_date = next_exec_date
+        self.__push_entry(scheduling_info)
+
+    def remove(self, scheduling_info):
+        """Remove a queued scheduling info"""
+
+        self.__invalidate(scheduling_info)
+
+        del self.entries[scheduling_info]
+
+        spirit_key = self.__spirit_key(scheduling_info.spirit_id)
+        infos = self.spirit_index[spirit_key]
+        del infos[scheduling_info]
+
+        if len(infos) == 0:
+            del self.spirit_index[spirit_key]
+
+        if self.schedule_index.get(scheduling_info.schedule_id, None) is scheduling_info:
+            del self.schedule_index[scheduling_info.schedule_id]
+
+    def has_spirit(self, spirit_id):
+        """Returns True if there is any scheduling info of spirit_id in the queue"""
+
+        return self.__spirit_key(spirit_id) in self.spirit_index
+
+    def remove_spirit(self, spirit_id):
+        """Remove all scheduling infos of a spirit and return them"""
+
+        infos = list(self.spirit_index.get(self.__spirit_key(spirit_id), {}))
+
+        for info in infos:
+            self.remove(info)
+
+        return infos
+
+    def remove_schedule(self, schedule_id):
+        """Remove the scheduling info of a (persistent) schedule and return it, None if it does not exist"""
+
+        info = self.schedule_index.get(schedule_id, None)
+
+        if info is not None:
+            self.remove(info)
+
+        return info
+
+    def __push_entry(self, scheduling_info):
+        entry = [scheduling_info.next_exec_date, next(self.counter), scheduling_info]
+        self.entries[scheduling_info] = entry
+        heapq.heappush(self.heap, entry)
+
+    def __invalidate(self, scheduling_info):
+        self.entries[scheduling_info][2] = None
+
+        # Compact heap if it mostly consists of invalid entries
+        if len(self.heap) > 32 and len(self.heap) > 2 * len(self.entries):
+            self.heap = [entry for entry in self.heap if entry[2] is not None]
+            heapq.heapify(self.heap)
+
+    @staticmethod
+    def __spirit_key(spirit_id):
+        return SpiritId(spirit_id).label
+
+    def __contains__(self, scheduling_info):
+        return scheduling_info in self.entries
+
+    def __len__(self):
+        return len(self.entries)
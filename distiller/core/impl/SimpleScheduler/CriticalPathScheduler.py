@@ -0,0 +1,48 @@
+from distiller.core.impl.SimpleScheduler.SimpleScheduler import SimpleScheduler
+from distiller.core.impl.SimpleScheduler.SchedulingGraph import SchedulingGraph
+
+
+class CriticalPathGraph(SchedulingGraph):
+    """Scheduling graph ranking runnable spirits by their remaining critical path.
+
+    The remaining critical path of a spirit is its predicted execution time plus the longest
+    remaining critical path of its dependents. Shared dependencies inherit the priority
+    of their most urgent dependent, so that a high priority target is never blocked by
+    a dependency that was added with a lower priority.
+    """
+
+    def _rank(self, node):
+        return node.critical_path
+
+    def _merged(self, nodes):
+        # Values only ever increase, so propagate changes from the dependents upwards until stable
+        stack = list(nodes)
+
+        while stack:
+            node = stack.pop()
+
+            critical_path = self.predictor.predict(node.spirit) + max(
+                [child.critical_path for child in node.children if child.critical_path is not None], default=0.0
+            )
+            priority = max([node.priority] + [child.priority for child in node.children])
+
+            if node.critical_path is not None and \
+                    critical_path <= node.critical_path and \
+                    priority <= node.priority:
+                continue
+
+            node.critical_path = critical_path
+            node.priority = priority
+
+            # Re-rank runnable spirits that are not part of the merged graph
+            if len(node.parents) == 0 and self._is_pending(node):
+                self._push_ready(node)
+
+            stack.extend(node.parents)
+
+
+class CriticalPathScheduler(SimpleScheduler):
+    graph_class = CriticalPathGraph
+
+
+module_class = CriticalPathScheduler
@@ -0,0 +1,110 @@
+import collections
+import datetime
+
+
+class ExecutionPredictor:
+    """Predicts execution times of spirits from the runtimes of finished executions.
+
+    For every spirit and every still a runtime distribution is kept as an exponentially weighted
+    moving average and a window of the latest runtimes (for quantiles).
+    Predictions for a spirit fall back to its still if the spirit itself has never been executed.
+    """
+
+    def __init__(self, alpha=0.3, window=50, quantile=0.9):
+        self.alpha = alpha
+        self.window = window
+        self.quantile = quantile
+
+        self.spirit_stats = {}
+        self.still_stats = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            alpha=config.get("scheduler.prediction.alpha", 0.3),
+            window=config.get("scheduler.prediction.window", 50),
+            quantile=config.get("scheduler.prediction.quantile", 0.9)
+        )
+
+    def record(self, spirit, duration):
+        """Record the runtime of a successfully finished execution
+
+        Arguments:
+        spirit -- Executed spirit
+        duration -- Runtime as timedelta
+        """
+
+        seconds = max(0.0, duration.total_seconds())
+
+        for stats, key in ((self.spirit_stats, spirit), (self.still_stats, spirit.name())):
+            if key not in stats:
+                stats[key] = RuntimeStats(self.window)
+
+            stats[key].add(seconds, self.alpha)
+
+    def predict(self, spirit, conservative=False):
+        """Returns the predicted execution time of a spirit in seconds.
+        Returns 0 if there is no runtime known for the spirit or its still.
+
+        Keyword arguments:
+        conservative -- Use the configured quantile instead of the moving average
+        """
+
+        stats = self.spirit_stats.get(spirit, None)
+
+        if stats is None:
+            stats = self.still_stats.get(spirit.name(), None)
+
+        if stats is None:
+            return 0.0
+
+        if conservative:
+            return stats.quantile(self.quantile)
+
+        return stats.ewma
+
+    def predict_graph(self, roots, conservative=False):
+        """Returns the predicted execution time (critical path) of a dependency graph as timedelta
+
+        Arguments:
+        roots -- Root nodes of the graph (see `DependencyExplorer.build_graph`)
+        """
+
+        # Longest path from each node to the end of the graph, computed from the leaves upwards
+        remaining = {}
+        stack = [(root, False) for root in roots]
+
+        while stack:
+            node, expanded = stack.pop()
+
+            if node.spirit in remaining:
+                continue
+
+            if expanded:
+                remaining[node.spirit] = self.predict(node.spirit, conservative=conservative) + max(
+                    [remaining[child.spirit] for child in node.children], default=0.0
+                )
+            else:
+                stack.append((node, True))
+                stack.extend((child, False) for child in node.children if child.spirit not in remaining)
+
+        return datetime.timedelta(seconds=max([remaining[root.spirit] for root in roots], default=0.0))
+
+
+class RuntimeStats:
+    def __init__(self, window):
+        self.ewma = None
+        self.samples = collections.deque(maxlen=window)
+
+    def add(self, seconds, alpha):
+        if self.ewma is None:
+            self.ewma = seconds
+        else:
+            self.ewma = alpha * seconds + (1 - alpha) * self.ewma
+
+        self.samples.append(seconds)
+
+    def quantile(self, q):
+        ordered = sorted(self.samples)
+
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
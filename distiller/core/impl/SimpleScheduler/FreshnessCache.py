@@ -0,0 +1,155 @@
+from distiller.utils.DependencyCache import DependencyCache
+from distiller.utils.TaskLoader import TaskLoader
+from distiller.api.SpiritId import SpiritId
+
+
+class FreshnessCache:
+    """Memoised cask freshness of dependency closures of scheduled targets.
+
+    For every target the involved spirits (its closure) are resolved once, and the oldest cask completion
+    within the closure is kept until one of its members changes. The targets affected by a changed member are
+    looked up in the reverse index of the `DependencyCache`, closures are resolved again if their graph has been
+    rebuilt (or dropped) in the meantime.
+    Cask completions are read from the meta db (in batches) only once per spirit and kept until the cask is updated
+    or invalidated, which has to be reported with `cask_updated`.
+    Casks built with a different still definition count as missing. Definitions reloaded by the `TaskLoader`
+    (its generation of the still changed) are noticed on lookup, other changes can be reported with `still_updated`.
+    """
+
+    def __init__(self, env):
+        self.env = env
+
+        # Target label -> list of spirit ids involved in building the target
+        self.closures = {}
+        # Target label -> serial number of the dependency graph its closure has been resolved from
+        self.serials = {}
+        # Target label -> oldest cask completion of its closure (None if any cask is missing)
+        self.oldest = {}
+        # Spirit label -> number of closures containing the spirit
+        self.users = {}
+        # Spirit label -> last cask completion (None if there is no cask)
+        self.completions = {}
+        # Target label -> still ids in its closure
+        self.stills = {}
+        # Still id -> TaskLoader generation of the definition the completions were checked against
+        self.generations = {}
+
+    def oldest_completion(self, spirit_id):
+        """Returns the oldest cask completion of all spirits involved in building the target spirit_id.
+        Returns None if any of them does not have a cask.
+        """
+
+        label = self.__label(spirit_id)
+
+        if label in self.closures:
+            # Cask updates of a rebuilt graph might not have been reported to this target (see `cask_updated`)
+            if DependencyCache.serial(spirit_id) != self.serials[label]:
+                self.forget(spirit_id)
+            else:
+                self.__revalidate(self.stills[label])
+
+        if label not in self.oldest:
+            if label not in self.closures:
+                self.__resolve(label, spirit_id)
+
+            self.__load_completions(self.closures[label])
+
+            oldest = None
+
+            for member_id in self.closures[label]:
+                completion = self.completions[self.__label(member_id)]
+
+                if completion is None:
+                    oldest = None
+                    break
+
+                if oldest is None or completion < oldest:
+                    oldest = completion
+
+            self.oldest[label] = oldest
+
+        return self.oldest[label]
+
+    def cask_updated(self, spirit_id):
+        """Invalidate everything that depends on the cask of spirit_id"""
+
+        label = self.__label(spirit_id)
+
+        self.completions.pop(label, None)
+        self.oldest.pop(label, None)
+
+        for target_id in DependencyCache.dependents_of(spirit_id):
+            self.oldest.pop(self.__label(target_id), None)
+
+    def still_updated(self, still_id):
+        """Invalidate everything that depends on a cask of the still with still_id"""
+
+        for spirit_id in [
+            member_id
+            for closure in self.closures.values()
+            for member_id in closure
+            if member_id[0] == still_id
+        ]:
+            self.cask_updated(spirit_id)
+
+    def forget(self, spirit_id):
+        """Drop the closure of target spirit_id, e.g. if it is not scheduled anymore or its definition changed"""
+
+        label = self.__label(spirit_id)
+        closure = self.closures.pop(label, None)
+        self.serials.pop(label, None)
+        self.oldest.pop(label, None)
+        self.stills.pop(label, None)
+
+        if closure is None:
+            return
+
+        for member_id in closure:
+            member_label = self.__label(member_id)
+            self.users[member_label] -= 1
+
+            if self.users[member_label] == 0:
+                del self.users[member_label]
+                self.completions.pop(member_label, None)
+
+    def __revalidate(self, still_ids):
+        """Invalidate the completions of stills whose definition has been reloaded since they were checked"""
+
+        for still_id in still_ids:
+            generation = TaskLoader.generation(still_id)
+
+            if self.generations.get(still_id, None) != generation:
+                self.still_updated(still_id)
+                self.generations[still_id] = generation
+
+    def __resolve(self, label, spirit_id):
+        # The serial is taken first, a graph rebuilt in between is resolved again with the next lookup
+        self.serials[label] = DependencyCache.serial(spirit_id)
+        closure = [spirit.spirit_id() for spirit in DependencyCache.involved_spirits(spirit_id)]
+
+        self.closures[label] = closure
+        self.stills[label] = sorted({member_id[0] for member_id in closure})
+        self.__revalidate(self.stills[label])
+
+        for member_id in closure:
+            member_label = self.__label(member_id)
+            self.users[member_label] = self.users.get(member_label, 0) + 1
+
+    def __load_completions(self, spirit_ids):
+        """Load all cask completions of spirit_ids which are not known yet with one meta request"""
+
+        missing_ids = [spirit_id for spirit_id in spirit_ids if self.__label(spirit_id) not in self.completions]
+
+        if len(missing_ids) == 0:
+            return
+
+        for spirit_id, cask_meta in zip(missing_ids, self.env.meta.get_casks(missing_ids)):
+            if cask_meta is None or TaskLoader.definition_changed(TaskLoader.init(spirit_id), cask_meta["fingerprint"]):
+                self.completions[self.__label(spirit_id)] = None
+            else:
+                self.completions[self.__label(spirit_id)] = cask_meta["last_completion"]
+
+    @staticmethod
+    def __label(spirit_id):
+        return SpiritId(spirit_id).label
+
@@ -0,0 +1,94 @@
+import heapq
+import itertools
+
+
+class ReadyQueue:
+    """Priority queue of runnable spirits.
+
+    Spirits are ordered by priority (highest first), then by rank (highest first) and insertion order.
+    A spirit that is popped while being blocked (e.g. by a lock) is parked
+    in the wait list of its blocking key until that key is released.
+    Removal is lazy: entries are only marked as invalid and dropped when they surface.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.waiting = {}
+        self.counter = itertools.count()
+
+    def push(self, spirit, priority=0, rank=0):
+        """Mark spirit as runnable with a priority and a rank (tie breaker for equal priorities).
+        If the spirit is already queued, its priority and rank are only ever raised.
+        """
+
+        entry = self.entries.get(spirit)
+
+        if entry is not None:
+            if (-entry[0], -entry[1]) >= (priority, rank):
+                return
+
+            # Invalidate old entry and re-insert with higher priority
+            entry[3] = None
+
+        entry = [-priority, -rank, next(self.counter), spirit]
+        self.entries[spirit] = entry
+        heapq.heappush(self.heap, entry)
+
+    def remove(self, spirit):
+        """Remove spirit from the runnable spirits (if present)"""
+
+        entry = self.entries.pop(spirit, None)
+
+        if entry is not None:
+            entry[3] = None
+
+    def pop(self, blocked_by):
+        """Pop the most urgent runnable spirit.
+        Returns None if there is no candidate.
+
+        Arguments:
+        blocked_by -- Function returning for a spirit the key it is blocked by, or None if it is not blocked
+        """
+
+        while self.heap:
+            entry = heapq.heappop(self.heap)
+            spirit = entry[3]
+
+            if spirit is None:
+                continue
+
+            key = blocked_by(spirit)
+
+            if key is not None:
+                self.waiting.setdefault(key, []).append(entry)
+                continue
+
+            del self.entries[spirit]
+
+            return spirit
+
+        return None
+
+    def release(self, key):
+        """Move all spirits waiting for key back to the runnable spirits"""
+
+        for entry in self.waiting.pop(key, []):
+            if entry[3] is not None:
+                heapq.heappush(self.heap, entry)
+
+    def priority(self, spirit):
+        """Returns the priority of a queued spirit or None if it is not queued"""
+
+        entry = self.entries.get(spirit)
+
+        if entry is None:
+            return None
+
+        return -entry[0]
+
+    def __contains__(self, spirit):
+        return spirit in self.entries
+
+    def __len__(self):
+        return len(self.entries)
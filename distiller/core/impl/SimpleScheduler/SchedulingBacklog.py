@@ -1,15 +1,23 @@
-import heapq
 import datetime
 
 from distiller.utils.TaskLoader import TaskLoader, TaskLoadError
-from distiller.utils.DependencyExplorer import DependencyExplorer
+from distiller.utils.DependencyCache import DependencyCache
+from distiller.core.impl.SimpleScheduler.ExecutionPredictor import ExecutionPredictor
+from distiller.core.impl.SimpleScheduler.BacklogQueue import BacklogQueue
+from distiller.core.impl.SimpleScheduler.FreshnessCache import FreshnessCache
 
 
 class SchedulingBacklog:
-    def __init__(self, env, logger):
+    def __init__(self, env, logger, predictor=None):
         self.env = env
         self.logger = logger
-        self.backlog = []
+
+        if predictor is None:
+            predictor = ExecutionPredictor.from_config(self.env.config)
+
+        self.predictor = predictor
+        self.backlog = BacklogQueue()
+        self.freshness = FreshnessCache(self.env)
         self.__load_persistent()
 
     def add(self, scheduling_info, persistent=False):
@@ -27,7 +35,7 @@ class SchedulingBacklog:
             scheduling_info.reoccurring = True
             scheduling_info = self.env.meta.add_scheduled_spirit(scheduling_info)
 
-        heapq.heappush(self.backlog, scheduling_info)
+        self.backlog.push(scheduling_info)
 
     def next_execution(self):
         """Returns the datetime of the next execution.
@@ -37,8 +45,10 @@ class SchedulingBacklog:
         Returns None if there is no item.
         """
 
-        if len(self.backlog) > 0:
-            return self.backlog[0].next_exec_date
+        head = self.backlog.peek()
+
+        if head is not None:
+            return head.next_exec_date
         else:
             return None
 
@@ -49,8 +59,14 @@ class SchedulingBacklog:
 
         now = datetime.datetime.now()
 
-        while len(self.backlog) > 0 and self.backlog[0].next_exec_date <= now:
-            head = heapq.heappop(self.backlog)
+        while True:
+            head = self.backlog.peek()
+
+            if head is None or head.next_exec_date > now:
+                break
+
+            # Items are rescheduled in place, everything else is dropped from the backlog
+            next_exec_date = None
 
             if head.end_date is None or now <= head.end_date:
                 assert head.start_date is None or head.start_date <= now
@@ -59,15 +75,19 @@ class SchedulingBacklog:
 
                 if pp_exec_date is not None:
                     if pp_exec_date <= now:
+                        head.lead_time = self.__predict_execution_time(head).total_seconds()
                         consumed.append(head)
                         next_exec_date = self.__get_next_exec_date(head, now)
 
-                        if next_exec_date is not None:
-                            head.next_exec_date = next_exec_date
-                            heapq.heappush(self.backlog, head)
+                        # The active scheduler resolves the dependencies again, pick up changed definitions as well
+                        self.freshness.forget(head.spirit_id)
                     else:
-                        head.next_exec_date = pp_exec_date
-                        heapq.heappush(self.backlog, head)
+                        next_exec_date = pp_exec_date
+
+            if next_exec_date is not None:
+                self.backlog.reschedule(head, next_exec_date)
+            else:
+                self.__remove_item(head)
 
         return consumed
 
@@ -80,12 +100,28 @@ class SchedulingBacklog:
         persistent -- Remove persistent targets completely?
         """
 
-        self.backlog = [item for item in self.backlog if item.spirit_id != spirit_id]
-        heapq.heapify(self.backlog)
+        self.backlog.remove_spirit(spirit_id)
+        self.freshness.forget(spirit_id)
 
         if persistent:
             self.env.meta.remove_scheduled_spirit(spirit_id)
 
+    def cask_updated(self, spirit_id):
+        """Indicate that the cask of spirit_id has been updated or invalidated"""
+
+        self.freshness.cask_updated(spirit_id)
+
+    def still_updated(self, still_id):
+        """Indicate that the definition of the still with still_id changed"""
+
+        self.freshness.still_updated(still_id)
+
+    def __remove_item(self, scheduling_info):
+        self.backlog.remove(scheduling_info)
+
+        if not self.backlog.has_spirit(scheduling_info.spirit_id):
+            self.freshness.forget(scheduling_info.spirit_id)
+
     def __load_persistent(self):
         """Load all persistent scheduling rules from the meta db"""
         schedule_infos = self.env.meta.get_scheduled_infos()
@@ -101,7 +137,9 @@ class SchedulingBacklog:
                 self.logger.warning(e)
             else:
                 if si.next_exec_date is not None:
-                    heapq.heappush(self.backlog, si)
+                    self.backlog.push(si)
+                elif not self.backlog.has_spirit(si.spirit_id):
+                    self.freshness.forget(si.spirit_id)
 
     def __get_postponed_exec_date(self, scheduling_info, min_date):
         """Returns a new execution date for a scheduled target
@@ -120,27 +158,20 @@ class SchedulingBacklog:
         else:
             age_td = datetime.timedelta(seconds=scheduling_info.age_requirement)
 
-        # Perform BFS on dependency tree starting with `scheduling_info`
-        spirits = DependencyExplorer.involved_spirits(scheduling_info.spirit_id)
-
-        min_cask_dt = datetime.datetime.max
+        # Oldest cask of the target and all of its dependencies
+        min_cask_dt = self.freshness.oldest_completion(scheduling_info.spirit_id)
 
-        for spirit in spirits:
-            cask_dt = self.__get_cask_datetime(spirit.spirit_id())
+        if min_cask_dt is None:
+            # There is no cache -> execute
+            return min_date
 
-            if cask_dt is None:
-                # There is no cache -> execute
-                return min_date
-
-            if age_td is None:
-                # Cask (cache) exists and there is no age requirement -> don't execute
-                return None
-
-            if cask_dt + age_td <= min_date:
-                # Cask does not fulfil age requirement -> execute
-                return min_date
+        if age_td is None:
+            # All casks (cache) exist and there is no age requirement -> don't execute
+            return None
 
-            min_cask_dt = min(min_cask_dt, cask_dt)
+        if min_cask_dt + age_td <= min_date:
+            # Cask does not fulfil age requirement -> execute
+            return min_date
 
         pp_date = min_cask_dt + age_td - self.__predict_execution_time(scheduling_info)
 
@@ -154,14 +185,6 @@ class SchedulingBacklog:
 
         return None
 
-    def __get_cask_datetime(self, spirit_id):
-        cask_meta = self.env.meta.get_cask(spirit_id)
-
-        if cask_meta is None:
-            return None
-
-        return cask_meta["last_completion"]
-
     def __get_next_exec_date(self, scheduling_info, from_date):
         """Returns a predicted next execution date for a scheduled target.
         Returns None if there shouldn't be a next execution.
@@ -182,7 +205,10 @@ class SchedulingBacklog:
         if scheduling_info.age_requirement is None:
             return None
 
-        exec_date = from_date + datetime.timedelta(seconds=scheduling_info.age_requirement)
+        # Always plan ahead, even if the predicted execution time exceeds the age requirement
+        exec_date = from_date + datetime.timedelta(
+            seconds=max(scheduling_info.age_requirement - scheduling_info.lead_time, 1)
+        )
 
         if scheduling_info.end_date is not None and exec_date > scheduling_info.end_date:
             return None
@@ -190,8 +216,12 @@ class SchedulingBacklog:
         return exec_date
 
     def __predict_execution_time(self, scheduling_info):
-        """Returns a timedelta for the predicted execution time """
-        # TODO (also do this together with backlog, not only graph)
-        # i.e. graph has the same method, should be only implemented once somehow
+        """Returns a timedelta for the predicted execution time
+        This is the (conservative) critical path of rebuilding the target with all of its dependencies,
+        so that the execution is started early enough for the casks to stay fresh.
+        """
 
-        return datetime.timedelta(seconds=0)
+        return self.predictor.predict_graph(
+            DependencyCache.build_graph(scheduling_info.spirit_id),
+            conservative=True
+        )
@@ -2,26 +2,43 @@ import collections
 import datetime
 
 from distiller.utils.DependencyExplorer import DependencyExplorer
+from distiller.utils.DependencyCache import DependencyCache
 from distiller.utils.TaskLoader import TaskLoader
+from distiller.core.impl.SimpleScheduler.ReadyQueue import ReadyQueue
+from distiller.core.impl.SimpleScheduler.ExecutionPredictor import ExecutionPredictor
 
 
 class SchedulingGraph:
-    def __init__(self, env, logger):
+    def __init__(self, env, logger, predictor=None):
         self.env = env
         self.logger = logger
 
-        # Execution branches
-        self.branches = []
+        if predictor is None:
+            predictor = ExecutionPredictor.from_config(self.env.config)
+
+        self.predictor = predictor
+
+        # Skip dependents whose inputs did not change by the rebuild of their dependencies
+        self.early_cutoff = self.env.config.get("scheduler.early_cutoff", True)
+
+        # Shared execution graph of all pending (not yet running) spirits
+        self.nodes = {}
+
+        # Number of active targets per target spirit
+        self.target_refs = {}
 
         self.running_spirits = {}
         self.active_transactions = {}
         self.locks = {}
 
+        # Runnable spirits (pending nodes without any pending dependency)
+        self.ready = ReadyQueue()
+
         self.next_transaction_id = 0
 
     def add_target(self, scheduling_info):
         """Add target with scheduling info to the active scheduling graph
-        This creates a new execution branch.
+        Only the part of the execution graph that is not yet in the shared graph is added.
         Dependencies are added until the age requirements are met.
         All tasks without any dependency any more will be considered as root
         and can be executed directly
@@ -29,41 +46,120 @@ class SchedulingGraph:
 
         now = datetime.datetime.now()
 
+        # Age requirements have to be met at the predicted completion of the target
+        completion = now + datetime.timedelta(seconds=scheduling_info.lead_time)
+
+        # Load the casks of all involved spirits at once
+        casks = self.__get_casks(DependencyCache.involved_spirits(scheduling_info.spirit_id))
+
         # Build execution graph and prune from the leaves all spirits where
-        # a results exists and the age requirements are still met
+        # a results exists, the age requirements are still met and the still definition did not change
+        # Spirits that are kept only because of their dependencies may be cut off later (see `__cut_off`)
+        expired = set()
 
         def enforce_expired(spirit):
-            cask_dt = self.__get_cask_datetime(spirit)
+            if TaskLoader.spirit_is_pipe(spirit):
+                return False
 
-            return not TaskLoader.spirit_is_pipe(spirit) and (
-                cask_dt is None or (
-                    scheduling_info.age_requirement is not None and
-                    cask_dt + datetime.timedelta(seconds=scheduling_info.age_requirement) < now
-                )
-            )
+            cask_meta = casks.get(spirit, None)
+
+            is_expired = cask_meta is None or (
+                scheduling_info.age_requirement is not None and
+                cask_meta["last_completion"] + datetime.timedelta(seconds=scheduling_info.age_requirement) < completion
+            ) or TaskLoader.definition_changed(spirit, cask_meta["fingerprint"])
+
+            if is_expired:
+                expired.add(spirit)
+
+            return is_expired
 
         roots = DependencyExplorer.build_graph(
             scheduling_info.spirit_id,
             enforce_func=enforce_expired
         )
 
-        if len(roots) > 0:
-            # Add (reduced) execution branch to list of branches
-            self.branches.append(SchedulingBranch(scheduling_info, roots))
-            self.__sort_branches()
+        if len(roots) == 0:
+            return
+
+        # Merge (reduced) execution graph into the shared graph
+        dep_nodes = []
+        merged = {}
+        queue = collections.deque(roots)
+
+        while queue:
+            dep_node = queue.popleft()
+
+            if dep_node.spirit in merged:
+                continue
+
+            node = self.nodes.get(dep_node.spirit, None)
+
+            if node is None:
+                node = SchedulingNode(dep_node.spirit)
+                self.nodes[dep_node.spirit] = node
+
+            node.priority = max(node.priority, scheduling_info.priority)
+            node.expired = node.expired or dep_node.spirit in expired
+
+            merged[dep_node.spirit] = node
+            dep_nodes.append(dep_node)
+            queue.extend(dep_node.children)
+
+        for dep_node in dep_nodes:
+            node = merged[dep_node.spirit]
+
+            for dep_parent in dep_node.parents:
+                node.add_parent(merged[dep_parent.spirit])
+
+        self._merged(list(merged.values()))
+
+        for node in merged.values():
+            if len(node.parents) == 0:
+                self._push_ready(node)
+            else:
+                # Runnable spirit might have received new dependencies
+                self.ready.remove(node.spirit)
+
+        target = merged[TaskLoader.init(scheduling_info.spirit_id)]
+        target.targets.append(scheduling_info)
+        self.target_refs[target.spirit] = self.target_refs.get(target.spirit, 0) + 1
 
     def __predict_execution_time(self, spirit):
         """Returns a timedelta for the predicted execution time """
-        # TODO (also do this together with backlog, not only graph)
-        # i.e. backlog has the same method, should be only implemented once somehow
 
-        return datetime.timedelta(seconds=0)
+        return datetime.timedelta(seconds=self.predictor.predict(spirit))
+
+    def _rank(self, node):
+        """Returns the rank of a runnable node, among equal priorities the highest rank is executed first"""
+
+        # Start the longest running spirits first
+        return self.__predict_execution_time(node.spirit).total_seconds()
+
+    def _merged(self, nodes):
+        """Called after a target's execution graph was merged into the shared graph,
+        before its runnable nodes are queued
+
+        Arguments:
+        nodes -- All nodes of the target's execution graph
+        """
+
+        pass
+
+    def _push_ready(self, node):
+        self.ready.push(node.spirit, node.priority, rank=self._rank(node))
+
+    def _is_pending(self, node):
+        return self.nodes.get(node.spirit, None) is node
 
     def run_next(self):
         """Set the next target as running in graph"""
         spirit = self.__next()
 
         if spirit is not None:
+            node = self.nodes.pop(spirit)
+            node.running = True
+            node.start_date = datetime.datetime.now()
+
             # Lock all locks of spirit
             self.__lock(spirit)
 
@@ -73,38 +169,56 @@ class SchedulingGraph:
 
             # Set spirit as running
             self.running_spirits[spirit] = transaction_id
-            self.active_transactions[transaction_id] = spirit
+            self.active_transactions[transaction_id] = node
 
             return {
                 "transaction_id": transaction_id,
-                "spirit_id": (spirit.name(), spirit.parameters)
+                "spirit_id": spirit.spirit_id()
             }
 
         return None
 
     def finish_spirit(self, transaction_id):
-        """Mark a spirit's execution as finished and remove it from the scheduler"""
-        spirit = self.__stop_spirit(transaction_id)
+        """Mark a spirit's execution as finished and remove it from the scheduler
+        Returns the spirits that have been completed without execution, since their inputs did not change
+        """
+        node = self.__stop_spirit(transaction_id)
+        completed = [node]
 
-        new_branches = []
+        # A pending node of the same spirit without dependencies is satisfied by this execution as well
+        # This keeps it from being executed multiple times if one execution is sufficient
+        pending = self.__pending_root(node.spirit)
 
-        # Remove spirit as roots from all branches in active scheduler to mark it as done
-        # And to keep it from being executed by multiple branches if one execution is sufficient
-        for branch in self.branches:
-            if branch.contains_spirit(spirit):
-                branch.finish_if_root(spirit)
+        if pending is not None:
+            self.__discard(pending)
+            completed.append(pending)
 
-                if not branch.is_complete():
-                    new_branches.append(branch)
-            else:
-                new_branches.append(branch)
+        cut_off_spirits = []
 
-        self.branches = new_branches
+        while completed:
+            ready = []
+
+            for curr in completed:
+                ready.extend(self.__complete(curr))
+
+            cut_off = self.__cut_off(ready)
+            completed = []
+
+            for child in ready:
+                if child in cut_off:
+                    # Complete without execution, which may unblock further dependents
+                    self.__discard(child)
+                    completed.append(child)
+                    cut_off_spirits.append(child.spirit)
+                else:
+                    self._push_ready(child)
+
+        return cut_off_spirits
 
     def is_empty(self):
         """Returns if the active scheduler is empty"""
 
-        return len(self.branches) == 0
+        return len(self.target_refs) == 0
 
     def get_spirit(self, transaction_id):
         """Get spirit for a specific transaction_id"""
@@ -112,46 +226,210 @@ class SchedulingGraph:
         if transaction_id not in self.active_transactions:
             raise KeyError("Invalid transaction id")
 
-        return self.active_transactions[transaction_id]
+        return self.active_transactions[transaction_id].spirit
+
+    def get_start_date(self, transaction_id):
+        """Get the execution start date of a specific transaction_id"""
+
+        if transaction_id not in self.active_transactions:
+            raise KeyError("Invalid transaction id")
+
+        return self.active_transactions[transaction_id].start_date
+
+    def get_active_targets(self):
+        """Returns the spirit ids of all targets that are not yet completed"""
+
+        return [spirit.spirit_id() for spirit in self.target_refs]
 
     def abort_spirit(self, transaction_id):
         """Abort a running spirit and stop all of its ancestors"""
 
-        spirit = self.__stop_spirit(transaction_id)
+        node = self.__stop_spirit(transaction_id)
+        pending = self.__pending_root(node.spirit)
 
-        self.branches = [branch for branch in self.branches if not branch.spirit_in_root(spirit)]
+        self.__remove_dependents(node)
+
+        if pending is not None:
+            self.__remove_dependents(pending)
 
     def __stop_spirit(self, transaction_id):
         if transaction_id not in self.active_transactions:
             raise ValueError("Invalid transaction id")
 
-        spirit = self.active_transactions[transaction_id]
+        node = self.active_transactions[transaction_id]
+        spirit = node.spirit
 
         assert spirit in self.running_spirits
 
         del self.active_transactions[transaction_id]
         del self.running_spirits[spirit]
 
+        node.running = False
+
         self.__unlock(spirit)
+        self.ready.release(("running", spirit))
+
+        return node
+
+    def __pending_root(self, spirit):
+        """Returns the pending node of a spirit if it has no dependencies, None otherwise"""
+
+        node = self.nodes.get(spirit, None)
+
+        if node is not None and len(node.parents) == 0:
+            return node
+
+        return None
+
+    def __complete(self, node):
+        """Mark a node as done, unblock all of its dependents at once
+        Returns the dependents without any pending dependency left
+        """
 
-        return spirit
+        ready = []
 
-    def __get_cask_datetime(self, target_spirit):
-        cask_meta = self.env.meta.get_cask(target_spirit.spirit_id())
+        for child in list(node.children):
+            child.remove_parent(node)
 
-        if cask_meta is None:
-            return None
+            if len(child.parents) == 0:
+                ready.append(child)
 
-        return cask_meta["last_completion"]
+        self.__drop_targets(node)
+
+        return ready
+
+    def __cut_off(self, nodes):
+        """Returns the set of nodes that do not need to be executed (early cutoff):
+        Their cask is only rebuilt because of their dependencies and all of their inputs
+        have the same content digests as when the cask was built.
+        The casks of those nodes are marked as completed now.
+        """
+
+        if not self.early_cutoff:
+            return set()
+
+        candidates = [node for node in nodes if not node.expired]
+
+        if len(candidates) == 0:
+            return set()
+
+        inputs = {node: DependencyExplorer.input_spirits(node.spirit) for node in candidates}
+        spirits = list({spirit: True for node in candidates for spirit in [node.spirit] + inputs[node]})
+        casks = dict(zip(spirits, self.env.meta.get_casks([spirit.spirit_id() for spirit in spirits])))
+
+        cut_off = []
+
+        for node in candidates:
+            cask_meta = casks[node.spirit]
+
+            if cask_meta is None or cask_meta["digest"] is None or not cask_meta["input_digests"]:
+                continue
+
+            input_digests = {
+                spirit.label(): None if casks[spirit] is None else casks[spirit]["digest"]
+                for spirit in inputs[node]
+            }
+
+            if None not in input_digests.values() and input_digests == cask_meta["input_digests"]:
+                cut_off.append(node)
+
+        if len(cut_off) > 0:
+            # The casks are as recent as a rebuild would be
+            self.env.meta.update_casks(
+                [node.spirit.spirit_id() for node in cut_off],
+                digests=[casks[node.spirit]["digest"] for node in cut_off],
+                input_digests=[casks[node.spirit]["input_digests"] for node in cut_off],
+                fingerprints=[casks[node.spirit]["fingerprint"] for node in cut_off]
+            )
+
+            for node in cut_off:
+                self.logger.notice("Skip spirit %s, none of its inputs changed" % node.spirit)
+
+        return set(cut_off)
+
+    def __discard(self, node):
+        """Remove a pending node from the graph index and the runnable spirits"""
+
+        if self._is_pending(node):
+            del self.nodes[node.spirit]
+            self.ready.remove(node.spirit)
+
+        node.removed = True
+
+    def __drop_targets(self, node):
+        for _ in node.targets:
+            self.target_refs[node.spirit] -= 1
+
+            if self.target_refs[node.spirit] == 0:
+                del self.target_refs[node.spirit]
+
+        node.targets = []
+
+    def __remove_dependents(self, node):
+        """Remove node and all nodes depending on it (including their targets).
+        Dependencies that are not needed by any other target any more are removed as well.
+        """
+
+        removed = []
+        stack = [node]
+
+        while stack:
+            curr = stack.pop()
+
+            if curr.removed:
+                continue
+
+            self.__discard(curr)
+            self.__drop_targets(curr)
+            removed.append(curr)
+            stack.extend(curr.children)
+
+        unused = []
+
+        for curr in removed:
+            for parent in list(curr.parents):
+                curr.remove_parent(parent)
+                unused.append(parent)
+
+        # Release dependencies without any dependents (reference count 0)
+        while unused:
+            curr = unused.pop()
+
+            if curr.removed or curr.running or len(curr.children) > 0 or len(curr.targets) > 0:
+                continue
+
+            self.__discard(curr)
+
+            for parent in list(curr.parents):
+                curr.remove_parent(parent)
+                unused.append(parent)
+
+    def __get_casks(self, spirits):
+        """Returns a dictionary of spirit -> cask information for all spirits that have a cask"""
+
+        casks = self.env.meta.get_casks([spirit.spirit_id() for spirit in spirits])
+
+        return {
+            spirit: cask_meta
+            for spirit, cask_meta in zip(spirits, casks)
+            if cask_meta is not None
+        }
 
     def __next(self):
         """Returns the next possible spirit to execute
         Returns None if there is no candidate"""
 
-        for branch in self.branches:
-            for root in branch.roots:
-                if root.spirit not in self.running_spirits and not self.__is_locked(root.spirit):
-                    return root.spirit
+        return self.ready.pop(self.__blocked_by)
+
+    def __blocked_by(self, spirit):
+        """Returns the key a spirit is waiting for (running instance or lock), None if it can be executed"""
+
+        if spirit in self.running_spirits:
+            return "running", spirit
+
+        for lock in spirit.locks():
+            if lock in self.locks:
+                return "lock", lock
 
         return None
 
@@ -164,72 +442,42 @@ class SchedulingGraph:
     def __unlock(self, spirit):
         for lock in spirit.locks():
             self.locks.pop(lock)
+            self.ready.release(("lock", lock))
 
-    def __is_locked(self, spirit):
-        for lock in spirit.locks():
-            if lock in self.locks:
-                return True
-
-        return False
-
-    def __sort_branches(self):
-        self.branches = sorted(self.branches, key=lambda b: b.scheduling_info.priority, reverse=True)
-
-
-class SchedulingBranch:
-    def __init__(self, scheduling_info, roots):
-        self.scheduling_info = scheduling_info
-        self.roots = roots
 
-        self.spirits = {}
+class SchedulingNode:
+    def __init__(self, spirit):
+        self.spirit = spirit
 
-        # Set key map for all spirits being contained in this branch
-        queue = collections.deque()
-        queue.extend(roots)
+        # Insertion ordered sets of pending dependencies and dependents
+        self.parents = {}
+        self.children = {}
 
-        while queue:
-            curr = queue.popleft()
-            self.spirits[curr.spirit] = True
-
-            for child in curr.children:
-                queue.append(child)
-
-    def finish_if_root(self, spirit):
-        """Remove a spirit as done from execution branch.
-        If the child of this spirit has no other dependencies any more
-        make it root to mark it available next for execution
-        """
+        # Scheduling infos of all targets this node is the target spirit of
+        self.targets = []
 
-        assert len(self.spirits) >= len(self.roots)
+        # Highest priority of all targets depending on this node
+        self.priority = 0
 
-        new_roots = set()
+        # Predicted remaining critical path in seconds (only maintained by ranking graphs that need it)
+        self.critical_path = None
 
-        for root in self.roots:
-            if root.spirit == spirit:
-                # If dependency exists more than once it could happen
-                # that it has been removed already
-                # Therefore check if it exists
-                if spirit in self.spirits:
-                    self.spirits.pop(spirit)
-
-                for child in root.children:
-                    child.remove_parent(root)
-
-                    if len(child.parents) == 0:
-                        new_roots.add(child)
-            else:
-                new_roots.add(root)
+        # Own cask is missing or too old, otherwise the node is only executed because of its dependencies
+        self.expired = False
 
-        self.roots = list(new_roots)
+        self.running = False
+        self.removed = False
+        self.start_date = None
 
-    def is_complete(self):
-        assert len(self.spirits) >= len(self.roots)
+    def add_parent(self, parent):
+        self.parents[parent] = True
+        parent.children[self] = True
 
-        return len(self.spirits) == 0
+        return self
 
-    def spirit_in_root(self, spirit):
-        return spirit in self.spirits and \
-               len([root.spirit for root in self.roots if root.spirit == spirit]) > 0
+    def remove_parent(self, parent):
+        del self.parents[parent]
+        del parent.children[self]
 
-    def contains_spirit(self, spirit):
-        return spirit in self.spirits
+    def __repr__(self):
+        return repr(self.spirit)
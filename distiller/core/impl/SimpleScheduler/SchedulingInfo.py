@@ -8,7 +8,8 @@ class SchedulingInfo:
         reoccurring=False,
         start_date=None,
         end_date=None,
-        schedule_id=None
+        schedule_id=None,
+        lead_time=0
     ):
         self.spirit_id = spirit_id
         self.age_requirement = age_requirement
@@ -18,6 +19,8 @@ class SchedulingInfo:
         self.start_date = start_date
         self.end_date = end_date
         self.schedule_id = schedule_id
+        # Predicted execution time (in seconds) the target is started ahead of its age requirement
+        self.lead_time = lead_time
 
     def __gt__(self, other_info):
         return self.next_exec_date > other_info.next_exec_date
@@ -1,15 +1,24 @@
-from threading import Lock
+from threading import Lock, Condition
 import datetime
+import time
 
 from distiller.core.interfaces.Scheduler import Scheduler, FinishState
 from distiller.core.impl.SimpleScheduler.SchedulingGraph import SchedulingGraph
 from distiller.core.impl.SimpleScheduler.SchedulingBacklog import SchedulingBacklog
 from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
+from distiller.core.impl.SimpleScheduler.ExecutionPredictor import ExecutionPredictor
+from distiller.utils.DependencyExplorer import DependencyExplorer
+from distiller.utils.TaskLoader import TaskLoader
 
-from distiller.api.AbstractTask import spirit_id_to_label
+from distiller.api.SpiritId import SpiritId
 
 
 class SimpleScheduler(Scheduler):
+    graph_class = SchedulingGraph
+
+    # Minimum time in seconds a waiting request sleeps before rechecking the backlog
+    min_wait = 0.05
+
     def __init__(self, env):
         self.env = env
         self.logger = self.env.logger.claim("Scheduler")
@@ -17,43 +26,112 @@ class SimpleScheduler(Scheduler):
         # Lock for controlling any scheduler access, since this can come from different threads
         self._lock = Lock()
 
+        # Signalled whenever a spirit might have become runnable, for requests waiting for jobs
+        self._runnable = Condition(self._lock)
+
+        # Execution time prediction from runtimes of finished spirits, shared by graph and backlog
+        self.predictor = ExecutionPredictor.from_config(self.env.config)
+
         # Graph structure for active scheduler (tasks that are waiting for execution/are being executed)
-        self.graph = SchedulingGraph(self.env, self.logger)
+        self.graph = self.graph_class(self.env, self.logger, predictor=self.predictor)
 
         # Backlog for scheduled tasks that are not yet actively needed
-        self.backlog = SchedulingBacklog(self.env, self.logger)
+        self.backlog = SchedulingBacklog(self.env, self.logger, predictor=self.predictor)
+
+    def run_next(self, wait=None):
+        transactions = self.run_batch(1, wait=wait)
+
+        if len(transactions) == 0:
+            return None
+
+        return transactions[0]
+
+    def run_batch(self, max_jobs, wait=None):
+        transactions = []
+        deadline = None if not wait else time.monotonic() + wait
 
-    def run_next(self):
         with self._lock:
-            # Add all targets from backlog that should be executed now to the active scheduled
-            for schedule_info in self.backlog.consume_all():
-                self.graph.add_target(schedule_info)
+            while True:
+                # Add all targets from backlog that should be executed now to the active scheduled
+                for schedule_info in self.backlog.consume_all():
+                    self.graph.add_target(schedule_info)
+
+                # Get next (active) tasks to execute (depending on dependencies, priorities, etc)
+                while len(transactions) < max_jobs:
+                    next_transaction = self.graph.run_next()
+
+                    if next_transaction is None:
+                        break
+
+                    transactions.append(next_transaction)
+
+                if len(transactions) > 0 or deadline is None:
+                    break
+
+                timeout = deadline - time.monotonic()
 
-            # Get next (active) task to execute (depending on dependencies, priorities, etc)
-            next_transaction = self.graph.run_next()
+                if timeout <= 0:
+                    break
 
-        if next_transaction is not None:
+                # Wake up for the next backlog target at the latest
+                next_exec = self.backlog.next_execution()
+
+                if next_exec is not None:
+                    timeout = min(
+                        timeout,
+                        max(self.min_wait, (next_exec - datetime.datetime.now()).total_seconds())
+                    )
+
+                self._runnable.wait(timeout)
+
+        for transaction in transactions:
             self.logger.notice(
                 "Start execution of %s (transaction id %i)" % (
-                    spirit_id_to_label(*next_transaction["spirit_id"]), next_transaction["transaction_id"]
+                    SpiritId(transaction["spirit_id"]).label, transaction["transaction_id"]
                 )
             )
 
-        return next_transaction
+        return transactions
+
+    def finish_spirit(self, transaction_id, finish_state=FinishState.SUCCESS, message=None, stats=None):
+        if stats is None:
+            stats = {}
 
-    def finish_spirit(self, transaction_id, finish_state=FinishState.SUCCESS, message=None):
         with self._lock:
             # Get spirit object for transaction_id
             spirit = self.graph.get_spirit(transaction_id)
+            start_date = self.graph.get_start_date(transaction_id)
+
+            # Casks of the dependencies the spirit has been built from
+            input_spirits = DependencyExplorer.input_spirits(spirit)
+            input_casks = self.env.meta.get_casks([input_spirit.spirit_id() for input_spirit in input_spirits])
+
+            self.__add_execution(transaction_id, spirit, start_date, finish_state, stats, input_casks)
 
             if finish_state == FinishState.SUCCESS:
                 self.logger.notice(
                     "Successfully finished spirit %s (transaction id %i)" % (spirit, transaction_id)
                 )
-                self.graph.finish_spirit(transaction_id)
 
-                # Only update cask date for successful execution
-                self.env.meta.update_cask(spirit.spirit_id())
+                # Only update cask for successful execution
+                # This has to happen before finishing it in the graph, which compares the digests of its dependents
+                self.env.meta.update_cask(
+                    spirit.spirit_id(),
+                    digest=stats.get("digest", None),
+                    input_digests={
+                        input_spirit.label(): None if cask_meta is None else cask_meta["digest"]
+                        for input_spirit, cask_meta in zip(input_spirits, input_casks)
+                    },
+                    fingerprint=TaskLoader.fingerprint(spirit)
+                )
+                self.backlog.cask_updated(spirit.spirit_id())
+
+                # Dependents without changed inputs are completed right away
+                for cut_off_spirit in self.graph.finish_spirit(transaction_id):
+                    self.backlog.cask_updated(cut_off_spirit.spirit_id())
+
+                # Learn runtime for execution time prediction
+                self.predictor.record(spirit, datetime.datetime.now() - start_date)
             else:
                 error_message = "Spirit %s (transaction id %i) exited with state %s: %s" % (
                     spirit, transaction_id, finish_state.name, "No message" if message is None else message
@@ -67,6 +145,26 @@ class SimpleScheduler(Scheduler):
                 # Abort spirit (this also removes all tasks that depend on the erroneous spirit)
                 self.graph.abort_spirit(transaction_id)
 
+            # Dependents or spirits waiting for the released locks might be runnable now
+            self._runnable.notify_all()
+
+    def __add_execution(self, transaction_id, spirit, start_date, finish_state, stats, input_casks):
+        """Add execution to the execution history of the meta db"""
+
+        with self.logger.catch(Exception).warning():
+            self.env.meta.add_execution({
+                "transaction_id": transaction_id,
+                "spirit_id": spirit.spirit_id(),
+                "start_date": start_date,
+                "end_date": datetime.datetime.now(),
+                "finish_state": finish_state.name,
+                "worker": stats.get("worker", None),
+                "rows": stats.get("rows", None),
+                "bytes": stats.get("bytes", None),
+                # Cask versions of the dependencies the spirit has been built from
+                "inputs": [cask for cask in input_casks if cask is not None]
+            })
+
     def time_until_next(self):
         with self._lock:
             if self.graph.is_empty():
@@ -95,8 +193,9 @@ class SimpleScheduler(Scheduler):
 
         with self._lock:
             self.backlog.add(schedule_info, persistent=options.get("persistent", False))
+            self._runnable.notify_all()
 
-        self.logger.notice("Add %s to scheduler with options %s" % (spirit_id_to_label(*target_spirit_id), options))
+        self.logger.notice("Add %s to scheduler with options %s" % (SpiritId(target_spirit_id).label, options))
 
     def remove_target(self, target_spirit_id, persistent=False):
         with self._lock:
@@ -104,14 +203,22 @@ class SimpleScheduler(Scheduler):
 
         self.logger.notice(
             "Remove %s from scheduler%s" % (
-                spirit_id_to_label(*target_spirit_id),
+                SpiritId(target_spirit_id).label,
                 (" persistently" if persistent else "")
             )
         )
 
     def event_still_updated(self, still):
-        # TODO update scheduling graph with new still definition (update dependencies)
-        pass
+        with self._lock:
+            # Casks built with the previous definition are expired (fingerprint changed)
+            TaskLoader.invalidate(still)
+            self.backlog.still_updated(still)
+            self._runnable.notify_all()
+
+    def event_cask_updated(self, spirit_id):
+        # Caller holds the scheduler lock (see `Scheduler.event_cask_updated`)
+        self.backlog.cask_updated(spirit_id)
+        self._runnable.notify_all()
 
     def lock(self):
         return self._lock
@@ -119,7 +226,7 @@ class SimpleScheduler(Scheduler):
     def get_active_targets(self):
         # FIXME: lock this? double lock in GarbageCollector then though
 
-        return [branch.scheduling_info.spirit_id for branch in self.graph.branches]
+        return self.graph.get_active_targets()
 
 
 module_class = SimpleScheduler
@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+
+
+class TaskBundle:
+    """Gzipped tarball of the task root, built once and rebuilt only if the task tree changed
+
+    The tree is compared by the relative paths, modification times and sizes of its files,
+    at most every `revalidate_interval` seconds. Byte code caches are not part of the bundle.
+    The bundle is identified by the SHA-256 digest of its content (e.g. as ETag). The archive is reproducible
+    (sorted members without timestamps and owners), so that the same tree always has the same digest.
+    """
+
+    revalidate_interval = 1
+
+    def __init__(self, paths=None):
+        """
+        Keyword arguments:
+        paths -- Optional list of files and directories (relative to the task root) to bundle instead of the task root
+        """
+
+        self.paths = None if paths is None else sorted(set(paths))
+        self.lock = threading.Lock()
+        self.bundle_dir = None
+
+        self.task_root = None
+        self.signature = None
+        self.checked_at = None
+        self.path = None
+        self.digest = None
+
+    def current(self, task_root):
+        """Returns the digest of the bundle of task_root, None if task_root does not exist"""
+
+        with self.lock:
+            if not self.__revalidate(task_root):
+                return None
+
+            return self.digest
+
+    def open(self, task_root):
+        """Returns the tuple (opened bundle file, digest) of the bundle of task_root, None if task_root does not exist
+        The file stays readable if the bundle is rebuilt in the meantime and has to be closed by the caller.
+        """
+
+        with self.lock:
+            if not self.__revalidate(task_root):
+                return None
+
+            return open(self.path, "rb"), self.digest
+
+    def __revalidate(self, task_root):
+        """Rebuild the bundle if task_root changed, returns if task_root exists"""
+
+        if not os.path.isdir(task_root):
+            return False
+
+        now = time.monotonic()
+
+        if self.task_root == task_root and now - self.checked_at < self.revalidate_interval:
+            return True
+
+        signature = tree_signature(task_root, self.paths)
+
+        if self.task_root != task_root or signature != self.signature:
+            self.__build(task_root)
+
+        self.task_root = task_root
+        self.signature = signature
+        self.checked_at = now
+
+        return True
+
+    def __build(self, task_root):
+        if self.bundle_dir is None:
+            self.bundle_dir = tempfile.mkdtemp(prefix="distiller-bundle-")
+
+        fd, tmp_file = tempfile.mkstemp(dir=self.bundle_dir)
+        os.close(fd)
+
+        # No file name and timestamp in the gzip header
+        with open(tmp_file, "wb") as f, gzip.GzipFile(filename="", fileobj=f, mode="wb", mtime=0) as gz:
+            with tarfile.open(fileobj=gz, mode="w") as tar:
+                for file_path, name in tree_members(task_root, self.paths):
+                    tar.add(file_path, arcname=name, recursive=False, filter=normalize_member)
+
+        digest = hashlib.sha256()
+
+        with open(tmp_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+
+        path = os.path.join(self.bundle_dir, digest.hexdigest() + ".tar.gz")
+        os.replace(tmp_file, path)
+
+        # Responses that are still being sent keep their opened file
+        if self.path is not None and self.path != path:
+            os.remove(self.path)
+
+        self.path = path
+        self.digest = digest.hexdigest()
+
+    def close(self):
+        with self.lock:
+            if self.bundle_dir is not None:
+                shutil.rmtree(self.bundle_dir, ignore_errors=True)
+
+            self.bundle_dir = None
+            self.task_root = None
+            self.path = None
+            self.digest = None
+
+
+def normalize_member(tar_info):
+    """Drop everything from a member that differs between builds of the same tree"""
+
+    tar_info.mtime = 0
+    tar_info.uid = 0
+    tar_info.gid = 0
+    tar_info.uname = ""
+    tar_info.gname = ""
+
+    return tar_info
+
+
+def tree_members(root, paths=None):
+    """Yields the tuples (path, path relative to root) of all directories and files in a directory tree,
+    in sorted order and without byte code caches
+
+    Keyword arguments:
+    paths -- Optional list of files and directories (relative to root) to include instead of the whole tree
+    """
+
+    for path in (["."] if paths is None else paths):
+        if os.path.isfile(os.path.join(root, path)):
+            yield os.path.join(root, path), os.path.normpath(path)
+            continue
+
+        for dir_path, dir_names, file_names in os.walk(os.path.join(root, path)):
+            dir_names[:] = sorted(dir_name for dir_name in dir_names if dir_name != "__pycache__")
+
+            yield dir_path, os.path.normpath(os.path.relpath(dir_path, root))
+
+            for file_name in sorted(file_names):
+                if not file_name.endswith(".pyc"):
+                    yield os.path.join(dir_path, file_name), os.path.relpath(os.path.join(dir_path, file_name), root)
+
+
+def tree_signature(root, paths=None):
+    """Returns a cheap signature of the files in a directory tree (relative paths, modification times, sizes)
+
+    Keyword arguments:
+    paths -- Optional list of files and directories (relative to root) to include instead of the whole tree
+    """
+
+    signature = []
+
+    for file_path, name in tree_members(root, paths):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+
+        if not os.path.isdir(file_path):
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+
+    return hashlib.sha256(repr(signature).encode("utf-8")).hexdigest()
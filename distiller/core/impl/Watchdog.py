@@ -35,6 +35,11 @@ class Watchdog:
         with self.lock:
             self.queue.add(transaction_id)
 
+    def add_all(self, transaction_ids):
+        with self.lock:
+            for transaction_id in transaction_ids:
+                self.queue.add(transaction_id)
+
     def heartbeat(self, transaction_id):
         with self.lock:
             self.queue.update(transaction_id)
@@ -1,6 +1,12 @@
 class Meta:
     def get_cask(self, spirit_id):
         """Returns cask information for spirit
+        Cask information is a dictionary with
+            spirit_id -- Spirit id of the cask
+            last_completion -- Datetime of the last completion
+            digest -- Content digest of the cask (or None if unknown)
+            input_digests -- Dictionary of input spirit label -> cask digest the cask has been built from (or None)
+            fingerprint -- Fingerprint of the still definition the cask has been built with (or None)
 
         Arguments:
         spirit -- Spirit id to get cask from
@@ -8,11 +14,21 @@ class Meta:
 
         raise NotImplementedError
 
+    def get_casks(self, spirit_ids):
+        """Returns cask information for multiple spirits at once
+        The result is a list in the order of spirit_ids, with None for spirits without cask
+
+        Arguments:
+        spirit_ids -- List of spirit ids to get casks from
+        """
+
+        raise NotImplementedError
+
     def get_all_casks(self):
         """Returns all cask information that is available as an array
         """
 
-    def update_cask(self, spirit_id, completion=None):
+    def update_cask(self, spirit_id, completion=None, digest=None, input_digests=None, fingerprint=None):
         """Update cask information for spirit
 
         Arguments:
@@ -20,6 +36,27 @@ class Meta:
 
         Keyword arguments:
         completion -- New completion date, None to set to now
+        digest -- Content digest of the cask, None if unknown
+        input_digests -- Dictionary of input spirit label -> cask digest the cask has been built from
+        fingerprint -- Fingerprint of the still definition (see `TaskLoader.fingerprint`), None if unknown
+        """
+
+        raise NotImplementedError
+
+    def update_casks(
+            self, spirit_ids, completion=None, completions=None, digests=None, input_digests=None, fingerprints=None
+    ):
+        """Update cask information for multiple spirits at once (in one transaction)
+
+        Arguments:
+        spirit_ids -- List of spirit ids to update
+
+        Keyword arguments:
+        completion -- New completion date for all of them, None to set to now
+        completions -- List of completion dates in the order of spirit_ids (instead of completion)
+        digests -- List of content digests in the order of spirit_ids, None if unknown
+        input_digests -- List of input digest dictionaries in the order of spirit_ids, None if unknown
+        fingerprints -- List of still fingerprints in the order of spirit_ids, None if unknown
         """
 
         raise NotImplementedError
@@ -34,6 +71,72 @@ class Meta:
 
         raise NotImplementedError
 
+    def invalidate_casks(self, spirit_ids):
+        """Invalidate casks of multiple spirits at once (in one transaction)
+        Spirits without cask are ignored
+
+        Arguments:
+        spirit_ids -- List of spirit ids to invalidate casks for
+
+        Returns the number of invalidated casks
+        """
+
+        raise NotImplementedError
+
+    def add_execution(self, execution):
+        """Add an execution of a spirit to the execution history
+
+        Arguments:
+        execution -- Dictionary with
+            transaction_id -- Transaction id of the execution
+            spirit_id -- Spirit id of the executed spirit
+            start_date, end_date -- Start and end datetime of the execution
+            finish_state -- Name of the FinishState the execution ended with
+            worker -- Id of the worker that executed the spirit (or None)
+            rows, bytes -- Number of rows and bytes written (or None)
+            inputs -- List of dictionaries with spirit_id and last_completion of the input casks
+        """
+
+        raise NotImplementedError
+
+    def get_executions(self, spirit_id=None, still=None, since=None, finish_state=None, order_by="end_date", limit=100):
+        """Returns executions of the execution history in descending order
+        Every execution is a dictionary as in `add_execution` with an additional duration in seconds
+
+        Keyword arguments:
+        spirit_id -- Only executions of this spirit
+        still -- Only executions of spirits of this still
+        since -- Only executions that ended after this datetime
+        finish_state -- Only executions with this finish state name
+        order_by -- "end_date" (latest first) or "duration" (slowest first)
+        limit -- Maximum number of executions to return
+        """
+
+        raise NotImplementedError
+
+    def compact_executions(self):
+        """Remove executions from the history that exceed the retention (`meta.executions.*`)
+
+        Returns the number of removed executions
+        """
+
+        raise NotImplementedError
+
+    def flush(self):
+        """Write all pending changes, if the implementation delays any"""
+
+        pass
+
+    def close(self):
+        """Release all resources (e.g. open connections), the meta object must not be used afterwards"""
+
+        pass
+
+    def stats(self):
+        """Returns a dictionary of statistics for monitoring, empty if the implementation has none"""
+
+        return {}
+
     def get_scheduled_infos(self):
         """Returns array of scheduling info of all (persistent) scheduled spirits"""
 
@@ -12,18 +12,39 @@ class FinishState(Enum):
 
 
 class Scheduler:
-    def run_next(self):
+    def run_next(self, wait=None):
         """Attempts to run one spirit that is in queue
 
         Note: This does not directly run the target but only return it.
         By calling this method the scheduler assumes that target to be running
 
+        Keyword arguments:
+        wait -- Optional number of seconds to wait for a spirit to become runnable if there is none
+                (e.g. because a target is added, a spirit finished or a scheduled target is due)
+
         Returns a dictionary with transaction_id and spirit, or None if there is no next spirit
         """
 
         raise NotImplementedError
 
-    def finish_spirit(self, transaction_id, finish_state=FinishState.SUCCESS, message=None):
+    def run_batch(self, max_jobs, wait=None):
+        """Attempts to run up to max_jobs spirits that are in queue at once
+
+        Note: All returned spirits are reserved atomically and do not conflict with each other's locks.
+        By calling this method the scheduler assumes all returned targets to be running
+
+        Arguments:
+        max_jobs -- Maximum number of spirits to return
+
+        Keyword arguments:
+        wait -- Optional number of seconds to wait for a spirit to become runnable if there is none (see `run_next`)
+
+        Returns a list of dictionaries with transaction_id and spirit (empty if there is no next spirit)
+        """
+
+        raise NotImplementedError
+
+    def finish_spirit(self, transaction_id, finish_state=FinishState.SUCCESS, message=None, stats=None):
         """Indicate a spirit as finished and remove it from the scheduler
 
         Arguments:
@@ -33,6 +54,7 @@ class Scheduler:
         finish_state -- State to finish with, if this is not FinishState.SUCCESS the cask date is not updated
                         and further branch execution aborted
         message -- Optional message (mainly for execution errors to write to log)
+        stats -- Optional dictionary of execution statistics reported by the worker (worker, rows, bytes, digest)
         """
 
         raise NotImplementedError
@@ -69,6 +91,16 @@ class Scheduler:
 
         raise NotImplementedError
 
+    def event_cask_updated(self, spirit_id):
+        """Indicate that the cask of a spirit has been updated or invalidated from outside the scheduler
+        Must be called while holding the scheduler lock (see `lock`)
+
+        Arguments:
+        spirit_id -- Spirit id of the changed cask
+        """
+
+        raise NotImplementedError
+
     def lock(self):
         """Returns a file context to lock the scheduler for changes to do some external retrievals
         """
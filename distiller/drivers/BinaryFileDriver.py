@@ -3,7 +3,7 @@ import shutil
 
 from distiller.api.Reader import Reader, ReadIterator
 from distiller.api.Writer import Writer, WriteModes, WriteAfterCommitException
-from distiller.drivers.internal.FileDriver import FileDriver, get_temp_path
+from distiller.drivers.internal.FileDriver import FileDriver, get_temp_path, file_digest
 
 
 class BinaryFileDriver(FileDriver):
@@ -72,6 +72,7 @@ class FileWriter(Writer):
         self.committed = False
         self.mode = mode + ("b" if self.kwargs.get("binary", False) else "")
         self.file = None
+        self.content_digest = None
 
     def write(self, data):
         """Write a relational entry, or an entire blob"""
@@ -93,6 +94,12 @@ class FileWriter(Writer):
 
         shutil.move(get_temp_path(self.file_path), self.file_path)
 
+        # Digest of the whole file, since appending keeps the previous content
+        self.content_digest = file_digest(self.file_path)
+
+    def digest(self):
+        return self.content_digest
+
     def __enter__(self):
         self.file = open(get_temp_path(self.file_path), self.mode, **self.kwargs.get("file_params", {}))
 
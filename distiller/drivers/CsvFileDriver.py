@@ -4,7 +4,7 @@ import shutil
 
 from distiller.api.Reader import Reader, ReadIterator
 from distiller.api.Writer import Writer, WriteModes, WriteAfterCommitException
-from distiller.drivers.internal.FileDriver import FileDriver, get_temp_path
+from distiller.drivers.internal.FileDriver import FileDriver, get_temp_path, file_digest
 from distiller.drivers.BinaryFileDriver import BlobIterator
 
 
@@ -85,6 +85,7 @@ class CsvFileWriter(Writer):
         self.committed = False
         self.file = None
         self.writer = None
+        self.content_digest = None
 
     def write(self, data):
         """Write a relational entry, or an entire blob"""
@@ -107,6 +108,11 @@ class CsvFileWriter(Writer):
 
         shutil.move(get_temp_path(self.file_path), self.file_path)
 
+        self.content_digest = file_digest(self.file_path)
+
+    def digest(self):
+        return self.content_digest
+
     def __exit__(self, type, value, traceback):
         """If exit appears without a commit, undo all changes"""
 
@@ -156,6 +162,7 @@ class UpdateCsvFileWriter(Writer):
         self.key = key
         self.kwargs = kwargs
         self.committed = False
+        self.content_digest = None
 
         self.rows = {}
         self.key_index = {}
@@ -217,6 +224,11 @@ class UpdateCsvFileWriter(Writer):
 
         shutil.move(temp_path, self.file_path)
 
+        self.content_digest = file_digest(self.file_path)
+
+    def digest(self):
+        return self.content_digest
+
     def __enter__(self):
         if os.path.exists(self.file_path):
             with open(self.file_path) as f:
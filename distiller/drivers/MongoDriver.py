@@ -1,4 +1,4 @@
-from pymongo import MongoClient, ReplaceOne
+from pymongo import ASCENDING, MongoClient, ReplaceOne
 import json
 import hashlib
 import importlib
@@ -33,12 +33,12 @@ class MongoDriver(DataDriver):
         )
 
     def __collection(self, spirit):
-        label = spirit.label()
-        simple_label = self.simplify_pattern.sub("", label)
+        spirit_id = spirit.spirit_id()
+        simple_label = self.simplify_pattern.sub("", spirit_id.label)
 
         return (
             self.kwargs.get("collection_prefix", "") + simple_label
-        )[:35] + "_" + hashlib.sha256(label.encode("utf-8")).hexdigest()
+        )[:35] + "_" + spirit_id.label_digest
 
     def __credentials(self, config):
         if "credentials" in self.kwargs:
@@ -192,6 +192,10 @@ class MongoWriter(Writer):
         self.bulk_size = kwargs.get("bulk_size", 100)
         self.cached_rows = []
 
+        # Replaced collections are digested while writing, all others at commit
+        self.content_hash = hashlib.sha256() if mode == "replace" else None
+        self.content_digest = None
+
         if key is None and mode == "update":
             raise ValueError("Key cannot be None in update mode")
 
@@ -203,6 +207,10 @@ class MongoWriter(Writer):
 
         data = data.copy()
 
+        if self.content_hash is not None:
+            # Digest before insertion, which adds an _id to the row
+            update_row_hash(self.content_hash, data)
+
         self.cached_rows.append(data)
 
         if len(self.cached_rows) >= self.bulk_size:
@@ -230,6 +238,15 @@ class MongoWriter(Writer):
 
         self.committed = True
 
+        if self.content_hash is None:
+            self.content_hash = hashlib.sha256()
+
+            # Natural order can change between reads of the same contents, _id order cannot
+            for row in self.write_coll.find({}, {"_id": False}).sort("_id", ASCENDING):
+                update_row_hash(self.content_hash, row)
+
+        self.content_digest = self.content_hash.hexdigest()
+
         self.client[self.credentials["database"]][self.collection].drop()
         self.write_coll.rename(self.collection)
 
@@ -237,6 +254,9 @@ class MongoWriter(Writer):
         self.client = None
         self.write_coll = None
 
+    def digest(self):
+        return self.content_digest
+
     def __enter__(self):
         self.client = MongoClient(self.credentials["uri"])
 
@@ -265,4 +285,9 @@ def get_temp_collection(collection):
     return "~" + collection
 
 
+def update_row_hash(content_hash, row):
+    content_hash.update(json.dumps(row, sort_keys=True, default=str).encode("utf-8"))
+    content_hash.update(b"\n")
+
+
 module_class = MongoDriver
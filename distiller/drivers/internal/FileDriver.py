@@ -22,16 +22,23 @@ class FileDriver(DataDriver):
             spirit.name(),
             task_root=config.get("drivers.settings.FileDriver.cask_path", path=True)
         )
-        file_name = self._create_file_name(spirit.parameter_id())
+        file_name = self._create_file_name(spirit.spirit_id())
 
         if create_path and not os.path.exists(task_path):
             os.makedirs(task_path)
 
         return os.path.join(task_path, file_name)
 
-    def _create_file_name(self, parameter_id):
-        return self.simplify_pattern.sub("_", parameter_id)[:50] + \
-            "_" + hashlib.sha256(parameter_id.encode("utf-8")).hexdigest()
+    def _create_file_name(self, spirit_id):
+        return self.simplify_pattern.sub("_", spirit_id.parameter_id)[:50] + "_" + spirit_id.parameter_digest
+
+    def cask_size(self, spirit, config):
+        data_path = self._get_data_path(spirit, config)
+
+        if os.path.exists(data_path):
+            return os.path.getsize(data_path)
+
+        return None
 
     def delete_cask(self, spirit, config):
         data_path = self._get_data_path(spirit, config)
@@ -109,3 +116,15 @@ def split_file_param(file):
 
 def get_temp_path(data_path):
     return data_path + "~"
+
+
+def file_digest(file_path, chunk_size=65536):
+    """Returns the sha256 hex digest of a file's content"""
+
+    content_hash = hashlib.sha256()
+
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            content_hash.update(chunk)
+
+    return content_hash.hexdigest()
@@ -0,0 +1,113 @@
+from http import HTTPStatus
+import io
+import json
+import sys
+
+from distiller.helpers.HttpRequestHandler import HttpResponses
+
+
+class BufferedRequestHandler(HttpResponses):
+    """Request handle with the interface of `HttpRequestHandler` for an already received request
+    The response is buffered and serialized with `response` (see `AsyncHttpServer`).
+    """
+
+    def __init__(self, server, command, path, request_version, headers, body):
+        self.server = server
+        self.command = command
+        self.path = path
+        self.request_version = request_version
+        self.headers = headers
+        self.body = body
+
+        self.status = None
+        self.response_headers = []
+        self.wfile = io.BytesIO()
+        # Opened file to send after the buffered response (see `send_file`)
+        self.pending_file = None
+
+    def handle(self):
+        """Dispatch the request to the handler of its route"""
+
+        if self.command == "GET":
+            handle = self.server.request_handler.resolve_get(self.path)
+
+            if handle is None:
+                return self.error(404)
+
+            return handle[0](self, handle[1])
+
+        if self.command == "POST":
+            handle = self.server.request_handler.resolve_post(self.path)
+
+            if handle is None:
+                return self.error(404)
+
+            if len(self.body) == 0:
+                req = {}
+            else:
+                try:
+                    req = json.loads(self.body.decode("utf-8"))
+                except json.JSONDecodeError:
+                    return self.error(400)
+                except Exception as e:
+                    print(str(e), file=sys.stderr)
+                    return self.error(500)
+
+            return handle[0](self, handle[1], req)
+
+        self.error(501)
+
+    def send_response(self, code, message=None):
+        # A new response replaces anything written before, e.g. if a handler failed
+        self.status = code
+        self.response_headers = []
+        self.wfile = io.BytesIO()
+        self.close_file()
+
+    def send_header(self, keyword, value):
+        self.response_headers.append((keyword, value))
+
+    def end_headers(self):
+        pass
+
+    def send_file(self, file):
+        self.pending_file = file
+
+    def close_file(self):
+        if self.pending_file is not None:
+            self.pending_file.close()
+            self.pending_file = None
+
+    def response(self, keep_alive):
+        """Returns the serialized response, with a content length so that the connection can be kept alive
+        A file to send (see `send_file`) follows the response, its content length is set by the handler.
+        """
+
+        content = self.wfile.getvalue()
+
+        if self.status is None:
+            self.status = 500
+
+        try:
+            phrase = HTTPStatus(self.status).phrase
+        except ValueError:
+            phrase = ""
+
+        lines = ["HTTP/1.1 %i %s" % (self.status, phrase)]
+
+        # The content length of a file is set by the handler
+        skipped = ("connection",) if self.pending_file is not None else ("connection", "content-length")
+
+        lines.extend(
+            "%s: %s" % (keyword, value)
+            for keyword, value in self.response_headers
+            if keyword.lower() not in skipped
+        )
+
+        # Responses to conditional requests have no content
+        if self.pending_file is None and self.status != 304:
+            lines.append("content-length: %i" % len(content))
+
+        lines.append("connection: %s" % ("keep-alive" if keep_alive else "close"))
+
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + content
@@ -1,9 +1,48 @@
 from http.server import BaseHTTPRequestHandler
 import json
+import os
 import sys
 
 
-class HttpRequestHandler(BaseHTTPRequestHandler):
+class HttpResponses:
+    """Response helpers of a request handle, written with send_response, send_header, end_headers and wfile"""
+
+    def error(self, code):
+        self.__send(code, "text/html", bytes("Error %i" % code, "utf8"))
+
+    def json(self, obj):
+        self.__send(200, "application/json", bytes(json.dumps(obj), "utf8"))
+
+    def text(self, message):
+        self.__send(200, "text/html", bytes(message, "utf8"))
+
+    def file(self, file, content_type, headers=None):
+        """Send an opened file, which is closed afterwards
+
+        Keyword arguments:
+        headers -- Optional dictionary of additional headers
+        """
+
+        self.send_response(200)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(os.fstat(file.fileno()).st_size))
+
+        for keyword, value in (headers or {}).items():
+            self.send_header(keyword, value)
+
+        self.end_headers()
+        self.send_file(file)
+
+    def __send(self, code, content_type, content):
+        self.send_response(code)
+        self.send_header("content-type", content_type)
+        self.send_header("charset", "utf-8")
+        self.send_header("content-length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class HttpRequestHandler(HttpResponses, BaseHTTPRequestHandler):
 
     max_length = 1024 * 1024
 
@@ -46,26 +85,12 @@ class HttpRequestHandler(BaseHTTPRequestHandler):
         else:
             handle[0](self, handle[1])
 
-    def error(self, code):
-        self.send_response(code)
-        self.send_header("content-type", "text/html")
-        self.send_header("charset", "utf-8")
-        self.end_headers()
-        self.wfile.write(bytes("Error %i" % code, "utf8"))
-
-    def json(self, obj):
-        self.send_response(200)
-        self.send_header("content-type", "application/json")
-        self.send_header("charset", "utf-8")
-        self.end_headers()
-        self.wfile.write(bytes(json.dumps(obj), "utf8"))
-
-    def text(self, message):
-        self.send_response(200)
-        self.send_header("content-type", "text/html")
-        self.send_header("charset", "utf-8")
-        self.end_headers()
-        self.wfile.write(bytes(message, "utf8"))
+    def send_file(self, file):
+        try:
+            self.wfile.flush()
+            self.connection.sendfile(file)
+        finally:
+            file.close()
 
     def log_request(self, code='-', size='-'):
         # silence log requests
@@ -2,14 +2,38 @@ import re
 
 
 class RequestHandler:
+    """Routes requests to handler functions
+
+    Routes without parameters are looked up directly by the url.
+    Others are split into path segments and stored in a segment trie per request type. A segment is either
+    - static, e.g. `tasks` (a `.` is matched literally),
+    - a typed parameter `<int:name>` (converted to int), `<str:name>` or `<name>`,
+    - or a named group spanning the whole segment, e.g. `(?P<mode>all|corrupt|unused)` (passed as string).
+    Static segments take precedence over parameters, parameters are tried in registration order.
+    Routes that cannot be expressed by segments are matched as regular expressions afterwards,
+    in registration order.
+    """
+
+    converters = {
+        "int": (re.compile("[0-9]+"), int),
+        "str": (re.compile("[^/]+"), str)
+    }
+
+    static_segment = re.compile(r"[\w\-.~]*")
+    typed_segment = re.compile(r"<(?:(\w+):)?(\w+)>")
+    # Named group of a character class or alternatives, which cannot match a slash
+    group_segment = re.compile(r"\(\?P<(\w+)>((?:\[[^\]^/\\]*\]|[\w|+*?{},\-])+)\)")
+
     def __init__(self):
-        self.routes = {"get": [], "post": []}
+        self.static_routes = {"get": {}, "post": {}}
+        self.routes = {"get": RouteNode(), "post": RouteNode()}
+        self.fallback_routes = {"get": [], "post": []}
 
     def get(self, route, func):
-        self.routes["get"].append((re.compile(route), func))
+        self.__add("get", route, func)
 
     def post(self, route, func):
-        self.routes["post"].append((re.compile(route), func))
+        self.__add("post", route, func)
 
     def all(self, route, func):
         self.get(route, func)
@@ -22,12 +46,123 @@ class RequestHandler:
         return self.resolve_any("post", url)
 
     def resolve_any(self, req_type, url):
-        # TODO: make this more efficient (sub-linear) with some prefix patterns maybe?
+        func = self.static_routes[req_type].get(url, None)
+
+        if func is not None:
+            return func, {}
 
-        for (pattern, func) in self.routes[req_type]:
+        params = {}
+        func = self.routes[req_type].resolve(url.split("/"), 0, params)
+
+        if func is not None:
+            return func, params
+
+        for (pattern, fallback_func) in self.fallback_routes[req_type]:
             match = pattern.fullmatch(url)
 
             if match is not None:
-                return func, match.groupdict()
+                return fallback_func, match.groupdict()
+
+        return None
+
+    def __add(self, req_type, route, func):
+        segments = self.__parse(route)
+
+        if segments is None:
+            self.fallback_routes[req_type].append((re.compile(route), func))
+        elif all(isinstance(segment, str) for segment in segments):
+            # The first registered handler of a route wins
+            self.static_routes[req_type].setdefault(route, func)
+        else:
+            self.routes[req_type].add(segments, func)
+
+    @classmethod
+    def __parse(cls, route):
+        """Returns the segments of a route as static strings or (name, pattern, converter) tuples,
+        None if the route can only be matched as regular expression
+        """
+
+        segments = []
+
+        for segment in route.split("/"):
+            typed = cls.typed_segment.fullmatch(segment)
+
+            if typed is not None:
+                pattern, converter = cls.converters[typed.group(1) or "str"]
+                segments.append((typed.group(2), pattern, converter))
+                continue
+
+            group = cls.group_segment.fullmatch(segment)
+
+            if group is not None:
+                segments.append((group.group(1), re.compile(group.group(2)), str))
+                continue
+
+            if cls.static_segment.fullmatch(segment) is None:
+                return None
+
+            segments.append(segment)
+
+        return segments
+
+
+class RouteNode:
+    def __init__(self):
+        self.func = None
+        # Segment -> RouteNode
+        self.static = {}
+        # List of (name, pattern, converter, RouteNode)
+        self.params = []
+
+    def add(self, segments, func):
+        node = self
+
+        for segment in segments:
+            if isinstance(segment, str):
+                node = node.static.setdefault(segment, RouteNode())
+                continue
+
+            name, pattern, converter = segment
+            child = None
+
+            for (param_name, param_pattern, param_converter, param_node) in node.params:
+                if (param_name, param_pattern, param_converter) == (name, pattern, converter):
+                    child = param_node
+                    break
+
+            if child is None:
+                child = RouteNode()
+                node.params.append((name, pattern, converter, child))
+
+            node = child
+
+        # The first registered handler of a route wins
+        if node.func is None:
+            node.func = func
+
+    def resolve(self, segments, index, params):
+        """Returns the function of the route matching segments[index:], matched parameters are added to params"""
+
+        if index == len(segments):
+            return self.func
+
+        segment = segments[index]
+        child = self.static.get(segment, None)
+
+        if child is not None:
+            func = child.resolve(segments, index + 1, params)
+
+            if func is not None:
+                return func
+
+        for (name, pattern, converter, param_node) in self.params:
+            if pattern.fullmatch(segment) is not None:
+                params[name] = converter(segment)
+                func = param_node.resolve(segments, index + 1, params)
+
+                if func is not None:
+                    return func
+
+                del params[name]
 
         return None
@@ -0,0 +1,53 @@
+import copy
+import pickle
+import unittest
+
+from distiller.api.SpiritId import SpiritId
+
+
+class TestSpiritId(unittest.TestCase):
+    def test_interned(self):
+        spirit_id = SpiritId(("testing.still", {"a": 1, "b": 2}))
+
+        self.assertIs(spirit_id, SpiritId(("testing.still", {"b": 2, "a": 1})))
+        self.assertIs(spirit_id, SpiritId(spirit_id))
+        self.assertIs(spirit_id, pickle.loads(pickle.dumps(spirit_id)))
+        self.assertIs(spirit_id, copy.deepcopy(spirit_id))
+
+    def test_attributes(self):
+        spirit_id = SpiritId(("testing.still", {"b": 2, "a": 1}))
+
+        self.assertEqual(spirit_id.still_id, "testing.still")
+        self.assertEqual(spirit_id.parameters, {"a": 1, "b": 2})
+        self.assertEqual(spirit_id.parameter_id, '{"a": 1, "b": 2}')
+        self.assertEqual(spirit_id.label, 'testing.still({"a": 1, "b": 2})')
+        self.assertEqual(len(spirit_id.parameter_digest), 64)
+        self.assertEqual(len(spirit_id.label_digest), 64)
+
+    def test_tuple_compatible(self):
+        spirit_id = SpiritId(("testing.still", {"a": 1}))
+        still_id, parameters = spirit_id
+
+        self.assertEqual(still_id, "testing.still")
+        self.assertEqual(parameters, {"a": 1})
+        self.assertEqual(spirit_id, ("testing.still", {"a": 1}))
+        self.assertNotEqual(spirit_id, SpiritId(("testing.still", {"a": 2})))
+        self.assertEqual(len({spirit_id, SpiritId(("testing.still", {"a": 1})), SpiritId(("testing.other", {}))}), 2)
+
+    def test_eviction(self):
+        max_interned = SpiritId.max_interned
+        SpiritId.max_interned = 2
+
+        try:
+            spirit_id = SpiritId(("testing.still", {"evicted": 0}))
+            SpiritId(("testing.still", {"evicted": 1}))
+            SpiritId(("testing.still", {"evicted": 2}))
+
+            other = SpiritId(("testing.still", {"evicted": 0}))
+
+            # Evicted ids are recreated but still compare equal
+            self.assertIsNot(spirit_id, other)
+            self.assertEqual(spirit_id, other)
+            self.assertEqual(hash(spirit_id), hash(other))
+        finally:
+            SpiritId.max_interned = max_interned
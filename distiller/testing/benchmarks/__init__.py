@@ -0,0 +1,50 @@
+import time
+
+from distiller.helpers.extend import extend
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+
+
+def create_env(override=None):
+    """Create a daemon environment with a volatile meta db for benchmarking"""
+
+    conf = {
+        "log": {
+            "verbose_level": "ERROR",
+            "log_level": "never",
+            "exit_level": "never"
+        },
+        "meta": {
+            "module": "distiller.core.impl.SQLiteMeta",
+            "file_path": "!:d/benchmarks.db",
+            "volatile": True
+        }
+    }
+
+    extend(conf, override)
+
+    return Environment(Configuration.load("daemon", override=conf))
+
+
+def measure(func, *args, **kwargs):
+    """Returns the wall clock duration of a function call in seconds"""
+
+    start = time.perf_counter()
+    func(*args, **kwargs)
+
+    return time.perf_counter() - start
+
+
+def report(title, header, rows):
+    """Print benchmark results as a table"""
+
+    print(title)
+    print(" | ".join("%14s" % column for column in header))
+
+    for row in rows:
+        print(" | ".join(
+            "%14.3f" % column if isinstance(column, float) else "%14s" % column
+            for column in row
+        ))
+
+    print()
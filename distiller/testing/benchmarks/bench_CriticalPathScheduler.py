@@ -0,0 +1,106 @@
+import datetime
+import heapq
+import random
+
+from distiller.testing.benchmarks import create_env, report
+from distiller.core.impl.SimpleScheduler.SchedulingGraph import SchedulingGraph
+from distiller.core.impl.SimpleScheduler.CriticalPathScheduler import CriticalPathGraph
+from distiller.core.impl.SimpleScheduler.ExecutionPredictor import ExecutionPredictor
+from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
+from distiller.utils.TaskLoader import TaskLoader
+
+
+def spirit(name, requires, cost):
+    return "testing.parameter_requires", {"requires": requires, "id": name, "cost": cost}
+
+
+def chain_and_wide(chain_length=20, wide_count=20):
+    """One long chain of short spirits next to many independent longer spirits"""
+
+    chain = [spirit("chain-0", [], 1)]
+
+    for i in range(1, chain_length):
+        chain.append(spirit("chain-%i" % i, [chain[-1]], 1))
+
+    return [chain[-1]] + [spirit("wide-%i" % i, [], 5) for i in range(wide_count)]
+
+
+def random_layers(layers=8, width=12, seed=42):
+    """Random layered DAG, every spirit depends on up to three spirits of the previous layer"""
+
+    rand = random.Random(seed)
+    previous = []
+
+    for layer in range(layers):
+        current = [
+            spirit(
+                "%i-%i" % (layer, i),
+                rand.sample(previous, min(len(previous), rand.randint(0, 3))),
+                rand.choice([1, 1, 2, 5, 10])
+            )
+            for i in range(width)
+        ]
+        previous = current
+
+    return [spirit("sink", previous, 1)]
+
+
+def simulate(graph_class, targets, workers):
+    """Returns the simulated makespan of all targets with a number of workers and perfectly known runtimes"""
+
+    env = create_env()
+
+    predictor = ExecutionPredictor()
+    graph = graph_class(env, env.logger.claim("Benchmark"), predictor=predictor)
+
+    def learn(spirit_id):
+        spirit_instance = TaskLoader.init(spirit_id)
+        predictor.record(spirit_instance, datetime.timedelta(seconds=spirit_instance.parameters["cost"]))
+
+        for dep in spirit_instance.requires():
+            learn(dep)
+
+    for target in targets:
+        learn(target)
+        graph.add_target(SchedulingInfo(target, None, None))
+
+    now = 0.0
+    running = []
+
+    while True:
+        while len(running) < workers:
+            transaction = graph.run_next()
+
+            if transaction is None:
+                break
+
+            heapq.heappush(running, (now + transaction["spirit_id"][1]["cost"], transaction["transaction_id"]))
+
+        if not running:
+            break
+
+        now, transaction_id = heapq.heappop(running)
+        graph.finish_spirit(transaction_id)
+
+    assert graph.is_empty()
+
+    return now
+
+
+def bench_makespan(workers=(2, 4, 8)):
+    rows = []
+
+    for name, targets in (("chain+wide", chain_and_wide()), ("random", random_layers())):
+        for worker_count in workers:
+            rows.append((
+                name,
+                worker_count,
+                simulate(SchedulingGraph, targets, worker_count),
+                simulate(CriticalPathGraph, targets, worker_count)
+            ))
+
+    report("Makespan on synthetic DAGs", ("dag", "workers", "simple", "critical path"), rows)
+
+
+if __name__ == "__main__":
+    bench_makespan()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest.mock
+
+from distiller.testing.benchmarks import measure, report
+from distiller.utils.PathFinder import PathFinder
+from distiller.utils.DependencyExplorer import DependencyExplorer
+
+CHAIN_DEFINITION = """
+import sys
+
+from distiller.api.DefaultStill import DefaultStill
+
+
+class Still(DefaultStill):
+    def occurrences(self):
+        return sys.maxsize
+
+    def default_parameters(self):
+        return {"level": 0, "depth": 100}
+
+    def requires(self):
+        if self.parameters["level"] >= self.parameters["depth"]:
+            return []
+
+        return [(self.name(), dict(self.parameters, level=self.parameters["level"] + 1))]
+"""
+
+DIAMOND_DEFINITION = """
+import sys
+
+from distiller.api.DefaultStill import DefaultStill
+
+
+class Still(DefaultStill):
+    def occurrences(self):
+        return sys.maxsize
+
+    def default_parameters(self):
+        return {"level": 0, "index": 0, "depth": 10, "width": 2}
+
+    def requires(self):
+        if self.parameters["level"] >= self.parameters["depth"]:
+            return []
+
+        return [
+            (self.name(), dict(self.parameters, level=self.parameters["level"] + 1, index=i))
+            for i in range(self.parameters["width"])
+        ]
+"""
+
+
+def create_task_root():
+    """Create a task root with the `bench.chain` still (a single path of depth spirits)
+    and the `bench.diamond` still (depth layers of width spirits, each requiring the complete next layer)
+    """
+
+    task_root = tempfile.mkdtemp()
+
+    for still, definition in (("chain", CHAIN_DEFINITION), ("diamond", DIAMOND_DEFINITION)):
+        task_path = os.path.join(task_root, "bench", still)
+        os.makedirs(task_path)
+
+        with open(os.path.join(task_path, "definition.py"), "w") as f:
+            f.write(definition)
+
+    return task_root
+
+
+def bench_build_graph(title, header, targets, repetitions=3):
+    rows = []
+
+    for parameters, target in targets:
+        try:
+            spirit_count = len(DependencyExplorer.involved_spirits(target))
+
+            duration = min(
+                measure(DependencyExplorer.build_graph, target)
+                for _ in range(repetitions)
+            )
+        except RecursionError:
+            spirit_count, duration = "-", float("nan")
+
+        rows.append(parameters + (spirit_count, duration * 1e3))
+
+    report(title, header + ("spirits", "build [ms]"), rows)
+
+
+def bench_explore(depths=(100, 500, 2000, 10000), diamonds=((2, 10), (2, 16), (10, 4), (10, 6), (50, 20))):
+    """Measure building the graph of a deep chain and of stacked diamonds (2^depth paths for a width of 2)"""
+
+    task_root = create_task_root()
+
+    try:
+        with unittest.mock.patch.dict(os.environ, {PathFinder.task_env: task_root}):
+            bench_build_graph(
+                "DependencyExplorer chain",
+                ("depth",),
+                [((depth,), ("bench.chain", {"depth": depth})) for depth in depths]
+            )
+
+            bench_build_graph(
+                "DependencyExplorer diamonds",
+                ("width", "depth"),
+                [((width, depth), ("bench.diamond", {"width": width, "depth": depth})) for width, depth in diamonds]
+            )
+    finally:
+        shutil.rmtree(task_root)
+
+
+if __name__ == "__main__":
+    bench_explore()
@@ -0,0 +1,108 @@
+import http.client
+import threading
+import time
+
+from distiller.testing.benchmarks import create_env, report
+from distiller.core.impl.CoreHandler import CoreHandler
+from distiller.core.impl.HttpServer import HttpServer
+from distiller.core.impl.AsyncHttpServer import AsyncHttpServer
+
+
+def poll_workers(port, worker_count, polls, slow_requests):
+    """Simulate workers polling `/tasks/run`, each on its own (keep-alive) connection,
+    while the task definitions are downloaded slow_requests times in parallel.
+    Returns the duration and latencies of all successful polls in seconds and the number of failed polls.
+    """
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(worker_count + 1)
+
+    def worker():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        worker_latencies = []
+        worker_errors = 0
+        start_barrier.wait()
+
+        for _ in range(polls):
+            started = time.perf_counter()
+
+            try:
+                conn.request("POST", "/tasks/run", body="{}")
+                res = conn.getresponse()
+                res.read()
+            except (ConnectionError, http.client.HTTPException):
+                # Reconnected with the next request
+                conn.close()
+                worker_errors += 1
+                continue
+
+            worker_latencies.append(time.perf_counter() - started)
+
+            assert res.status == 200
+
+        conn.close()
+
+        with lock:
+            latencies.extend(worker_latencies)
+            errors.append(worker_errors)
+
+    def download():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+
+        for _ in range(slow_requests):
+            conn.request("GET", "/tasks/definitions.tar.gz")
+            conn.getresponse().read()
+
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(worker_count)]
+    downloader = threading.Thread(target=download)
+
+    for thread in threads:
+        thread.start()
+
+    downloader.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+
+    for thread in threads:
+        thread.join()
+
+    duration = time.perf_counter() - started
+    downloader.join()
+
+    return duration, sorted(latencies), sum(errors)
+
+
+def bench_poll(worker_counts=(10, 100, 300), polls=20, slow_requests=3):
+    """Measure `/tasks/run` polls of many simulated workers against the threaded and the asyncio server"""
+
+    rows = []
+
+    for server_class in (HttpServer, AsyncHttpServer):
+        for worker_count in worker_counts:
+            env = create_env({"distiller": {"socket": {"ip": "127.0.0.1", "port": 0}}})
+            server = server_class(CoreHandler(), env)
+            server.run()
+
+            try:
+                duration, latencies, errors = poll_workers(server.port, worker_count, polls, slow_requests)
+            finally:
+                server.stop()
+
+            rows.append((
+                server_class.__name__,
+                worker_count,
+                errors,
+                len(latencies) / duration,
+                latencies[len(latencies) // 2] * 1e3,
+                latencies[int(len(latencies) * 0.99)] * 1e3
+            ))
+
+    report("/tasks/run polling", ("server", "workers", "errors", "requests/s", "p50 [ms]", "p99 [ms]"), rows)
+
+
+if __name__ == "__main__":
+    bench_poll()
@@ -0,0 +1,40 @@
+from distiller.testing.benchmarks import create_env, measure, report
+
+
+def bench_meta_backends(operations=5000):
+    """Throughput (operations per second) of the journal backend compared to SQLiteMeta"""
+
+    spirit_ids = [("testing.parameter_requires", {"requires": [], "id": i}) for i in range(operations)]
+    rows = []
+
+    for name, meta_conf in (
+            ("SQLiteMeta", {"module": "distiller.core.impl.SQLiteMeta"}),
+            ("JournalMeta", {"module": "distiller.core.impl.JournalMeta", "journal_path": "!:d/benchmarks.journal"}),
+            ("Journal+fsync", {
+                "module": "distiller.core.impl.JournalMeta",
+                "journal_path": "!:d/benchmarks.journal",
+                "fsync": True
+            })
+    ):
+        meta = create_env({"meta": meta_conf}).meta
+
+        update_duration = measure(lambda: [meta.update_cask(spirit_id) for spirit_id in spirit_ids])
+        get_duration = measure(lambda: [meta.get_cask(spirit_id) for spirit_id in spirit_ids])
+        start_duration = measure(lambda: meta.close() or create_env({"meta": dict(meta_conf, volatile=False)}))
+
+        rows.append((
+            name,
+            operations / update_duration,
+            operations / get_duration,
+            start_duration
+        ))
+
+    report(
+        "Meta backend throughput (operations per second), restart duration (s)",
+        ("backend", "update_cask", "get_cask", "close+restart"),
+        rows
+    )
+
+
+if __name__ == "__main__":
+    bench_meta_backends()
@@ -0,0 +1,83 @@
+import re
+import time
+
+from distiller.testing.benchmarks import report
+from distiller.core.impl.CoreHandler import CoreHandler
+
+URLS = [
+    ("post", "/tasks/run"),
+    ("post", "/tasks/heartbeat/4711"),
+    ("post", "/tasks/finish/4711"),
+    ("get", "/healthcheck"),
+    ("post", "/not/existing"),
+]
+
+
+def linear_routes(route_strings):
+    """Routes as list of compiled regular expressions per request type (previous implementation)"""
+
+    return {
+        req_type: [(re.compile(route), func) for route, func in routes]
+        for req_type, routes in route_strings.items()
+    }
+
+
+def resolve_linear(routes, req_type, url):
+    for (pattern, func) in routes[req_type]:
+        match = pattern.fullmatch(url)
+
+        if match is not None:
+            return func, match.groupdict()
+
+    return None
+
+
+def lookups_per_second(resolve, duration=0.5):
+    count = 0
+    started = time.perf_counter()
+
+    while time.perf_counter() - started < duration:
+        for req_type, url in URLS:
+            resolve(req_type, url)
+
+        count += len(URLS)
+
+    return count / (time.perf_counter() - started)
+
+
+def bench_resolve(extra_route_counts=(0, 50, 200)):
+    """Measure route lookups of the hot worker paths against the number of additional registered endpoints"""
+
+    rows = []
+
+    for extra_route_count in extra_route_counts:
+        handler = CoreHandler()
+
+        # Same routes in the previous regex notation
+        route_strings = {"get": [], "post": [
+            ("/tasks/run", handler.run_next),
+            ("/tasks/finish/(?P<transaction_id>[0-9]+)", handler.finish),
+            ("/tasks/heartbeat/(?P<transaction_id>[0-9]+)", handler.heartbeat),
+        ]}
+        route_strings["get"].append(("/healthcheck", handler.healthcheck))
+
+        # Additional endpoints are registered first, so the hot paths are at the end of the list
+        for i in range(extra_route_count):
+            for req_type in ("get", "post"):
+                route = "/extra/endpoint%i/(?P<item>[a-z]+)" % i
+                route_strings[req_type].insert(0, (route, handler.healthcheck))
+                getattr(handler, req_type)(route, handler.healthcheck)
+
+        routes = linear_routes(route_strings)
+
+        rows.append((
+            extra_route_count,
+            lookups_per_second(lambda req_type, url: resolve_linear(routes, req_type, url)),
+            lookups_per_second(handler.resolve_any)
+        ))
+
+    report("RequestHandler.resolve_any", ("extra routes", "regex [1/s]", "trie [1/s]"), rows)
+
+
+if __name__ == "__main__":
+    bench_resolve()
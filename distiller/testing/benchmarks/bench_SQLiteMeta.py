@@ -0,0 +1,110 @@
+import sqlite3
+import datetime
+import threading
+
+from distiller.testing.benchmarks import create_env, measure, report
+from distiller.api.AbstractTask import parameter_id
+
+
+class UnpooledSQLiteMeta:
+    """Former SQLiteMeta cask access: one new connection per call with default journaling"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def __connect_db(self):
+        return sqlite3.connect(self.db_path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
+
+    def get_cask(self, spirit_id):
+        with self.__connect_db() as conn:
+            spirit_name, parameters = spirit_id
+
+            csr = conn.execute(
+                'SELECT last_completion AS "[timestamp]" FROM Casks WHERE spirit_name=? AND parameters=?',
+                (spirit_name, parameter_id(parameters))
+            )
+
+            return csr.fetchone()
+
+    def update_cask(self, spirit_id, completion=None):
+        if completion is None:
+            completion = datetime.datetime.now()
+
+        with self.__connect_db() as conn:
+            spirit_name, parameters = spirit_id
+            enc_parameters = parameter_id(parameters)
+
+            row = conn.execute(
+                "SELECT 1 FROM Casks WHERE spirit_name=? AND parameters=?",
+                (spirit_name, enc_parameters)
+            ).fetchone()
+
+            if row is None:
+                conn.execute(
+                    "INSERT INTO Casks (spirit_name, parameters, last_completion) VALUES (?,?,?)",
+                    (spirit_name, enc_parameters, completion)
+                )
+            else:
+                conn.execute(
+                    "UPDATE Casks SET last_completion=? WHERE spirit_name=? AND parameters=?",
+                    (completion, spirit_name, enc_parameters)
+                )
+
+
+def run_threaded(func, spirit_ids, threads):
+    chunks = [spirit_ids[i::threads] for i in range(threads)]
+    workers = [
+        threading.Thread(target=lambda chunk=chunk: [func(spirit_id) for spirit_id in chunk])
+        for chunk in chunks
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    for worker in workers:
+        worker.join()
+
+
+def bench_meta(operations=2000, thread_counts=(1, 4)):
+    """Throughput (operations per second) of cask updates and lookups"""
+
+    rows = []
+
+    for threads in thread_counts:
+        spirit_ids = [("testing.parameter_requires", {"requires": [], "id": i}) for i in range(operations)]
+
+        # Pooled connections in WAL mode
+        env = create_env({"meta": {"module": "distiller.core.impl.SQLiteMeta"}})
+        meta = env.meta
+        pooled_update = measure(run_threaded, meta.update_cask, spirit_ids, threads)
+        pooled_get = measure(run_threaded, meta.get_cask, spirit_ids, threads)
+        meta.close()
+
+        # Fresh database in the former default journal mode
+        env = create_env({"meta": {"module": "distiller.core.impl.SQLiteMeta"}})
+        env.meta.close()
+
+        with sqlite3.connect(env.meta.db_path) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+
+        unpooled = UnpooledSQLiteMeta(env.meta.db_path)
+        unpooled_update = measure(run_threaded, unpooled.update_cask, spirit_ids, threads)
+        unpooled_get = measure(run_threaded, unpooled.get_cask, spirit_ids, threads)
+
+        rows.append((
+            threads,
+            operations / unpooled_update,
+            operations / pooled_update,
+            operations / unpooled_get,
+            operations / pooled_get
+        ))
+
+    report(
+        "SQLiteMeta throughput (operations per second)",
+        ("threads", "update (before)", "update (pooled)", "get (before)", "get (pooled)"),
+        rows
+    )
+
+
+if __name__ == "__main__":
+    bench_meta()
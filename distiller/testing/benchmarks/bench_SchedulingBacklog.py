@@ -0,0 +1,83 @@
+import heapq
+import random
+import datetime
+
+from distiller.testing.benchmarks import measure, report
+from distiller.core.impl.SimpleScheduler.BacklogQueue import BacklogQueue
+from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
+
+
+def create_infos(count, seed=42):
+    rand = random.Random(seed)
+    now = datetime.datetime.now()
+
+    return [
+        SchedulingInfo(
+            ("testing.parameter_requires", {"requires": [], "id": i}),
+            3600,
+            now + datetime.timedelta(seconds=rand.randint(0, 86400)),
+            reoccurring=True
+        )
+        for i in range(count)
+    ]
+
+
+def bench_backlog(sizes=(1000, 10000, 100000), operations=200):
+    """Compare the indexed backlog queue against the former list rebuild on removal / rescheduling.
+    Durations are per operation in microseconds.
+    """
+
+    rows = []
+
+    for size in sizes:
+        infos = create_infos(size)
+        victims = random.Random(0).sample(infos, operations)
+
+        # Former implementation: plain heap, removal rebuilds the whole list
+        backlog = []
+
+        push_naive = measure(lambda: [heapq.heappush(backlog, info) for info in infos])
+
+        def remove_naive():
+            nonlocal backlog
+
+            for victim in victims:
+                backlog = [item for item in backlog if item.spirit_id != victim.spirit_id]
+                heapq.heapify(backlog)
+
+        remove_naive = measure(remove_naive)
+
+        # Indexed backlog queue
+        queue = BacklogQueue()
+
+        push_indexed = measure(lambda: [queue.push(info) for info in infos])
+
+        def reschedule_indexed():
+            for victim in victims:
+                queue.reschedule(victim, victim.next_exec_date + datetime.timedelta(seconds=3600))
+
+        reschedule_indexed = measure(reschedule_indexed)
+
+        peek_indexed = measure(lambda: [queue.peek() for _ in range(operations)])
+
+        remove_indexed = measure(lambda: [queue.remove_spirit(victim.spirit_id) for victim in victims])
+
+        rows.append((
+            size,
+            push_naive / size * 1e6,
+            push_indexed / size * 1e6,
+            remove_naive / operations * 1e6,
+            remove_indexed / operations * 1e6,
+            reschedule_indexed / operations * 1e6,
+            peek_indexed / operations * 1e6
+        ))
+
+    report(
+        "Backlog operations (us per operation)",
+        ("size", "push (list)", "push (index)", "remove (list)", "remove (index)", "reschedule", "peek"),
+        rows
+    )
+
+
+if __name__ == "__main__":
+    bench_backlog()
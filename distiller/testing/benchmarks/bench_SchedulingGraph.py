@@ -0,0 +1,71 @@
+from distiller.testing.benchmarks import create_env, measure, report
+from distiller.core.impl.SimpleScheduler.SchedulingGraph import SchedulingGraph
+from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
+
+
+def bench_run_next(target_counts=(100, 500, 1000, 2000)):
+    """Measure `run_next` latency against the number of active targets.
+    Every target is an independent single spirit, so all of them are runnable at once.
+    """
+
+    rows = []
+
+    for target_count in target_counts:
+        env = create_env()
+        graph = SchedulingGraph(env, env.logger.claim("Benchmark"))
+
+        for i in range(target_count):
+            graph.add_target(SchedulingInfo(("testing.parameter_requires", {"requires": [], "id": i}), None, None))
+
+        transactions = []
+
+        def run_all():
+            for _ in range(target_count):
+                transactions.append(graph.run_next())
+
+        run_duration = measure(run_all)
+
+        def finish_all():
+            for transaction in transactions:
+                graph.finish_spirit(transaction["transaction_id"])
+
+        finish_duration = measure(finish_all)
+
+        assert graph.is_empty()
+
+        rows.append((
+            target_count,
+            run_duration / target_count * 1e6,
+            finish_duration / target_count * 1e6
+        ))
+
+    report("SchedulingGraph.run_next", ("targets", "run_next [us]", "finish [us]"), rows)
+
+
+def bench_shared_targets(target_counts=(10, 100, 500), shared_count=10):
+    """Measure adding targets that all depend on the same upstream spirits (e.g. cities of `merge_bars`)"""
+
+    rows = []
+
+    shared = [("testing.parameter_requires", {"requires": [], "id": i}) for i in range(shared_count)]
+
+    for target_count in target_counts:
+        env = create_env()
+        graph = SchedulingGraph(env, env.logger.claim("Benchmark"))
+
+        def add_all():
+            for i in range(target_count):
+                graph.add_target(SchedulingInfo(
+                    ("testing.parameter_requires", {"requires": shared, "id": "target-%i" % i}), None, None
+                ))
+
+        duration = measure(add_all)
+
+        rows.append((target_count, len(graph.nodes), duration / target_count * 1e3))
+
+    report("SchedulingGraph shared upstream", ("targets", "nodes", "add [ms]"), rows)
+
+
+if __name__ == "__main__":
+    bench_run_next()
+    bench_shared_targets()
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest.mock
+
+from distiller.testing.benchmarks import measure, report
+from distiller.utils.PathFinder import PathFinder
+from distiller.utils.TaskLoader import TaskLoader
+from distiller.utils.DependencyExplorer import DependencyExplorer
+
+FAN_OUT_DEFINITION = """
+import sys
+
+from distiller.api.DefaultStill import DefaultStill
+
+
+class Still(DefaultStill):
+    def occurrences(self):
+        return sys.maxsize
+
+    def default_parameters(self):
+        return {"level": 0, "index": 0, "depth": 2, "fan_out": 100}
+
+    def requires(self):
+        if self.parameters["level"] >= self.parameters["depth"]:
+            return []
+
+        return [
+            (self.name(), dict(
+                self.parameters,
+                level=self.parameters["level"] + 1,
+                index=self.parameters["index"] * self.parameters["fan_out"] + i
+            ))
+            for i in range(self.parameters["fan_out"])
+        ]
+"""
+
+
+def create_task_root():
+    """Create a task root with the `bench.fan_out` still: every spirit requires fan_out spirits of the next level"""
+
+    task_root = tempfile.mkdtemp()
+    task_path = os.path.join(task_root, "bench", "fan_out")
+    os.makedirs(task_path)
+
+    with open(os.path.join(task_path, "definition.py"), "w") as f:
+        f.write(FAN_OUT_DEFINITION)
+
+    return task_root
+
+
+def bench_explore(fan_outs=(10, 50, 100), repetitions=3):
+    """Measure exploring a graph of 1 + fan_out + fan_out^2 spirits (10101 for a fan out of 100).
+    Compares reloading the definition on every `TaskLoader.init` (previous default),
+    revalidating it on every call and the cached definition.
+    """
+
+    task_root = create_task_root()
+    init = TaskLoader.init
+
+    def always_refresh(spirit_id, **kwargs):
+        return init(spirit_id, always_refresh=True, **kwargs)
+
+    init_modes = {"refresh": always_refresh, "revalidate": init, "cached": init}
+
+    rows = []
+
+    try:
+        with unittest.mock.patch.dict(os.environ, {PathFinder.task_env: task_root}):
+            for fan_out in fan_outs:
+                target = ("bench.fan_out", {"fan_out": fan_out})
+                durations = {}
+
+                for mode, mode_init in init_modes.items():
+                    revalidate_interval = TaskLoader.revalidate_interval
+
+                    if mode == "revalidate":
+                        TaskLoader.revalidate_interval = 0
+
+                    try:
+                        with unittest.mock.patch.object(TaskLoader, "init", mode_init):
+                            spirit_count = len(DependencyExplorer.involved_spirits(target))
+
+                            durations[mode] = min(
+                                measure(DependencyExplorer.involved_spirits, target)
+                                for _ in range(repetitions)
+                            )
+                    finally:
+                        TaskLoader.revalidate_interval = revalidate_interval
+                        TaskLoader.invalidate("bench.fan_out")
+
+                rows.append((
+                    spirit_count,
+                    durations["refresh"] * 1e3,
+                    durations["revalidate"] * 1e3,
+                    durations["cached"] * 1e3
+                ))
+    finally:
+        shutil.rmtree(task_root)
+
+    report(
+        "DependencyExplorer.involved_spirits",
+        ("spirits", "refresh [ms]", "revalidate [ms]", "cached [ms]"),
+        rows
+    )
+
+
+if __name__ == "__main__":
+    bench_explore()
@@ -0,0 +1,140 @@
+import http.client
+import json
+import threading
+import time
+import unittest
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.helpers.RequestHandler import RequestHandler
+from distiller.core.impl.AsyncHttpServer import AsyncHttpServer
+
+
+class SampleHandler(RequestHandler):
+    def __init__(self):
+        super().__init__()
+
+        self.release = threading.Event()
+
+        self.get("/ping", self.ping)
+        self.get("/slow", self.slow)
+        self.get("/fail", self.fail)
+        self.post("/echo/(?P<name>[a-z]+)", self.echo)
+
+    def ping(self, handle, params):
+        handle.text("pong")
+
+    def slow(self, handle, params):
+        self.release.wait(5)
+        handle.text("done")
+
+    def fail(self, handle, params):
+        handle.send_response(200)
+        handle.wfile.write(b"partial")
+        raise ValueError("Failed")
+
+    def echo(self, handle, params, body):
+        handle.json({"name": params["name"], "body": body})
+
+
+class TestAsyncHttpServer(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment(Configuration.load("daemon", override={
+            "distiller": {
+                "socket": {"port": 0},
+                "server": {"max_concurrent_requests": 4}
+            },
+            "log": {
+                "verbose_level": "CRITICAL",
+                "log_level": "never",
+                "exit_level": "never"
+            },
+            "meta": {
+                "module": "distiller.core.impl.SQLiteMeta",
+                "file_path": "!:d/unit_tests.db",
+                "volatile": True
+            }
+        }))
+
+        self.handler = SampleHandler()
+        self.server = AsyncHttpServer(self.handler, self.env)
+        self.server.run()
+
+    def tearDown(self):
+        self.handler.release.set()
+        self.server.stop()
+
+    def connect(self):
+        return http.client.HTTPConnection(self.env.config.get("distiller.socket.ip"), self.server.port, timeout=5)
+
+    def test_keep_alive(self):
+        conn = self.connect()
+
+        conn.request("GET", "/ping")
+        res = conn.getresponse()
+        self.assertEqual(200, res.status)
+        self.assertEqual(b"pong", res.read())
+        sock = conn.sock
+
+        conn.request("POST", "/echo/abc", body=json.dumps({"a": 1}))
+        res = conn.getresponse()
+        self.assertEqual({"name": "abc", "body": {"a": 1}}, json.loads(res.read().decode("utf-8")))
+
+        # Both requests are answered on the same connection
+        self.assertIs(sock, conn.sock)
+
+        conn.request("GET", "/missing", headers={"connection": "close"})
+        res = conn.getresponse()
+        self.assertEqual(404, res.status)
+        res.read()
+        self.assertIsNone(conn.sock)
+
+    def test_stop_idle_connection(self):
+        # An idle keep-alive connection does not delay stopping the server
+        conn = self.connect()
+        conn.request("GET", "/ping")
+        self.assertEqual(b"pong", conn.getresponse().read())
+
+        stopping = threading.Thread(target=self.server.stop)
+        started = time.monotonic()
+        stopping.start()
+        stopping.join(10)
+
+        self.assertFalse(stopping.is_alive())
+        self.assertLess(time.monotonic() - started, 2)
+
+        conn.close()
+
+    def test_errors(self):
+        conn = self.connect()
+
+        conn.request("POST", "/echo/abc", body="no json")
+        self.assertEqual(400, conn.getresponse().status)
+        conn.close()
+
+        conn.request("GET", "/fail")
+        res = conn.getresponse()
+        self.assertEqual(500, res.status)
+        self.assertEqual(b"Error 500", res.read())
+
+    def test_slow_request(self):
+        slow = self.connect()
+        slow.request("GET", "/slow")
+
+        # A slow request does not block others
+        started = time.monotonic()
+
+        for _ in range(10):
+            conn = self.connect()
+            conn.request("GET", "/ping")
+            self.assertEqual(b"pong", conn.getresponse().read())
+            conn.close()
+
+        self.assertLess(time.monotonic() - started, 2)
+
+        self.handler.release.set()
+        self.assertEqual(b"done", slow.getresponse().read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import datetime
+
+from distiller.core.impl.SimpleScheduler.BacklogQueue import BacklogQueue
+from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
+
+
+class TestBacklogQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = BacklogQueue()
+        self.now = datetime.datetime(2000, 1, 1)
+
+    def info(self, name, offset, schedule_id=None):
+        return SchedulingInfo(
+            ("testing.parameter_requires", {"requires": [], "id": name}),
+            None,
+            self.now + datetime.timedelta(seconds=offset),
+            schedule_id=schedule_id
+        )
+
+    def test_order(self):
+        a, b, c = self.info("a", 2), self.info("b", 1), self.info("c", 3)
+
+        for info in (a, b, c):
+            self.queue.push(info)
+
+        self.assertEqual([b, a, c], [self.queue.pop() for _ in range(3)])
+        self.assertEqual(None, self.queue.pop())
+        self.assertEqual(0, len(self.queue))
+
+    def test_reschedule(self):
+        a, b = self.info("a", 1), self.info("b", 2)
+        self.queue.push(a)
+        self.queue.push(b)
+
+        self.queue.reschedule(a, self.now + datetime.timedelta(seconds=3))
+
+        self.assertEqual(b, self.queue.peek())
+        self.assertEqual(2, len(self.queue))
+
+    def test_remove_spirit(self):
+        a1, a2, b = self.info("a", 1), self.info("a", 2), self.info("b", 3)
+
+        for info in (a1, a2, b):
+            self.queue.push(info)
+
+        self.assertEqual(2, len(self.queue.remove_spirit(a1.spirit_id)))
+        self.assertEqual(b, self.queue.peek())
+        self.assertFalse(a1 in self.queue)
+
+    def test_remove_schedule(self):
+        a, b = self.info("a", 1, schedule_id=1), self.info("b", 2, schedule_id=2)
+        self.queue.push(a)
+        self.queue.push(b)
+
+        self.assertEqual(a, self.queue.remove_schedule(1))
+        self.assertEqual(None, self.queue.remove_schedule(1))
+        self.assertEqual(b, self.queue.pop())
+
+    def test_compaction(self):
+        infos = [self.info(str(i), i) for i in range(100)]
+
+        for info in infos:
+            self.queue.push(info)
+
+        for info in infos[:90]:
+            self.queue.remove(info)
+
+        self.assertLess(len(self.queue.heap), 50)
+        self.assertEqual(infos[90], self.queue.peek())
+
+
+if __name__ == "__main__":
+    unittest.main()
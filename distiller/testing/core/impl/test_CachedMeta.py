@@ -0,0 +1,156 @@
+import unittest
+import datetime
+import time
+import unittest.mock
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.core.impl.CachedMeta import CachedMeta
+
+
+class TestCachedMeta(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment(Configuration.load("daemon", override={
+            "log": {
+                "verbose_level": "DEBUG",
+                "log_level": "never",
+                "exit_level": "never"
+            },
+            "meta": {
+                "module": "distiller.core.impl.CachedMeta",
+                "backend": "distiller.core.impl.SQLiteMeta",
+                "flush_interval": None,
+                "file_path": "!:d/unit_tests.db",
+                "volatile": True
+            }
+        }))
+        self.meta = self.env.meta
+
+        self.t1 = ("testing.parameter_requires", {"requires": []})
+        self.t2 = ("testing.parameter_requires", {"requires": [self.t1]})
+
+        self.date = datetime.datetime(2000, 1, 1)
+
+    def test_write_through(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+
+        self.assertEqual(self.date, self.meta.get_cask(self.t1)["last_completion"])
+        self.assertEqual(self.date, self.meta.backend.get_cask(self.t1)["last_completion"])
+        self.assertEqual(None, self.meta.get_cask(self.t2))
+
+        self.meta.invalidate_cask(self.t1)
+
+        self.assertEqual(None, self.meta.get_cask(self.t1))
+        self.assertEqual(None, self.meta.backend.get_cask(self.t1))
+        self.assertRaises(ValueError, self.meta.invalidate_cask, self.t1)
+
+    def test_batch_write_through(self):
+        self.meta.update_casks([self.t1, self.t2], completion=self.date)
+
+        self.assertEqual(
+            [self.date, self.date],
+            [cask["last_completion"] for cask in self.meta.get_casks([self.t1, self.t2])]
+        )
+        self.assertEqual(2, len(self.meta.backend.get_all_casks()))
+
+        self.assertEqual(2, self.meta.invalidate_casks([self.t1, self.t2]))
+        self.assertEqual([None, None], self.meta.get_casks([self.t1, self.t2]))
+        self.assertEqual([], self.meta.backend.get_all_casks())
+
+    def test_served_from_memory(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+
+        with unittest.mock.patch.object(self.meta.backend, "get_cask") as get_cask:
+            self.meta.get_cask(self.t1)
+            self.meta.get_cask(self.t2)
+            self.assertEqual(1, len(self.meta.get_all_casks()))
+
+            get_cask.assert_not_called()
+
+        # Uncached casks are misses, even though they are served from memory as well
+        stats = self.meta.stats()
+        self.assertEqual(2, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(0, stats["reloads"])
+
+    def test_write_behind(self):
+        self.meta.flush_interval = 3600
+
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.update_cask(self.t1, completion=self.date + datetime.timedelta(seconds=1))
+        self.meta.update_cask(self.t2, completion=self.date)
+
+        # Read your writes
+        self.assertEqual(self.date + datetime.timedelta(seconds=1), self.meta.get_cask(self.t1)["last_completion"])
+        self.assertEqual(None, self.meta.backend.get_cask(self.t1))
+        self.assertEqual(2, self.meta.stats()["pending"])
+
+        backend_update = self.meta.backend.update_casks
+
+        with unittest.mock.patch.object(self.meta.backend, "update_casks", wraps=backend_update) as update:
+            self.meta.close()
+
+            # All updates are written with one request
+            self.assertEqual(1, update.call_count)
+
+        self.assertEqual(
+            self.date + datetime.timedelta(seconds=1),
+            self.meta.backend.get_cask(self.t1)["last_completion"]
+        )
+        self.assertEqual(0, self.meta.stats()["pending"])
+
+        # Updates after close are not left pending
+        self.meta.update_cask(self.t2, completion=self.date + datetime.timedelta(seconds=2))
+
+        self.assertEqual(
+            self.date + datetime.timedelta(seconds=2),
+            self.meta.backend.get_cask(self.t2)["last_completion"]
+        )
+        self.assertEqual(0, self.meta.stats()["pending"])
+
+    def test_write_behind_invalidate(self):
+        self.meta.flush_interval = 3600
+
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.invalidate_cask(self.t1)
+
+        self.assertEqual(None, self.meta.get_cask(self.t1))
+        self.assertEqual(None, self.meta.backend.get_cask(self.t1))
+
+        self.meta.flush()
+        self.assertEqual(None, self.meta.backend.get_cask(self.t1))
+
+    def test_flush_interval(self):
+        self.meta.flush_interval = 0.01
+
+        self.meta.update_cask(self.t1, completion=self.date)
+
+        for _ in range(100):
+            if self.meta.backend.get_cask(self.t1) is not None:
+                break
+
+            time.sleep(0.01)
+
+        self.assertEqual(self.date, self.meta.backend.get_cask(self.t1)["last_completion"])
+        self.meta.close()
+
+    def test_load_existing(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+
+        # A second cache on the same database loads the existing casks
+        self.env.config.conf_dict["meta"]["volatile"] = False
+        meta = CachedMeta(self.env)
+
+        self.assertEqual(self.date, meta.get_cask(self.t1)["last_completion"])
+
+    def test_max_staleness(self):
+        self.meta.max_staleness = 0
+        self.meta.backend.update_cask(self.t1, completion=self.date)
+
+        self.assertEqual(self.date, self.meta.get_cask(self.t1)["last_completion"])
+        self.assertEqual(1, self.meta.stats()["reloads"])
+        self.assertEqual(1, self.meta.stats()["hits"])
+
+
+if __name__ == "__main__":
+    unittest.main()
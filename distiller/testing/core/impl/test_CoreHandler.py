@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+import unittest
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.utils.Remote import Remote
+from distiller.core.impl.AsyncHttpServer import AsyncHttpServer
+from distiller.core.impl.HttpServer import HttpServer
+from distiller.core.impl.CoreHandler import CoreHandler
+from distiller.core.interfaces.Scheduler import FinishState
+
+
+class TestCoreHandler(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment(Configuration.load("daemon", override={
+            "distiller": {"socket": {"port": 0}},
+            "log": {"verbose_level": "CRITICAL", "log_level": "never", "exit_level": "never"},
+            "meta": {"module": "distiller.core.impl.SQLiteMeta", "file_path": "!:d/unit_tests.db", "volatile": True}
+        }))
+
+        self.server = None
+
+        self.t1 = ("testing.parameter_requires", {"requires": [], "id": "handler"})
+        self.t2 = ("testing.parameter_requires", {"requires": [self.t1], "id": "handler"})
+
+    @staticmethod
+    def serialized(spirit_id):
+        return json.loads(json.dumps(spirit_id))
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.stop()
+
+    def serve(self, server_class):
+        self.server = server_class(CoreHandler(), self.env)
+        self.server.run()
+
+        return Remote(self.env.config.get("distiller.socket.ip"), self.server.port)
+
+    def test_long_poll(self):
+        remote = self.serve(AsyncHttpServer)
+
+        # The waiting request is woken up by the added target
+        timer = threading.Timer(0.3, lambda: remote.add_target(self.t1))
+        timer.start()
+
+        started = time.monotonic()
+        job = remote.run_next(wait=10)
+        timer.join()
+
+        self.assertEqual(self.serialized(self.t1), job["spirit_id"])
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_long_poll_not_concurrent(self):
+        # A waiting request would block all other requests of a server handling one request at a time
+        remote = self.serve(HttpServer)
+
+        started = time.monotonic()
+        self.assertEqual({"wait_until": None}, remote.run_next(wait=10))
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_finish_next_job(self):
+        remote = self.serve(AsyncHttpServer)
+        remote.add_target(self.t2)
+
+        job = remote.run_next()
+        self.assertEqual(self.serialized(self.t1), job["spirit_id"])
+
+        res = remote.finish_task(job["transaction_id"], FinishState.SUCCESS, None, next_job=True)
+        self.assertEqual(self.serialized(self.t2), res["next"]["spirit_id"])
+
+        res = remote.finish_task(res["next"]["transaction_id"], FinishState.SUCCESS, None, next_job=True)
+        self.assertEqual({"wait_until": None}, res["next"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import datetime
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.core.impl.SimpleScheduler.CriticalPathScheduler import CriticalPathScheduler
+from distiller.utils.TaskLoader import TaskLoader
+
+
+class TestCriticalPathScheduler(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment(Configuration.load("daemon", override={
+            "log": {
+                "verbose_level": "DEBUG",
+                "log_level": "never",
+                "exit_level": "never"
+            },
+            "meta": {
+                "module": "distiller.core.impl.SQLiteMeta",
+                "file_path": "!:d/unit_tests.db",
+                "volatile": True
+            }
+        }))
+        self.scheduler = CriticalPathScheduler(self.env)
+
+        self.t1 = ("testing.parameter_requires", {"requires": []})
+        self.t2 = ("testing.parameter_requires", {"requires": [self.t1]})
+
+    def record(self, spirit_id, seconds):
+        self.scheduler.predictor.record(TaskLoader.init(spirit_id), datetime.timedelta(seconds=seconds))
+
+    def test_longest_path_first(self):
+        c1 = ("testing.parameter_requires", {"requires": [], "id": "c1"})
+        c2 = ("testing.parameter_requires", {"requires": [c1], "id": "c2"})
+        c3 = ("testing.parameter_requires", {"requires": [c2], "id": "c3"})
+        x = ("testing.parameter_requires", {"requires": [], "id": "x"})
+
+        for spirit_id in (c1, c2, c3):
+            self.record(spirit_id, 1)
+
+        self.record(x, 2)
+
+        self.scheduler.add_target(x)
+        self.scheduler.add_target(c3)
+
+        # x takes longer than c1 by itself, but c1 is on the longer path
+        self.assertEqual(c1, self.scheduler.run_next()["spirit_id"])
+        self.assertEqual(x, self.scheduler.run_next()["spirit_id"])
+
+    def test_priority_inheritance(self):
+        y = ("testing.parameter_requires", {"requires": [self.t2], "id": "y"})
+        z = ("testing.parameter_requires", {"requires": [], "id": "z"})
+
+        self.scheduler.add_target(self.t1)
+        self.scheduler.finish_spirit(self.scheduler.run_next()["transaction_id"])
+
+        # t1 is only expired for the low priority target
+        self.scheduler.add_target(self.t2, options={"age_requirement": 0})
+        self.scheduler.add_target(y, options={"priority": 5, "age_requirement": 3600})
+        self.scheduler.add_target(z, options={"priority": 1})
+
+        # y depends on the pending t2, which waits for t1
+        self.assertEqual(self.t1, self.scheduler.run_next()["spirit_id"])
+        self.assertEqual(z, self.scheduler.run_next()["spirit_id"])
+
+
+if __name__ == "__main__":
+    unittest.main()
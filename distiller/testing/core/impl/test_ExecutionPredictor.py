@@ -0,0 +1,54 @@
+import unittest
+import datetime
+
+from distiller.core.impl.SimpleScheduler.ExecutionPredictor import ExecutionPredictor
+from distiller.utils.DependencyExplorer import DependencyNode
+from distiller.utils.TaskLoader import TaskLoader
+
+
+class TestExecutionPredictor(unittest.TestCase):
+    def setUp(self):
+        self.predictor = ExecutionPredictor(alpha=0.5, window=4, quantile=0.5)
+
+        self.s1 = TaskLoader.init(("testing.parameter_requires", {"requires": [], "id": 1}))
+        self.s2 = TaskLoader.init(("testing.parameter_requires", {"requires": [], "id": 2}))
+        self.s3 = TaskLoader.init(("testing.parameter_requires_pipe", {"requires": [], "id": 3}))
+
+    def record(self, spirit, *seconds):
+        for s in seconds:
+            self.predictor.record(spirit, datetime.timedelta(seconds=s))
+
+    def test_unknown(self):
+        self.assertEqual(0, self.predictor.predict(self.s1))
+        self.assertEqual(0, self.predictor.predict(self.s1, conservative=True))
+
+    def test_ewma(self):
+        self.record(self.s1, 4, 8)
+        self.assertEqual(6, self.predictor.predict(self.s1))
+
+    def test_quantile_window(self):
+        self.record(self.s1, 100, 1, 2, 3, 4)
+        self.assertEqual(3, self.predictor.predict(self.s1, conservative=True))
+
+    def test_still_fallback(self):
+        self.record(self.s1, 4)
+
+        self.assertEqual(4, self.predictor.predict(self.s2))
+        self.assertEqual(0, self.predictor.predict(self.s3))
+
+    def test_critical_path(self):
+        self.record(self.s1, 4)
+        self.record(self.s2, 10)
+        self.record(self.s3, 1)
+
+        n1 = DependencyNode(self.s1)
+        n2 = DependencyNode(self.s2)
+        n3 = DependencyNode(self.s3)
+        n3.add_parent(n1).add_parent(n2)
+
+        self.assertEqual(datetime.timedelta(seconds=11), self.predictor.predict_graph([n1, n2]))
+        self.assertEqual(datetime.timedelta(seconds=0), self.predictor.predict_graph([]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+import datetime
+import unittest.mock
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.core.impl.SimpleScheduler.FreshnessCache import FreshnessCache
+from distiller.utils.TaskLoader import TaskLoader
+from distiller.utils.DependencyCache import DependencyCache
+
+
+class TestFreshnessCache(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment(Configuration.load("daemon", override={
+            "log": {
+                "verbose_level": "DEBUG",
+                "log_level": "never",
+                "exit_level": "never"
+            },
+            "meta": {
+                "module": "distiller.core.impl.SQLiteMeta",
+                "file_path": "!:d/unit_tests.db",
+                "volatile": True
+            }
+        }))
+        self.cache = FreshnessCache(self.env)
+
+        self.t1 = ("testing.parameter_requires", {"requires": []})
+        self.t2 = ("testing.parameter_requires", {"requires": [self.t1]})
+        self.t3 = ("testing.parameter_requires", {"requires": [self.t1], "id": "t3"})
+
+        self.date = datetime.datetime(2000, 1, 1)
+
+    def test_missing_cask(self):
+        self.env.meta.update_cask(self.t1, completion=self.date)
+
+        self.assertEqual(None, self.cache.oldest_completion(self.t2))
+        self.assertEqual(self.date, self.cache.oldest_completion(self.t1))
+
+    def test_memoised(self):
+        self.env.meta.update_cask(self.t1, completion=self.date)
+        self.env.meta.update_cask(self.t2, completion=self.date + datetime.timedelta(seconds=1))
+        self.env.meta.update_cask(self.t3, completion=self.date + datetime.timedelta(seconds=2))
+
+        with unittest.mock.patch.object(self.env.meta, "get_casks", wraps=self.env.meta.get_casks) as get_casks:
+            self.assertEqual(self.date, self.cache.oldest_completion(self.t2))
+            self.assertEqual(self.date, self.cache.oldest_completion(self.t2))
+            self.assertEqual(self.date, self.cache.oldest_completion(self.t3))
+
+            # One request per closure, t1 is shared by both closures and only loaded once
+            self.assertEqual(2, get_casks.call_count)
+            self.assertEqual([self.t3], get_casks.call_args[0][0])
+
+    def test_invalidation(self):
+        self.env.meta.update_cask(self.t1, completion=self.date)
+        self.env.meta.update_cask(self.t2, completion=self.date)
+        self.assertEqual(self.date, self.cache.oldest_completion(self.t2))
+
+        new_date = self.date + datetime.timedelta(seconds=5)
+        self.env.meta.update_cask(self.t1, completion=new_date)
+        self.env.meta.update_cask(self.t2, completion=new_date)
+
+        # Not reported yet
+        self.assertEqual(self.date, self.cache.oldest_completion(self.t2))
+
+        self.cache.cask_updated(self.t1)
+        self.cache.cask_updated(self.t2)
+        self.assertEqual(new_date, self.cache.oldest_completion(self.t2))
+
+        self.env.meta.invalidate_cask(self.t1)
+        self.cache.cask_updated(self.t1)
+        self.assertEqual(None, self.cache.oldest_completion(self.t2))
+
+    def test_graph_dropped(self):
+        # Updates are found through the reverse index of the DependencyCache, which only covers cached graphs
+        later = self.date + datetime.timedelta(seconds=5)
+
+        self.env.meta.update_cask(self.t1, completion=self.date)
+        self.env.meta.update_cask(self.t2, completion=later)
+        self.assertEqual(self.date, self.cache.oldest_completion(self.t2))
+
+        DependencyCache.invalidate()
+
+        self.env.meta.update_cask(self.t1, completion=later + datetime.timedelta(seconds=5))
+        self.cache.cask_updated(self.t1)
+
+        self.assertEqual(later, self.cache.oldest_completion(self.t2))
+
+    def test_definition_reloaded(self):
+        # Completions of a still are checked again once the TaskLoader reloaded its definition
+        fingerprint = TaskLoader.fingerprint(TaskLoader.init(self.t1))
+
+        self.env.meta.update_cask(self.t1, completion=self.date, fingerprint=fingerprint)
+        self.env.meta.update_cask(self.t2, completion=self.date, fingerprint=fingerprint)
+        self.assertEqual(self.date, self.cache.oldest_completion(self.t2))
+
+        with unittest.mock.patch.object(TaskLoader, "fingerprint", return_value="changed"):
+            self.assertEqual(self.date, self.cache.oldest_completion(self.t2))
+
+            # E.g. the definition file changed
+            TaskLoader.invalidate(self.t1[0])
+            self.assertEqual(None, self.cache.oldest_completion(self.t2))
+
+    def test_forget(self):
+        self.cache.oldest_completion(self.t2)
+        self.cache.oldest_completion(self.t3)
+
+        self.cache.forget(self.t2)
+        self.cache.forget(self.t3)
+
+        self.assertEqual({}, self.cache.closures)
+        self.assertEqual({}, self.cache.users)
+        self.assertEqual({}, self.cache.serials)
+        self.assertEqual({}, self.cache.completions)
+        self.assertEqual({}, self.cache.stills)
+
+
+if __name__ == "__main__":
+    unittest.main()
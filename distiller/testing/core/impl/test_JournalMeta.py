@@ -0,0 +1,180 @@
+import os
+import unittest
+import datetime
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.core.impl.JournalMeta import JournalMeta
+from distiller.core.impl.SimpleScheduler.SchedulingInfo import SchedulingInfo
+from distiller.api.AbstractTask import spirit_id_to_label
+
+
+class TestJournalMeta(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment(Configuration.load("daemon", override={
+            "log": {
+                "verbose_level": "DEBUG",
+                "log_level": "never",
+                "exit_level": "never"
+            },
+            "meta": {
+                "module": "distiller.core.impl.JournalMeta",
+                "journal_path": "!:d/unit_tests.journal",
+                "snapshot_every": 10000,
+                "volatile": True
+            }
+        }))
+        self.meta = self.env.meta
+
+        self.t1 = ("testing.parameter_requires", {"requires": []})
+        self.t2 = ("testing.parameter_requires", {"requires": [self.t1]})
+
+        self.date = datetime.datetime(2000, 1, 1, 12, 30)
+
+    def tearDown(self):
+        if self.meta.journal is not None:
+            self.meta.journal.close()
+
+    def reopen(self):
+        """Start a new instance on the same files without closing the old one (like after a crash)"""
+
+        self.meta.flush()
+        self.env.config.conf_dict["meta"]["volatile"] = False
+
+        return JournalMeta(self.env)
+
+    def test_casks(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.update_casks([self.t1, self.t2], completion=self.date + datetime.timedelta(seconds=1))
+
+        self.assertEqual(self.date + datetime.timedelta(seconds=1), self.meta.get_cask(self.t1)["last_completion"])
+        self.assertEqual(2, len(self.meta.get_all_casks()))
+
+        self.meta.invalidate_cask(self.t1)
+
+        self.assertEqual([None, self.date + datetime.timedelta(seconds=1)], [
+            None if cask is None else cask["last_completion"] for cask in self.meta.get_casks([self.t1, self.t2])
+        ])
+        self.assertRaises(ValueError, self.meta.invalidate_cask, self.t1)
+        self.assertEqual(1, self.meta.invalidate_casks([self.t1, self.t2]))
+
+    def test_schedules(self):
+        info = self.meta.add_scheduled_spirit(SchedulingInfo(self.t1, 60, None, priority=2, start_date=self.date))
+        self.meta.add_scheduled_spirit(
+            SchedulingInfo(self.t2, 60, None, end_date=datetime.datetime.now() - datetime.timedelta(days=1))
+        )
+
+        infos = self.meta.get_scheduled_infos()
+
+        self.assertEqual(1, len(infos))
+        self.assertEqual((info.schedule_id, 60, 2, self.date), (
+            infos[0].schedule_id, infos[0].age_requirement, infos[0].priority, infos[0].start_date
+        ))
+
+        self.meta.remove_scheduled_spirit(self.t1)
+        self.assertEqual([], self.meta.get_scheduled_infos())
+        self.assertRaises(ValueError, self.meta.remove_scheduled_spirit, self.t1)
+
+    def test_crash_recovery(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.add_scheduled_spirit(SchedulingInfo(self.t2, 60, None))
+        self.meta.update_cask(self.t2, completion=self.date)
+        self.meta.invalidate_cask(self.t2)
+        self.meta.add_execution({
+            "spirit_id": self.t1,
+            "start_date": self.date,
+            "end_date": self.date + datetime.timedelta(seconds=3),
+            "finish_state": "SUCCESS",
+            "inputs": []
+        })
+
+        # Crash in the middle of writing a record
+        self.meta.flush()
+
+        with open(self.meta.journal_path, "a") as f:
+            f.write('{"op": "update_casks", "casks": [[["testing.')
+
+        meta = self.reopen()
+
+        self.assertEqual(self.date, meta.get_cask(self.t1)["last_completion"])
+        self.assertEqual(None, meta.get_cask(self.t2))
+        self.assertEqual(1, len(meta.get_scheduled_infos()))
+        self.assertEqual([3], [execution["duration"] for execution in meta.get_executions()])
+
+        # The torn record is dropped, new records are appended after the last valid one
+        meta.update_cask(self.t2, completion=self.date)
+        meta.flush()
+
+        self.assertEqual(2, len(self.reopen().get_all_casks()))
+
+    def test_snapshot_recovery(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.snapshot()
+        self.meta.update_cask(self.t2, completion=self.date)
+
+        self.assertEqual(1, self.meta.journal_records)
+
+        meta = self.reopen()
+
+        self.assertEqual(2, len(meta.get_all_casks()))
+        self.assertEqual(1, meta.journal_records)
+
+    def test_digest_recovery(self):
+        input_digests = {spirit_id_to_label(*self.t1): "a"}
+
+        self.meta.update_cask(self.t1, completion=self.date, digest="a")
+        self.meta.snapshot()
+        self.meta.update_cask(self.t2, completion=self.date, digest="b", input_digests=input_digests)
+
+        meta = self.reopen()
+
+        self.assertEqual("a", meta.get_cask(self.t1)["digest"])
+        cask = meta.get_cask(self.t2)
+        self.assertEqual(("b", input_digests), (cask["digest"], cask["input_digests"]))
+
+    def test_crash_during_snapshot(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.invalidate_cask(self.t1)
+        self.meta.flush()
+
+        with open(self.meta.journal_path, "r") as f:
+            journal = f.read()
+
+        self.meta.snapshot()
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.flush()
+
+        # Crash after the snapshot has been written, but before the journal was truncated
+        with open(self.meta.journal_path, "r") as f:
+            journal += f.read()
+
+        with open(self.meta.journal_path, "w") as f:
+            f.write(journal)
+
+        meta = self.reopen()
+
+        self.assertEqual(self.date, meta.get_cask(self.t1)["last_completion"])
+        self.assertEqual(1, meta.journal_records)
+
+    def test_automatic_snapshot(self):
+        self.meta.snapshot_every = 5
+
+        for i in range(12):
+            self.meta.update_cask(("testing.parameter_requires", {"requires": [], "id": i}), completion=self.date)
+
+        self.assertTrue(os.path.exists(self.meta.snapshot_path))
+        self.assertEqual(2, self.meta.journal_records)
+        self.assertEqual(12, len(self.reopen().get_all_casks()))
+
+    def test_close(self):
+        self.meta.update_cask(self.t1, completion=self.date)
+        self.meta.close()
+
+        meta = self.reopen()
+
+        self.assertEqual(0, meta.journal_records)
+        self.assertEqual(1, len(meta.get_all_casks()))
+
+
+if __name__ == "__main__":
+    unittest.main()
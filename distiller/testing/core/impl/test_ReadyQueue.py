@@ -0,0 +1,67 @@
+import unittest
+
+from distiller.core.impl.SimpleScheduler.ReadyQueue import ReadyQueue
+
+
+class TestReadyQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = ReadyQueue()
+        self.locks = {}
+
+    def blocked_by(self, item):
+        return self.locks.get(item, None)
+
+    def test_order(self):
+        self.queue.push("a", 0)
+        self.queue.push("b", 5)
+        self.queue.push("c", 0)
+        self.queue.push("a", 10)
+
+        self.assertEqual(["a", "b", "c"], [self.queue.pop(self.blocked_by) for _ in range(3)])
+        self.assertEqual(None, self.queue.pop(self.blocked_by))
+
+    def test_priority_not_lowered(self):
+        self.queue.push("a", 5)
+        self.queue.push("a", 1)
+
+        self.assertEqual(5, self.queue.priority("a"))
+        self.assertEqual(1, len(self.queue))
+
+    def test_remove(self):
+        self.queue.push("a", 0)
+        self.queue.push("b", 0)
+        self.queue.remove("a")
+
+        self.assertFalse("a" in self.queue)
+        self.assertEqual("b", self.queue.pop(self.blocked_by))
+        self.assertEqual(None, self.queue.pop(self.blocked_by))
+
+    def test_blocked(self):
+        self.locks["a"] = "lock"
+        self.queue.push("a", 10)
+        self.queue.push("b", 0)
+
+        self.assertEqual("b", self.queue.pop(self.blocked_by))
+        self.assertEqual(None, self.queue.pop(self.blocked_by))
+        self.assertTrue("a" in self.queue)
+
+        del self.locks["a"]
+        self.queue.release("lock")
+
+        self.assertEqual("a", self.queue.pop(self.blocked_by))
+
+    def test_remove_blocked(self):
+        self.locks["a"] = "lock"
+        self.queue.push("a", 0)
+
+        self.assertEqual(None, self.queue.pop(self.blocked_by))
+
+        self.queue.remove("a")
+        del self.locks["a"]
+        self.queue.release("lock")
+
+        self.assertEqual(None, self.queue.pop(self.blocked_by))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import datetime
+import threading
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.api.AbstractTask import spirit_id_to_label
+
+
+class TestSQLiteMeta(unittest.TestCase):
+    def setUp(self):
+        self.env = Environment(Configuration.load("daemon", override={
+            "log": {
+                "verbose_level": "DEBUG",
+                "log_level": "never",
+                "exit_level": "never"
+            },
+            "meta": {
+                "module": "distiller.core.impl.SQLiteMeta",
+                "file_path": "!:d/unit_tests.db",
+                "volatile": True
+            }
+        }))
+        self.meta = self.env.meta
+
+        self.t1 = ("testing.parameter_requires", {"requires": []})
+
+    def tearDown(self):
+        self.meta.close()
+
+    def test_wal(self):
+        journal_mode = self.meta.connections[0].execute("PRAGMA journal_mode").fetchone()[0]
+
+        self.assertEqual("wal", journal_mode.lower())
+
+    def test_connection_per_thread(self):
+        date = datetime.datetime(2000, 1, 1)
+        self.meta.update_cask(self.t1, completion=date)
+        self.meta.get_cask(self.t1)
+
+        self.assertEqual(1, len(self.meta.connections))
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(self.meta.get_cask(self.t1)))
+        thread.start()
+        thread.join()
+
+        self.assertEqual(date, results[0]["last_completion"])
+        self.assertEqual(2, len(self.meta.connections))
+
+    def test_batch(self):
+        date = datetime.datetime(2000, 1, 1)
+        spirit_ids = [("testing.parameter_requires", {"requires": [], "id": i}) for i in range(1000)]
+
+        self.meta.update_casks(spirit_ids[::2], completion=date)
+
+        casks = self.meta.get_casks(spirit_ids)
+        self.assertEqual(1000, len(casks))
+        self.assertEqual([date, None] * 500, [None if cask is None else cask["last_completion"] for cask in casks])
+        self.assertEqual(spirit_ids[0], casks[0]["spirit_id"])
+
+        # Update existing and new casks
+        self.meta.update_casks(spirit_ids[:2], completion=date + datetime.timedelta(seconds=1))
+        self.assertEqual(501, len(self.meta.get_all_casks()))
+        self.assertEqual(date + datetime.timedelta(seconds=1), self.meta.get_cask(spirit_ids[0])["last_completion"])
+
+        self.assertEqual(501, self.meta.invalidate_casks(spirit_ids))
+        self.assertEqual([], self.meta.get_all_casks())
+
+    def test_digests(self):
+        date = datetime.datetime(2000, 1, 1)
+        input_digests = {spirit_id_to_label(*self.t1): "a"}
+
+        self.meta.update_cask(self.t1, completion=date, digest="b", input_digests=input_digests)
+
+        cask = self.meta.get_cask(self.t1)
+        self.assertEqual(("b", input_digests), (cask["digest"], cask["input_digests"]))
+        self.assertEqual(input_digests, self.meta.get_casks([self.t1])[0]["input_digests"])
+
+        # Unknown digest
+        self.meta.update_cask(self.t1, completion=date)
+        cask = self.meta.get_all_casks()[0]
+        self.assertEqual((None, None), (cask["digest"], cask["input_digests"]))
+
+    def add_execution(self, spirit_id, end_date, duration, finish_state="SUCCESS"):
+        self.meta.add_execution({
+            "transaction_id": 1,
+            "spirit_id": spirit_id,
+            "start_date": end_date - datetime.timedelta(seconds=duration),
+            "end_date": end_date,
+            "finish_state": finish_state,
+            "worker": "worker-1",
+            "rows": 10,
+            "bytes": 100,
+            "inputs": [{"spirit_id": self.t1, "last_completion": datetime.datetime(2000, 1, 1)}]
+        })
+
+    def test_executions(self):
+        now = datetime.datetime.now()
+        t2 = ("testing.parameter_requires", {"requires": [self.t1]})
+
+        self.add_execution(self.t1, now - datetime.timedelta(seconds=20), 5)
+        self.add_execution(self.t1, now - datetime.timedelta(seconds=10), 1, finish_state="EXEC_ERROR")
+        self.add_execution(t2, now, 3)
+
+        executions = self.meta.get_executions()
+        self.assertEqual([1, 3, 5], sorted(execution["duration"] for execution in executions))
+        self.assertEqual(spirit_id_to_label(*t2), spirit_id_to_label(*executions[0]["spirit_id"]))
+        self.assertEqual("worker-1", executions[0]["worker"])
+        self.assertEqual(datetime.datetime(2000, 1, 1), executions[0]["inputs"][0]["last_completion"])
+
+        slowest = self.meta.get_executions(order_by="duration", limit=1)
+        self.assertEqual([5], [execution["duration"] for execution in slowest])
+
+        self.assertEqual(2, len(self.meta.get_executions(spirit_id=self.t1)))
+        self.assertEqual(3, len(self.meta.get_executions(still="testing.parameter_requires")))
+        self.assertEqual(1, len(self.meta.get_executions(finish_state="EXEC_ERROR")))
+        self.assertEqual(2, len(self.meta.get_executions(since=now - datetime.timedelta(seconds=15))))
+
+    def test_execution_retention(self):
+        now = datetime.datetime.now()
+        self.meta.execution_max_per_spirit = 2
+
+        self.add_execution(self.t1, now - datetime.timedelta(days=365), 1)
+
+        for i in range(3):
+            self.add_execution(self.t1, now - datetime.timedelta(seconds=i), 1)
+
+        self.assertEqual(2, self.meta.compact_executions())
+        self.assertEqual(
+            [now, now - datetime.timedelta(seconds=1)],
+            [execution["end_date"] for execution in self.meta.get_executions()]
+        )
+
+    def test_close(self):
+        self.meta.close()
+        self.assertEqual([], self.meta.connections)
+
+        # Connections are opened again on demand
+        self.assertEqual(None, self.meta.get_cask(self.t1))
+
+
+if __name__ == "__main__":
+    unittest.main()
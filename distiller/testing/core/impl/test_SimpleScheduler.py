@@ -1,5 +1,7 @@
 import unittest
 import datetime
+import threading
+import time
 import unittest.mock
 
 from distiller.utils.Environment import Environment
@@ -7,6 +9,7 @@ from distiller.utils.Configuration import Configuration
 from distiller.core.impl.SimpleScheduler.SimpleScheduler import SimpleScheduler
 from distiller.core.interfaces.Scheduler import FinishState
 from distiller.utils.TaskLoader import TaskLoader
+from distiller.api.AbstractTask import spirit_id_to_label
 
 # Source: http://blog.xelnor.net/python-mocking-datetime/
 real_datetime_class = datetime.datetime
@@ -104,6 +107,68 @@ class TestSimpleScheduler(unittest.TestCase):
 
         self.assertEqual(None, self.scheduler.run_next())
 
+    def test_shared_dependency(self):
+        # Both dependents of t1 must become runnable once t1 is finished
+        t2b = ("testing.parameter_requires", {"requires": [self.t1], "id": "b"})
+        target = ("testing.parameter_requires", {"requires": [self.t2, t2b]})
+
+        self.scheduler.add_target(target)
+
+        transaction = self.scheduler.run_next()
+        self.assertEqual(self.t1, transaction["spirit_id"])
+        self.assertEqual(None, self.scheduler.run_next())
+        self.scheduler.finish_spirit(transaction["transaction_id"])
+
+        transactions = [self.scheduler.run_next(), self.scheduler.run_next()]
+        self.assertEqual(None, self.scheduler.run_next())
+        self.assertCountEqual([self.t2, t2b], [transaction["spirit_id"] for transaction in transactions])
+
+        for transaction in transactions:
+            self.scheduler.finish_spirit(transaction["transaction_id"])
+
+        transaction = self.scheduler.run_next()
+        self.assertEqual(target, transaction["spirit_id"])
+        self.scheduler.finish_spirit(transaction["transaction_id"])
+
+        self.assertTrue(self.scheduler.graph.is_empty())
+
+    def test_run_batch(self):
+        t1b = ("testing.parameter_requires", {"requires": [], "id": "b"})
+
+        self.scheduler.add_target(self.t2)
+        self.scheduler.add_target(t1b)
+
+        transactions = self.scheduler.run_batch(5)
+        self.assertCountEqual([self.t1, t1b], [transaction["spirit_id"] for transaction in transactions])
+        self.assertEqual([], self.scheduler.run_batch(5))
+
+        for transaction in transactions:
+            self.scheduler.finish_spirit(transaction["transaction_id"])
+
+        transactions = self.scheduler.run_batch(1)
+        self.assertEqual([self.t2], [transaction["spirit_id"] for transaction in transactions])
+
+    def test_execution_history(self):
+        self.scheduler.add_target(self.t2)
+
+        transaction = self.scheduler.run_next()
+        self.scheduler.finish_spirit(transaction["transaction_id"], stats={"worker": "w1", "rows": 3, "bytes": 12})
+
+        transaction = self.scheduler.run_next()
+        self.scheduler.finish_spirit(transaction["transaction_id"], finish_state=FinishState.EXEC_ERROR)
+
+        executions = self.env.meta.get_executions()
+
+        self.assertEqual(["EXEC_ERROR", "SUCCESS"], [execution["finish_state"] for execution in executions])
+        self.assertEqual(
+            [spirit_id_to_label(*self.t2), spirit_id_to_label(*self.t1)],
+            [spirit_id_to_label(*execution["spirit_id"]) for execution in executions]
+        )
+        self.assertEqual(("w1", 3, 12), (executions[1]["worker"], executions[1]["rows"], executions[1]["bytes"]))
+
+        # t2 has been built from the cask of t1
+        self.assertEqual([self.t1], [spirit_input["spirit_id"] for spirit_input in executions[0]["inputs"]])
+
     def test_pipes(self):
         self.scheduler.add_target(self.t4)
 
@@ -138,23 +203,44 @@ class TestSimpleScheduler(unittest.TestCase):
         self.assertTrue(self.scheduler.graph.is_empty())
 
     def test_multi_abort(self):
-        # This method tests if an abort triggers only another abort being root at the same time,
-        # or also one deeper in the exec tree
+        # This method tests if an abort of a spirit shared by multiple targets
+        # stops all of them, including the one that added it deeper in the exec tree
 
         self.scheduler.add_target(self.t2)
         transaction = self.scheduler.run_next()
         self.assertEqual(self.t1, transaction["spirit_id"])
         self.scheduler.finish_spirit(transaction["transaction_id"], finish_state=FinishState.SUCCESS)
 
+        # The stricter target adds the expired dependency to the (shared) pending t2
         self.scheduler.add_target(self.t2, options={"age_requirement": 0})
 
+        transaction = self.scheduler.run_next()
+        self.assertEqual(self.t1, transaction["spirit_id"])
+        self.assertEqual(None, self.scheduler.run_next())
+        self.scheduler.finish_spirit(transaction["transaction_id"], finish_state=FinishState.SUCCESS)
+
         transaction = self.scheduler.run_next()
         self.assertEqual(self.t2, transaction["spirit_id"])
         self.scheduler.finish_spirit(transaction["transaction_id"], finish_state=FinishState.EXEC_ERROR)
 
+        self.assertEqual(None, self.scheduler.run_next())
+        self.assertTrue(self.scheduler.graph.is_empty())
+
+    def test_add_while_running(self):
+        # A target added while its spirit is running is satisfied by that execution
+
+        self.scheduler.add_target(self.t1)
         transaction = self.scheduler.run_next()
         self.assertEqual(self.t1, transaction["spirit_id"])
 
+        self.scheduler.add_target(self.t1)
+        self.assertEqual(None, self.scheduler.run_next())
+
+        self.scheduler.finish_spirit(transaction["transaction_id"], finish_state=FinishState.SUCCESS)
+
+        self.assertEqual(None, self.scheduler.run_next())
+        self.assertTrue(self.scheduler.graph.is_empty())
+
     def test_multi_abort2(self):
         self.scheduler.add_target(self.t2)
         self.scheduler.add_target(self.t2, options={"age_requirement": 0})
@@ -234,6 +320,25 @@ class TestSimpleScheduler(unittest.TestCase):
         with mock_datetime_now(now + datetime.timedelta(seconds=10), datetime):
             self.assertEqual(self.t1, self.scheduler.run_next()["spirit_id"])
 
+    def test_postponing_predicted(self):
+        # Test if a reoccurring target is started ahead of time by its predicted execution time
+
+        now = datetime.datetime.now()
+
+        self.scheduler.predictor.record(TaskLoader.init(self.t1), datetime.timedelta(seconds=4))
+
+        self.scheduler.add_target(self.t1, options={"reoccurring": True, "age_requirement": 10})
+
+        transaction = self.scheduler.run_next()
+        self.assertEqual(self.t1, transaction["spirit_id"])
+        self.scheduler.finish_spirit(transaction["transaction_id"], finish_state=FinishState.SUCCESS)
+
+        with mock_datetime_now(now + datetime.timedelta(seconds=5), datetime):
+            self.assertEqual(None, self.scheduler.run_next())
+
+        with mock_datetime_now(now + datetime.timedelta(seconds=7), datetime):
+            self.assertEqual(self.t1, self.scheduler.run_next()["spirit_id"])
+
     def test_postponing_prune(self):
         # Test if postponing leads to pruning where requirements are satisfied
 
@@ -278,6 +383,148 @@ class TestSimpleScheduler(unittest.TestCase):
             self.assertEqual(self.t1, transaction["spirit_id"])
             self.scheduler.finish_spirit(transaction["transaction_id"], finish_state=FinishState.SUCCESS)
 
+    def __finish_next(self, spirit_id, digest=None):
+        transaction = self.scheduler.run_next()
+        self.assertEqual(spirit_id, transaction["spirit_id"])
+        self.scheduler.finish_spirit(transaction["transaction_id"], stats={"digest": digest})
+
+    def __build_chain(self, now):
+        # t1 is built 8 seconds before t2 and t4
+        self.scheduler.add_target(self.t1)
+        self.__finish_next(self.t1, "a")
+
+        with mock_datetime_now(now + datetime.timedelta(seconds=8), datetime):
+            self.scheduler.add_target(self.t4)
+            self.__finish_next(self.t2, "b")
+            self.__finish_next(self.t4, "c")
+
+        self.assertEqual({spirit_id_to_label(*self.t1): "a"}, self.env.meta.get_cask(self.t2)["input_digests"])
+
+    def test_early_cutoff(self):
+        # Dependents of a rebuilt spirit are skipped if its content did not change
+
+        now = datetime.datetime.now()
+        self.__build_chain(now)
+
+        with mock_datetime_now(now + datetime.timedelta(seconds=10), datetime):
+            # Only t1 is too old, t2 and t4 are rebuilt because of it
+            self.scheduler.add_target(self.t4, options={"age_requirement": 5})
+            self.__finish_next(self.t1, "a")
+
+            # t2 and t4 (through the pipe) are cut off and up to date now
+            self.assertEqual(None, self.scheduler.run_next())
+            self.assertTrue(self.scheduler.graph.is_empty())
+            self.assertEqual(
+                now + datetime.timedelta(seconds=10),
+                self.env.meta.get_cask(self.t4)["last_completion"]
+            )
+
+    def test_early_cutoff_changed(self):
+        now = datetime.datetime.now()
+        self.__build_chain(now)
+
+        with mock_datetime_now(now + datetime.timedelta(seconds=10), datetime):
+            self.scheduler.add_target(self.t4, options={"age_requirement": 5})
+            self.__finish_next(self.t1, "changed")
+
+            # Input of t4 did not change after all
+            self.__finish_next(self.t2, "b")
+            self.assertEqual(None, self.scheduler.run_next())
+            self.assertTrue(self.scheduler.graph.is_empty())
+
+    def test_early_cutoff_unknown_digest(self):
+        # Without digests every dependent is rebuilt
+
+        now = datetime.datetime.now()
+
+        self.scheduler.add_target(self.t1)
+        self.__finish_next(self.t1)
+
+        with mock_datetime_now(now + datetime.timedelta(seconds=8), datetime):
+            self.scheduler.add_target(self.t2)
+            self.__finish_next(self.t2)
+
+        with mock_datetime_now(now + datetime.timedelta(seconds=10), datetime):
+            self.scheduler.add_target(self.t2, options={"age_requirement": 5})
+            self.__finish_next(self.t1)
+            self.__finish_next(self.t2)
+
+    def test_definition_changed(self):
+        # Only casks of stills with a changed definition are expired
+
+        self.scheduler.add_target(self.t2)
+        self.__finish_next(self.t1)
+        self.__finish_next(self.t2)
+
+        fingerprint = TaskLoader.fingerprint(TaskLoader.init(self.t1))
+        self.assertEqual(fingerprint, self.env.meta.get_cask(self.t1)["fingerprint"])
+
+        self.scheduler.add_target(self.t2)
+        self.assertEqual(None, self.scheduler.run_next())
+
+        with unittest.mock.patch.object(TaskLoader, "fingerprint", return_value="changed"):
+            self.scheduler.event_still_updated(self.t1[0])
+            self.scheduler.add_target(self.t2)
+            self.__finish_next(self.t1)
+            self.__finish_next(self.t2)
+
+    def __run_next_waiting(self, wait):
+        """Start waiting for the next spirit in a thread, returns the thread and its result list"""
+
+        result = []
+        thread = threading.Thread(target=lambda: result.append(self.scheduler.run_next(wait=wait)))
+        thread.start()
+
+        # Give the thread time to start waiting
+        time.sleep(0.1)
+        self.assertEqual([], result)
+
+        return thread, result
+
+    def test_wait_timeout(self):
+        started = time.monotonic()
+        self.assertEqual(None, self.scheduler.run_next(wait=0.2))
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+
+        self.assertEqual([], self.scheduler.run_batch(2, wait=0.1))
+
+    def test_wait_add_target(self):
+        thread, result = self.__run_next_waiting(10)
+
+        started = time.monotonic()
+        self.scheduler.add_target(self.t1)
+        thread.join()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.t1, result[0]["spirit_id"])
+
+    def test_wait_finish_spirit(self):
+        self.scheduler.add_target(self.t2)
+        transaction = self.scheduler.run_next()
+        self.assertEqual(self.t1, transaction["spirit_id"])
+
+        thread, result = self.__run_next_waiting(10)
+
+        started = time.monotonic()
+        self.scheduler.finish_spirit(transaction["transaction_id"])
+        thread.join()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.t2, result[0]["spirit_id"])
+
+    def test_wait_backlog(self):
+        # A waiting request is woken once a scheduled target is due
+        self.scheduler.add_target(
+            self.t1,
+            options={"start_date": datetime.datetime.now() + datetime.timedelta(seconds=0.3)}
+        )
+
+        started = time.monotonic()
+        transaction = self.scheduler.run_next(wait=10)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.t1, transaction["spirit_id"])
+
     # TODO test persistent schedules
 
 
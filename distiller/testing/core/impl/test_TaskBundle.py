@@ -0,0 +1,267 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+from distiller.utils.Environment import Environment
+from distiller.utils.Configuration import Configuration
+from distiller.utils.PathFinder import PathFinder
+from distiller.utils.Remote import Remote
+from distiller.core.impl.AsyncHttpServer import AsyncHttpServer
+from distiller.core.impl.CoreHandler import CoreHandler
+from distiller.core.impl.TaskBundle import TaskBundle
+
+
+class TestTaskBundle(unittest.TestCase):
+    def setUp(self):
+        self.task_root = tempfile.mkdtemp()
+        self.worker_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.task_root, "testing", "bundled", "__pycache__"))
+
+        self.write("testing/bundled/definition.py", "a = 1")
+        self.write("testing/bundled/__pycache__/definition.cpython.pyc", "byte code")
+
+        self.bundle = TaskBundle()
+
+    def tearDown(self):
+        self.bundle.close()
+        shutil.rmtree(self.task_root)
+        shutil.rmtree(self.worker_root)
+
+    def write(self, path, content):
+        with open(os.path.join(self.task_root, path), "w") as f:
+            f.write(content)
+
+    def test_rebuild(self):
+        revalidate_interval = TaskBundle.revalidate_interval
+        TaskBundle.revalidate_interval = 0
+
+        try:
+            digest = self.bundle.current(self.task_root)
+
+            # Byte code caches are ignored
+            self.write("testing/bundled/__pycache__/definition.cpython.pyc", "other byte code")
+            self.assertEqual(digest, self.bundle.current(self.task_root))
+
+            bundle_file, _ = self.bundle.open(self.task_root)
+            self.write("testing/bundled/definition.py", "a = 22")
+
+            self.assertNotEqual(digest, self.bundle.current(self.task_root))
+
+            # An opened bundle is still readable after the rebuild
+            with bundle_file:
+                self.assertEqual(digest, file_digest(bundle_file))
+        finally:
+            TaskBundle.revalidate_interval = revalidate_interval
+
+        self.assertIsNone(self.bundle.current(os.path.join(self.task_root, "missing")))
+
+    def test_reproducible(self):
+        # Builds of the same content have the same digest, regardless of build time and modification times
+        digest = self.bundle.current(self.task_root)
+
+        definition = os.path.join(self.task_root, "testing", "bundled", "definition.py")
+        os.utime(definition, (0, 1000000))
+        os.utime(os.path.dirname(definition), (0, 1000000))
+
+        other = TaskBundle()
+
+        try:
+            with unittest.mock.patch("time.time", return_value=2000000):
+                self.assertEqual(digest, other.current(self.task_root))
+        finally:
+            other.close()
+
+    def test_conditional_download(self):
+        env = Environment(Configuration.load("daemon", override={
+            "distiller": {"socket": {"port": 0}},
+            "log": {"verbose_level": "CRITICAL", "log_level": "never", "exit_level": "never"},
+            "meta": {"module": "distiller.core.impl.SQLiteMeta", "file_path": "!:d/unit_tests.db", "volatile": True}
+        }))
+
+        handler = CoreHandler()
+        server = AsyncHttpServer(handler, env)
+        server.run()
+
+        try:
+            with unittest.mock.patch.dict(os.environ, {PathFinder.task_env: self.task_root}):
+                remote = Remote(env.config.get("distiller.socket.ip"), server.port)
+
+                digest = remote.download_tasks(self.worker_root)
+
+                with open(os.path.join(self.worker_root, digest, "testing", "bundled", "definition.py")) as f:
+                    self.assertEqual("a = 1", f.read())
+
+                self.assertFalse(os.path.exists(
+                    os.path.join(self.worker_root, digest, "testing", "bundled", "__pycache__")
+                ))
+
+                # Unchanged definitions are not downloaded again
+                with unittest.mock.patch("tarfile.open") as tar_open:
+                    self.assertEqual(digest, remote.download_tasks(self.worker_root, digest=digest))
+                    tar_open.assert_not_called()
+
+                handler.bundle.revalidate_interval = 0
+                self.write("testing/bundled/definition.py", "a = 2")
+                new_digest = remote.download_tasks(self.worker_root, digest=digest)
+
+                self.assertNotEqual(digest, new_digest)
+
+                with open(os.path.join(self.worker_root, new_digest, "testing", "bundled", "definition.py")) as f:
+                    self.assertEqual("a = 2", f.read())
+        finally:
+            server.stop()
+            handler.bundle.close()
+
+    def test_failed_extract(self):
+        env = Environment(Configuration.load("daemon", override={
+            "distiller": {"socket": {"port": 0}},
+            "log": {"verbose_level": "CRITICAL", "log_level": "never", "exit_level": "never"},
+            "meta": {"module": "distiller.core.impl.SQLiteMeta", "file_path": "!:d/unit_tests.db", "volatile": True}
+        }))
+
+        handler = CoreHandler()
+        server = AsyncHttpServer(handler, env)
+        server.run()
+
+        try:
+            with unittest.mock.patch.dict(os.environ, {PathFinder.task_env: self.task_root}):
+                remote = Remote(env.config.get("distiller.socket.ip"), server.port)
+
+                # Partially extracted definitions are removed
+                with unittest.mock.patch("tarfile.TarFile.extractall", side_effect=OSError("Disk full")):
+                    with self.assertRaises(OSError):
+                        remote.download_tasks(self.worker_root)
+
+                self.assertEqual([], os.listdir(self.worker_root))
+
+                # Lost race against a concurrent download of the same definitions
+                rename = os.rename
+
+                def concurrent_rename(source, target):
+                    rename(source, target)
+                    os.makedirs(source)
+                    raise OSError("Directory not empty")
+
+                with unittest.mock.patch("os.rename", side_effect=concurrent_rename):
+                    digest = remote.download_tasks(self.worker_root)
+
+                self.assertEqual([digest], os.listdir(self.worker_root))
+        finally:
+            server.stop()
+            handler.bundle.close()
+
+    def test_spirit_download(self):
+        env = Environment(Configuration.load("daemon", override={
+            "distiller": {"socket": {"port": 0}},
+            "log": {"verbose_level": "CRITICAL", "log_level": "never", "exit_level": "never"},
+            "meta": {"module": "distiller.core.impl.SQLiteMeta", "file_path": "!:d/unit_tests.db", "volatile": True}
+        }))
+
+        handler = CoreHandler()
+        server = AsyncHttpServer(handler, env)
+        server.run()
+
+        spirit_id = ("testing.parameter_requires", {"requires": [
+            ("testing.parameter_requires_pipe", {"requires": [], "id": "bundled-pipe"})
+        ], "id": "bundled"})
+
+        try:
+            remote = Remote(env.config.get("distiller.socket.ip"), server.port)
+
+            digest = remote.download_spirit_tasks(spirit_id, self.worker_root)
+
+            # Only the stills of the dependency closure are bundled
+            self.assertEqual(["testing"], os.listdir(os.path.join(self.worker_root, digest)))
+            self.assertEqual(
+                ["parameter_requires", "parameter_requires_pipe"],
+                sorted(os.listdir(os.path.join(self.worker_root, digest, "testing")))
+            )
+
+            with unittest.mock.patch("tarfile.open") as tar_open:
+                self.assertEqual(
+                    digest,
+                    remote.download_spirit_tasks(spirit_id, self.worker_root, digests=["other", digest])
+                )
+                tar_open.assert_not_called()
+        finally:
+            server.stop()
+
+            for bundle in handler.spirit_bundles.values():
+                bundle.close()
+
+    def test_evict_while_sending(self):
+        env = Environment(Configuration.load("daemon", override={
+            "distiller": {"socket": {"port": 0}},
+            "log": {"verbose_level": "CRITICAL", "log_level": "never", "exit_level": "never"},
+            "meta": {"module": "distiller.core.impl.SQLiteMeta", "file_path": "!:d/unit_tests.db", "volatile": True}
+        }))
+
+        handler = CoreHandler()
+        handler.max_spirit_bundles = 1
+        server = AsyncHttpServer(handler, env)
+        server.run()
+
+        first_id = ("testing.parameter_requires", {"requires": [], "id": "evicted"})
+        second_id = ("testing.parameter_requires_pipe", {"requires": [], "id": "evicting"})
+
+        # The bundle of the first spirit is evicted while it is being sent
+        opening = threading.Event()
+        evicted = threading.Event()
+        bundle_open = TaskBundle.open
+
+        def blocking_open(bundle, task_root):
+            if bundle.paths == ["testing/parameter_requires"]:
+                opening.set()
+                evicted.wait(10)
+
+            return bundle_open(bundle, task_root)
+
+        results = []
+
+        try:
+            remote = Remote(env.config.get("distiller.socket.ip"), server.port)
+
+            with unittest.mock.patch.object(TaskBundle, "open", blocking_open):
+                thread = threading.Thread(
+                    target=lambda: results.append(remote.download_spirit_tasks(first_id, self.worker_root))
+                )
+                thread.start()
+                self.assertTrue(opening.wait(10))
+
+                first_bundle = next(iter(handler.spirit_bundles.values()))
+
+                remote.download_spirit_tasks(second_id, self.worker_root)
+                self.assertNotIn(first_bundle, handler.spirit_bundles.values())
+
+                # Not closed while in use
+                self.assertIsNotNone(first_bundle.bundle_dir)
+
+                evicted.set()
+                thread.join()
+
+            self.assertEqual(
+                ["parameter_requires"],
+                os.listdir(os.path.join(self.worker_root, results[0], "testing"))
+            )
+
+            # Closed once the response has been sent
+            self.assertIsNone(first_bundle.bundle_dir)
+            self.assertEqual(0, len(handler.spirit_bundle_users))
+        finally:
+            evicted.set()
+            server.stop()
+
+            for bundle in handler.spirit_bundles.values():
+                bundle.close()
+
+
+def file_digest(f):
+    return hashlib.sha256(f.read()).hexdigest()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from distiller.helpers.RequestHandler import RequestHandler
+
+
+def handler(name):
+    def handle(*args):
+        return name
+
+    handle.__name__ = name
+
+    return handle
+
+
+class TestRequestHandler(unittest.TestCase):
+    def setUp(self):
+        self.handler = RequestHandler()
+
+        self.handler.get("/tasks/definitions.tar.gz", handler("definitions"))
+        self.handler.post("/tasks/run", handler("run"))
+        self.handler.post("/tasks/finish/<int:transaction_id>", handler("finish"))
+        self.handler.post("/tasks/<name>", handler("named"))
+        self.handler.post("/casks/remove/spirit", handler("remove_spirit"))
+        self.handler.post("/casks/remove/(?P<mode>all|corrupt|unused)", handler("remove"))
+        self.handler.post("/files/(?P<path>.+)", handler("files"))
+        self.handler.all("/healthcheck", handler("healthcheck"))
+
+    def resolve(self, req_type, url):
+        resolved = self.handler.resolve_any(req_type, url)
+
+        if resolved is None:
+            return None
+
+        return resolved[0].__name__, resolved[1]
+
+    def test_static(self):
+        self.assertEqual(("definitions", {}), self.resolve("get", "/tasks/definitions.tar.gz"))
+        self.assertEqual(("run", {}), self.resolve("post", "/tasks/run"))
+        self.assertEqual(("healthcheck", {}), self.resolve("get", "/healthcheck"))
+        self.assertEqual(("healthcheck", {}), self.resolve("post", "/healthcheck"))
+
+        self.assertIsNone(self.resolve("get", "/tasks/run"))
+        self.assertIsNone(self.resolve("get", "/tasks/definitionsXtarXgz"))
+        self.assertIsNone(self.resolve("post", "/tasks/run/"))
+
+    def test_parameters(self):
+        self.assertEqual(("finish", {"transaction_id": 12}), self.resolve("post", "/tasks/finish/12"))
+        self.assertIsNone(self.resolve("post", "/tasks/finish/abc"))
+
+        # Static segments take precedence
+        self.assertEqual(("named", {"name": "other"}), self.resolve("post", "/tasks/other"))
+
+        self.assertEqual(("remove_spirit", {}), self.resolve("post", "/casks/remove/spirit"))
+        self.assertEqual(("remove", {"mode": "unused"}), self.resolve("post", "/casks/remove/unused"))
+        self.assertIsNone(self.resolve("post", "/casks/remove/some"))
+
+    def test_fallback(self):
+        self.assertEqual(("files", {"path": "a/b.txt"}), self.resolve("post", "/files/a/b.txt"))
+        self.assertIsNone(self.resolve("post", "/files/"))
+
+
+if __name__ == "__main__":
+    unittest.main()
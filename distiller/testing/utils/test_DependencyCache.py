@@ -0,0 +1,80 @@
+import unittest
+import unittest.mock
+
+from distiller.utils.TaskLoader import TaskLoader
+from distiller.utils.DependencyCache import DependencyCache
+from distiller.utils.DependencyExplorer import DependencyExplorer
+
+
+class TestDependencyCache(unittest.TestCase):
+    def setUp(self):
+        DependencyCache.invalidate()
+
+        self.t1 = TaskLoader.init(("testing.parameter_requires", {"requires": [], "id": "cache-1"}))
+        self.p2 = TaskLoader.init((
+            "testing.parameter_requires_pipe",
+            {"requires": [self.t1.spirit_id()], "id": "cache-2"}
+        ))
+        self.t3 = TaskLoader.init(("testing.parameter_requires", {"requires": [self.p2.spirit_id()], "id": "cache-3"}))
+        self.t4 = TaskLoader.init(("testing.parameter_requires", {"requires": [self.t1.spirit_id()], "id": "cache-4"}))
+
+    def tearDown(self):
+        DependencyCache.invalidate()
+
+    def test_involved_spirits(self):
+        self.assertEqual(
+            set(DependencyExplorer.involved_spirits(self.t3.spirit_id())),
+            set(DependencyCache.involved_spirits(self.t3.spirit_id()))
+        )
+
+        with unittest.mock.patch.object(DependencyExplorer, "explore") as explore:
+            self.assertEqual({self.t1, self.t3}, set(DependencyCache.involved_spirits(self.t3.spirit_id())))
+            self.assertEqual(
+                [root.spirit for root in DependencyCache.build_graph(self.t3.spirit_id())],
+                [self.t1]
+            )
+            explore.assert_not_called()
+
+    def test_dependents_of(self):
+        DependencyCache.involved_spirits(self.t3.spirit_id())
+        DependencyCache.involved_spirits(self.t4.spirit_id())
+
+        self.assertEqual(
+            {self.t3.spirit_id(), self.t4.spirit_id()},
+            set(DependencyCache.dependents_of(self.t1.spirit_id()))
+        )
+
+        # Skipped pipes are indexed as well
+        self.assertEqual([self.t3.spirit_id()], DependencyCache.dependents_of(self.p2.spirit_id()))
+        self.assertEqual([], DependencyCache.dependents_of(self.t3.spirit_id()))
+
+        DependencyCache.invalidate(self.t3.spirit_id())
+
+        self.assertEqual([self.t4.spirit_id()], DependencyCache.dependents_of(self.t1.spirit_id()))
+
+    def test_serial(self):
+        serial = DependencyCache.serial(self.t3.spirit_id())
+        self.assertEqual(serial, DependencyCache.serial(self.t3.spirit_id()))
+
+        # Rebuilt graphs have a new serial number
+        DependencyCache.invalidate(self.t3.spirit_id())
+        self.assertNotEqual(serial, DependencyCache.serial(self.t3.spirit_id()))
+
+    def test_definition_changed(self):
+        DependencyCache.involved_spirits(self.t3.spirit_id())
+        DependencyCache.involved_spirits(self.t1.spirit_id())
+
+        # Changing the pipe drops only the graphs it has been explored for
+        TaskLoader.invalidate("testing.parameter_requires_pipe")
+
+        self.assertEqual([], DependencyCache.dependents_of(self.p2.spirit_id()))
+        self.assertIn(self.t1.spirit_id(), DependencyCache.graphs)
+        self.assertNotIn(self.t3.spirit_id(), DependencyCache.graphs)
+
+        with unittest.mock.patch.object(DependencyExplorer, "explore", wraps=DependencyExplorer.explore) as explore:
+            self.assertEqual({self.t1, self.t3}, set(DependencyCache.involved_spirits(self.t3.spirit_id())))
+            explore.assert_called_once_with(self.t3.spirit_id())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
+import sys
 import unittest
+import unittest.mock
 
 from distiller.utils.TaskLoader import TaskLoader
 from distiller.utils.DependencyExplorer import DependencyExplorer, DependencyNode, CyclicDependencyException
@@ -99,6 +101,35 @@ class TestDependencyExplorer(unittest.TestCase):
 
         self.assertEqual(len(DependencyExplorer.involved_spirits(r3.spirit_id())), 6)
 
+    def test_deep_chain(self):
+        # Deeper than the recursion limit, every spirit requires the next one
+        depth = sys.getrecursionlimit() + 500
+        chain = TaskLoader.init(("testing.recursive_dependency", {"n": depth, "m": depth + 1}))
+
+        self.assertEqual(depth + 1, len(DependencyExplorer.involved_spirits(chain.spirit_id())))
+
+        roots = DependencyExplorer.build_graph(chain.spirit_id())
+        self.assertEqual([{"n": 0, "m": 1}], [root.spirit.parameters for root in roots])
+
+    def test_diamond(self):
+        shared = TaskLoader.init(("testing.parameter_requires", {"requires": [], "id": "shared"}))
+        left = TaskLoader.init(("testing.parameter_requires", {"requires": [shared.spirit_id()], "id": "left"}))
+        right = TaskLoader.init(("testing.parameter_requires", {"requires": [shared.spirit_id()], "id": "right"}))
+        top = TaskLoader.init((
+            "testing.parameter_requires",
+            {"requires": [left.spirit_id(), right.spirit_id()], "id": "top"}
+        ))
+
+        # The shared dependency is expanded once, the second path reuses its result
+        with unittest.mock.patch.object(shared, "requires", wraps=shared.requires) as requires:
+            involved, roots, explored = DependencyExplorer.explore(top.spirit_id())
+
+        self.assertEqual(1, requires.call_count)
+        self.assertEqual(1, explored.count(shared))
+        self.assertCountEqual([shared, left, right, top], involved)
+
+        self.assertEqual({"shared<-(left<-(top);right<-(top))"}, {_repr(root) for root in roots})
+
     def _get_roots(self, spirit):
         return {root.spirit for root in DependencyExplorer.build_graph(spirit.spirit_id())}
 
@@ -1,3 +1,6 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 from distiller.utils.TaskLoader import TaskLoader, TaskLoadError
@@ -28,6 +31,108 @@ class TestTaskLoader(unittest.TestCase):
         aSpirit = ValidSpirit()
         self.assertTrue(aSpirit.a_test_function())
 
+    def test_fingerprint(self):
+        task_root = tempfile.mkdtemp()
+        task_path = os.path.join(task_root, "testing", "fingerprinted")
+        os.makedirs(task_path)
+
+        try:
+            with open(os.path.join(task_path, "definition.py"), "w") as f:
+                f.write(
+                    "from distiller.api.DefaultStill import DefaultStill\n"
+                    "class Still(DefaultStill):\n"
+                    "    def definition_files(self):\n"
+                    "        return ['run.sh']\n"
+                )
+
+            with open(os.path.join(task_path, "run.sh"), "w") as f:
+                f.write("echo 1")
+
+            spirit = TaskLoader.init(("testing.fingerprinted", {}), task_root=task_root)
+            fingerprint = TaskLoader.fingerprint(spirit, task_root=task_root)
+
+            self.assertEqual(fingerprint, TaskLoader.fingerprint(spirit, task_root=task_root))
+
+            # Declared files are part of the fingerprint
+            with open(os.path.join(task_path, "run.sh"), "w") as f:
+                f.write("echo 2")
+
+            TaskLoader.invalidate("testing.fingerprinted")
+
+            self.assertNotEqual(fingerprint, TaskLoader.fingerprint(spirit, task_root=task_root))
+
+            # Changed files are noticed without invalidation, only the latest fingerprint is kept
+            fingerprint = TaskLoader.fingerprint(spirit, task_root=task_root)
+
+            with open(os.path.join(task_path, "run.sh"), "w") as f:
+                f.write("echo 33")
+
+            self.assertNotEqual(fingerprint, TaskLoader.fingerprint(spirit, task_root=task_root))
+            self.assertEqual(
+                TaskLoader.fingerprint(spirit, task_root=task_root),
+                TaskLoader.cached_fingerprints["testing.fingerprinted"][1]
+            )
+        finally:
+            TaskLoader.invalidate("testing.fingerprinted")
+            shutil.rmtree(task_root)
+
+    def test_definition_cache(self):
+        task_root = tempfile.mkdtemp()
+        task_path = os.path.join(task_root, "testing", "cached")
+        os.makedirs(task_path)
+
+        def write_definition(value):
+            with open(os.path.join(task_path, "definition.py"), "w") as f:
+                f.write(
+                    "from distiller.api.DefaultStill import DefaultStill\n"
+                    "class Still(DefaultStill):\n"
+                    "    value = %r\n" % value
+                )
+
+        revalidate_interval = TaskLoader.revalidate_interval
+
+        try:
+            write_definition("a")
+
+            spirit = TaskLoader.init(("testing.cached", {"id": 1}), task_root=task_root)
+            self.assertIs(spirit, TaskLoader.init(("testing.cached", {"id": 1}), task_root=task_root))
+            self.assertEqual("a", spirit.value)
+
+            # Private instances are neither taken from nor added to the cache
+            private = TaskLoader.init(("testing.cached", {"id": 1}), task_root=task_root, cached=False)
+            self.assertIsNot(spirit, private)
+            self.assertIs(spirit, TaskLoader.init(("testing.cached", {"id": 1}), task_root=task_root))
+
+            # Changes are only noticed after the revalidation interval
+            TaskLoader.revalidate_interval = 3600
+            write_definition("bb")
+            self.assertEqual("a", TaskLoader.init(("testing.cached", {"id": 1}), task_root=task_root).value)
+
+            TaskLoader.revalidate_interval = 0
+            self.assertEqual("bb", TaskLoader.init(("testing.cached", {"id": 1}), task_root=task_root).value)
+        finally:
+            TaskLoader.revalidate_interval = revalidate_interval
+            TaskLoader.invalidate("testing.cached")
+            shutil.rmtree(task_root)
+
+    def test_spirit_lru(self):
+        max_cached_spirits = TaskLoader.max_cached_spirits
+        TaskLoader.max_cached_spirits = 2
+
+        try:
+            first = TaskLoader.init(("testing.valid_definition", {"id": 1}))
+            TaskLoader.init(("testing.valid_definition", {"id": 2}))
+
+            # Recently used spirits are kept
+            self.assertIs(first, TaskLoader.init(("testing.valid_definition", {"id": 1})))
+            TaskLoader.init(("testing.valid_definition", {"id": 3}))
+
+            self.assertIs(first, TaskLoader.init(("testing.valid_definition", {"id": 1})))
+            self.assertEqual(2, len(TaskLoader.cached_spirits))
+        finally:
+            TaskLoader.max_cached_spirits = max_cached_spirits
+            TaskLoader.invalidate("testing.valid_definition")
+
 
 if __name__ == "__main__":
     unittest.main()
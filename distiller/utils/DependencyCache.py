@@ -0,0 +1,158 @@
+import collections
+import itertools
+import threading
+
+from distiller.api.SpiritId import SpiritId
+from distiller.utils.DependencyExplorer import DependencyExplorer
+from distiller.utils.TaskLoader import TaskLoader, TaskLoadError
+
+
+class DependencyCache:
+    """Caches the complete dependency graphs of spirits across calls (see `DependencyExplorer`),
+    together with a reverse index from every explored spirit to the cached spirits depending on it.
+
+    A graph is dropped as soon as the definition of any still explored for it changed (see `TaskLoader.generation`).
+    At most `max_cached_graphs` graphs are kept, the least recently used ones are dropped first.
+    Every built graph has a new serial number, callers which keep data derived from a graph (e.g. relying on
+    `dependents_of` for its invalidation) can compare it with `serial` to notice that the graph has been rebuilt.
+    """
+
+    max_cached_graphs = 1000
+
+    lock = threading.RLock()
+
+    # Spirit id -> CachedGraph, in order of last use
+    graphs = collections.OrderedDict()
+    # Spirit id -> set of spirit ids of the cached graphs it has been explored for
+    dependents = {}
+
+    serials = itertools.count()
+
+    @classmethod
+    def involved_spirits(cls, spirit_id):
+        """Returns all spirits needed to build a spirit, like `DependencyExplorer.involved_spirits`"""
+
+        return list(cls.__get(spirit_id).spirits)
+
+    @classmethod
+    def build_graph(cls, spirit_id):
+        """Returns the root nodes of the complete dependency graph of a spirit, like `DependencyExplorer.build_graph`
+        Attention: The graph is shared between all callers and must not be modified.
+        """
+
+        return cls.__get(spirit_id).roots
+
+    @classmethod
+    def explored_spirits(cls, spirit_id):
+        """Returns all spirits explored for the dependency graph of a spirit, in contrast to `involved_spirits`
+        this includes pipes
+        """
+
+        return list(cls.__get(spirit_id).explored)
+
+    @classmethod
+    def serial(cls, spirit_id):
+        """Returns the serial number of the cached dependency graph of a spirit, which changes if it is rebuilt"""
+
+        return cls.__get(spirit_id).serial
+
+    @classmethod
+    def dependents_of(cls, spirit_id):
+        """Returns the spirit ids of all cached graphs spirit_id is part of (directly, through pipes or transitively)
+        The spirit itself is not included.
+        """
+
+        with cls.lock:
+            spirit_id = SpiritId(spirit_id)
+            dependent_ids = []
+
+            for dependent_id in list(cls.dependents.get(spirit_id, ())):
+                if cls.__is_valid(cls.graphs[dependent_id]):
+                    if dependent_id != spirit_id:
+                        dependent_ids.append(dependent_id)
+                else:
+                    cls.__drop(dependent_id)
+
+            return dependent_ids
+
+    @classmethod
+    def invalidate(cls, spirit_id=None):
+        """Drop the cached graph of a spirit, or all cached graphs if spirit_id is None"""
+
+        with cls.lock:
+            if spirit_id is None:
+                cls.graphs.clear()
+                cls.dependents.clear()
+            else:
+                cls.__drop(SpiritId(spirit_id))
+
+    @classmethod
+    def __get(cls, spirit_id):
+        with cls.lock:
+            spirit_id = SpiritId(spirit_id)
+            graph = cls.graphs.get(spirit_id, None)
+
+            if graph is not None:
+                if cls.__is_valid(graph):
+                    cls.graphs.move_to_end(spirit_id)
+                    return graph
+
+                cls.__drop(spirit_id)
+
+            spirits, roots, explored = DependencyExplorer.explore(spirit_id)
+
+            graph = CachedGraph(
+                spirits,
+                roots,
+                explored,
+                {still_id: TaskLoader.generation(still_id) for still_id in {spirit.name() for spirit in explored}},
+                next(cls.serials)
+            )
+
+            cls.graphs[spirit_id] = graph
+
+            for member_id in graph.member_ids:
+                cls.dependents.setdefault(member_id, set()).add(spirit_id)
+
+            # Drop least recently used graphs
+            while len(cls.graphs) > cls.max_cached_graphs:
+                cls.__drop(next(iter(cls.graphs)))
+
+            return graph
+
+    @classmethod
+    def __is_valid(cls, graph):
+        try:
+            return all(
+                TaskLoader.generation(still_id) == generation
+                for still_id, generation in graph.generations.items()
+            )
+        except TaskLoadError:
+            return False
+
+    @classmethod
+    def __drop(cls, spirit_id):
+        graph = cls.graphs.pop(spirit_id, None)
+
+        if graph is None:
+            return
+
+        for member_id in graph.member_ids:
+            dependent_ids = cls.dependents[member_id]
+            dependent_ids.discard(spirit_id)
+
+            if len(dependent_ids) == 0:
+                del cls.dependents[member_id]
+
+
+class CachedGraph:
+    def __init__(self, spirits, roots, explored, generations, serial):
+        # Involved spirits and root nodes of the graph
+        self.spirits = spirits
+        self.roots = roots
+        # All explored spirits (including pipes) and their spirit ids
+        self.explored = explored
+        self.member_ids = [spirit.spirit_id() for spirit in explored]
+        # Still id -> generation of its definition (see `TaskLoader.generation`)
+        self.generations = generations
+        self.serial = serial
@@ -4,100 +4,170 @@ from distiller.utils.TaskLoader import TaskLoader
 class DependencyExplorer:
     @classmethod
     def build_graph(cls, target_spirit_id, **kwargs):
-        return cls.__explore(
-            TaskLoader.init(target_spirit_id),
-            **kwargs
-        )[2]
+        return cls.__explore(TaskLoader.init(target_spirit_id), **kwargs)[2]
 
     @classmethod
     def involved_spirits(cls, target_spirit_id, **kwargs):
-        return list(cls.__explore(
-            TaskLoader.init(target_spirit_id),
-            **kwargs
-        )[0].keys())
+        return list(cls.__explore(TaskLoader.init(target_spirit_id), **kwargs)[0].keys())
 
     @classmethod
-    def __explore(
-            cls,
-            current_spirit,
-            all_nodes=None,
-            downward_used_spirits=None,
-            downward_occurrences=None,
-            **kwargs
-    ):
-        enforce_func = kwargs.get("enforce_func", None)
-        skip_pipes = kwargs.get("skip_pipes", True)
+    def explore(cls, target_spirit_id, **kwargs):
+        """Returns a tuple (involved spirits, root nodes, explored spirits) of the dependency graph of a spirit
+        In contrast to the involved spirits, the explored spirits include skipped pipes and pruned spirits.
+        """
 
-        if all_nodes is None:
-            all_nodes = dict()
-        if downward_used_spirits is None:
-            downward_used_spirits = set()
-        if downward_occurrences is None:
-            downward_occurrences = dict()
+        all_nodes, _, roots, explored = cls.__explore(TaskLoader.init(target_spirit_id), **kwargs)
 
-        # Check if current spirit has already been used
-        if current_spirit in downward_used_spirits:
-            raise CyclicDependencyException(current_spirit.spirit_id())
+        return list(all_nodes.keys()), roots, explored
 
-        up_downward_used_spirits = set(downward_used_spirits)
-        up_downward_used_spirits.add(current_spirit)
+    @classmethod
+    def input_spirits(cls, spirit):
+        """Returns the spirits whose casks are read by spirit, pipes are resolved to their inputs"""
 
-        # Check if the task exceeds its occurrence count
-        up_downward_occurrences = dict(downward_occurrences)
+        inputs = []
+        visited = set()
+        stack = [TaskLoader.init(dep) for dep in spirit.requires()]
 
-        curr_task_id = current_spirit.name()
+        while stack:
+            dep_spirit = stack.pop()
 
-        if curr_task_id not in up_downward_occurrences:
-            up_downward_occurrences[curr_task_id] = current_spirit.occurrences()
+            if dep_spirit in visited:
+                continue
 
-        up_downward_occurrences[curr_task_id] -= 1
+            visited.add(dep_spirit)
 
-        if up_downward_occurrences[curr_task_id] < 0:
-            raise CyclicDependencyException(curr_task_id, task=True)
+            if TaskLoader.spirit_is_pipe(dep_spirit):
+                stack.extend(TaskLoader.init(dep) for dep in dep_spirit.requires())
+            else:
+                inputs.append(dep_spirit)
 
-        parents = set()
-        roots = set()
+        return inputs
 
-        for dep in current_spirit.requires():
-            dep_spirit = TaskLoader.init(dep)
+    @classmethod
+    def __explore(cls, target_spirit, enforce_func=None, skip_pipes=True):
+        """Explore the dependencies of target_spirit depth first without recursion.
+        Every spirit is expanded only once, shared dependencies reuse its result.
 
-            _, dep_nodes, dep_roots = cls.__explore(
-                dep_spirit,
-                all_nodes=all_nodes,
-                downward_used_spirits=up_downward_used_spirits,
-                downward_occurrences=up_downward_occurrences,
-                **kwargs
-            )
+        Returns a tuple (all nodes, nodes of target_spirit, root nodes, explored spirits)
+        """
 
-            if dep_nodes is not None:
-                parents.update(dep_nodes)
-                roots.update(dep_roots)
-
-        has_parents = len(parents) > 0
-        # Default is all enforced
-        build_enforced = enforce_func is None or enforce_func(current_spirit)
-        is_pipe = TaskLoader.spirit_is_pipe(current_spirit)
-
-        # No prune possible if upward needs to be built or build for this spirit is enforced.
-        if skip_pipes and is_pipe:
-            if has_parents:
-                return all_nodes, parents, roots
+        all_nodes = dict()
+
+        # Spirit -> (nodes, roots, occurrences) of expanded spirits, where occurrences is the maximum number
+        # of spirits per task on a path starting at the spirit
+        expanded = dict()
+
+        # Spirits and number of spirits per task on the current path, with the occurrence limit of each task
+        path_spirits = set()
+        path_occurrences = dict()
+        path_limits = dict()
+
+        def enter(spirit):
+            if spirit in path_spirits:
+                raise CyclicDependencyException(spirit.spirit_id())
+
+            task_id = spirit.name()
+
+            if task_id not in path_occurrences:
+                path_occurrences[task_id] = 0
+                path_limits[task_id] = spirit.occurrences()
+
+            path_occurrences[task_id] += 1
+
+            if path_occurrences[task_id] > path_limits[task_id]:
+                raise CyclicDependencyException(task_id, task=True)
+
+            path_spirits.add(spirit)
+
+            # Frame: spirit, remaining dependencies, parent nodes, roots, occurrences below
+            return [spirit, iter(spirit.requires()), set(), set(), dict()]
+
+        def leave(frame):
+            spirit, _, parents, roots, occurrences = frame
+
+            task_id = spirit.name()
+            occurrences[task_id] = occurrences.get(task_id, 0) + 1
+
+            path_spirits.discard(spirit)
+            path_occurrences[task_id] -= 1
+
+            if path_occurrences[task_id] == 0:
+                del path_occurrences[task_id]
+                del path_limits[task_id]
+
+            has_parents = len(parents) > 0
+            # Default is all enforced
+            build_enforced = enforce_func is None or enforce_func(spirit)
+            is_pipe = TaskLoader.spirit_is_pipe(spirit)
+
+            # No prune possible if upward needs to be built or build for this spirit is enforced.
+            if skip_pipes and is_pipe:
+                if has_parents:
+                    result = (parents, roots, occurrences)
+                else:
+                    result = (None, [], occurrences)
+            elif has_parents or build_enforced:
+                curr_node = cls.__get_node(all_nodes, spirit)
+
+                for parent in parents:
+                    curr_node.add_parent(parent)
+
+                # No parents? This is the first with enforced build.
+                # Therefore, it is the first root of this path.
+                if not has_parents:
+                    roots = [curr_node]
+
+                result = ([curr_node], roots, occurrences)
             else:
-                return all_nodes, None, []
-        elif has_parents or build_enforced:
-            curr_node = cls.__get_node(all_nodes, current_spirit)
+                result = (None, [], occurrences)
 
-            for parent in parents:
-                curr_node.add_parent(parent)
+            expanded[spirit] = result
 
-            # No parents? This is the first with enforced build.
-            # Therefore, it is the first root of this path.
-            if not has_parents:
-                roots = [curr_node]
+            return result
 
-            return all_nodes, [curr_node], roots
-        else:
-            return all_nodes, None, []
+        def merge(frame, result):
+            dep_nodes, dep_roots, dep_occurrences = result
+            occurrences = frame[4]
+
+            if dep_nodes is not None:
+                frame[2].update(dep_nodes)
+                frame[3].update(dep_roots)
+
+            for task_id, count in dep_occurrences.items():
+                if count > occurrences.get(task_id, 0):
+                    occurrences[task_id] = count
+
+        stack = [enter(target_spirit)]
+        result = None
+
+        while stack:
+            frame = stack[-1]
+            dep = next(frame[1], None)
+
+            if dep is None:
+                stack.pop()
+                result = leave(frame)
+
+                if stack:
+                    merge(stack[-1], result)
+
+                continue
+
+            dep_spirit = TaskLoader.init(dep)
+            dep_result = expanded.get(dep_spirit, None)
+
+            if dep_result is None:
+                stack.append(enter(dep_spirit))
+                continue
+
+            # An expanded spirit is acyclic, but its paths may exceed the occurrences left on the current path
+            for task_id, count in dep_result[2].items():
+                if task_id in path_occurrences and path_occurrences[task_id] + count > path_limits[task_id]:
+                    raise CyclicDependencyException(task_id, task=True)
+
+            merge(frame, dep_result)
+
+        return all_nodes, result[0], result[1], list(expanded.keys())
 
     @classmethod
     def __get_node(cls, nodes, spirit):
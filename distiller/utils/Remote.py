@@ -3,15 +3,47 @@ import tempfile
 import os
 import tarfile
 import json
+import hashlib
+import shutil
+import threading
 
 
 class Remote:
     def __init__(self, host, port):
         self.url_prefix = "http://%s:%i/" % (host, port)
 
-    def run_next(self):
+        # Connections are kept alive between requests, with a session per thread since sessions are not thread safe
+        # (e.g. the heartbeats of a worker are sent from another thread)
+        self.local = threading.local()
+
+    @property
+    def session(self):
+        session = getattr(self.local, "session", None)
+
+        if session is None:
+            session = requests.Session()
+            self.local.session = session
+
+        return session
+
+    def run_next(self, max_jobs=None, wait=None):
+        """Request the next job (or up to max_jobs jobs)
+
+        Keyword arguments:
+        max_jobs -- Optional maximum number of jobs to request at once
+        wait -- Optional number of seconds the daemon waits for a job to become runnable if there is none
+        """
+
         url = self.url_prefix + "tasks/run"
-        res = requests.post(url, "{}")
+        body = {}
+
+        if max_jobs is not None:
+            body["max_jobs"] = max_jobs
+
+        if wait is not None:
+            body["wait"] = wait
+
+        res = self.session.post(url, json.dumps(body))
 
         if res.status_code != 200:
             raise NetworkError("%s: Status code %i" % (url, res.status_code))
@@ -23,33 +55,96 @@ class Remote:
 
         return obj
 
-    def download_tasks(self, target):
+    def download_tasks(self, bundle_root, digest=None):
+        """Download the task definitions and extract them to bundle_root/<digest>, unless they are there already
+        Returns the digest of the definitions (ETag of the daemon)
+
+        Keyword arguments:
+        digest -- Digest of the definitions extracted before, they are not downloaded again if unchanged
+        """
+
         url = self.url_prefix + "tasks/definitions.tar.gz"
-        res = requests.get(url, stream=True)
+        res = self.session.get(url, stream=True, headers=if_none_match([] if digest is None else [digest]))
+
+        return self.__extract_bundle(url, res, bundle_root)
+
+    def download_spirit_tasks(self, spirit_id, bundle_root, digests=None):
+        """Download only the still definitions needed to execute a spirit and extract them to bundle_root/<digest>,
+        unless they are there already
+        Returns the digest of the definitions (ETag of the daemon)
+
+        Keyword arguments:
+        digests -- Digests of the definitions extracted before, they are not downloaded again if one is up to date
+        """
+
+        url = self.url_prefix + "tasks/definitions/spirit"
+        res = self.session.post(
+            url,
+            json.dumps({"spirit_id": spirit_id}),
+            stream=True,
+            headers=if_none_match(digests or [])
+        )
+
+        return self.__extract_bundle(url, res, bundle_root)
+
+    @staticmethod
+    def __extract_bundle(url, res, bundle_root):
+        if res.status_code == 304:
+            res.close()
+            digest = res.headers.get("etag", "").strip("\"")
+
+            if os.path.isdir(os.path.join(bundle_root, digest)):
+                return digest
+
+            raise NetworkError("%s: Not modified, but definitions %s are missing" % (url, digest))
 
         if res.status_code != 200:
             raise NetworkError("%s: Status code %i" % (url, res.status_code))
 
-        _, tmp_file = tempfile.mkstemp()
+        fd, tmp_file = tempfile.mkstemp(dir=bundle_root)
+        content_hash = hashlib.sha256()
+
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in res.iter_content(64 * 1024):
+                    f.write(chunk)
+                    content_hash.update(chunk)
+
+            digest = res.headers.get("etag", "").strip("\"") or content_hash.hexdigest()
+            target = os.path.join(bundle_root, digest)
 
-        with open(tmp_file, "wb") as f:
-            for chunk in res.iter_content(8192):
-                f.write(chunk)
+            if not os.path.isdir(target):
+                extract_dir = tempfile.mkdtemp(dir=bundle_root)
 
-        with tarfile.open(tmp_file, "r:gz") as tar:
-            tar.extractall(target)
+                try:
+                    with tarfile.open(tmp_file, "r:gz") as tar:
+                        tar.extractall(extract_dir)
 
-        os.remove(tmp_file)
+                    os.rename(extract_dir, target)
+                except Exception:
+                    shutil.rmtree(extract_dir, ignore_errors=True)
+
+                    # Extracted by a concurrent download in the meantime
+                    if not os.path.isdir(target):
+                        raise
+        finally:
+            os.remove(tmp_file)
+
+        return digest
+
+    def finish_task(self, transaction_id, finish_state, message, stats=None, next_job=False):
+        """Finish a job, with next_job the result contains the next job under `next` if one is runnable right away"""
 
-    def finish_task(self, transaction_id, finish_state, message):
         url = self.url_prefix + "tasks/finish/%i" % transaction_id
 
         if isinstance(message, Exception):
             message = message.__str__()
 
-        res = requests.post(url, json.dumps({
+        res = self.session.post(url, json.dumps({
             "status": finish_state.name,
-            "message": message
+            "message": message,
+            "stats": stats,
+            "next_job": next_job
         }))
 
         if res.status_code != 200:
@@ -68,7 +163,7 @@ class Remote:
 
         url = self.url_prefix + "targets/add"
 
-        res = requests.post(url, json.dumps({
+        res = self.session.post(url, json.dumps({
             "spirit_id": spirit_id,
             "options": options
         }))
@@ -87,7 +182,7 @@ class Remote:
 
         url = self.url_prefix + "targets/remove"
 
-        res = requests.post(url, json.dumps({
+        res = self.session.post(url, json.dumps({
             "spirit_id": spirit_id,
             "options": options
         }))
@@ -103,7 +198,7 @@ class Remote:
     def heartbeat(self, transaction_id):
         url = self.url_prefix + "tasks/heartbeat/%i" % transaction_id
 
-        res = requests.post(url)
+        res = self.session.post(url)
 
         if res.status_code != 200:
             raise NetworkError("%s: Status code %i" % (url, res.status_code))
@@ -116,7 +211,7 @@ class Remote:
     def remove_spirit_cask(self, spirit_id):
         url = self.url_prefix + "casks/remove/spirit"
 
-        res = requests.post(url, json.dumps({
+        res = self.session.post(url, json.dumps({
             "spirit_id": spirit_id
         }))
 
@@ -131,7 +226,26 @@ class Remote:
     def remove_casks(self, mode):
         url = self.url_prefix + "casks/remove/" + mode
 
-        res = requests.post(url)
+        res = self.session.post(url)
+
+        if res.status_code != 200:
+            raise NetworkError("%s: Status code %i" % (url, res.status_code))
+
+        obj = res.json()
+
+        if obj.get("error", None) is not None:
+            raise RemoteError(obj["error"])
+
+    def get_executions(self, query=None):
+        """Returns executions from the execution history of the daemon
+
+        Keyword arguments:
+        query -- Dictionary with optional spirit_id, still, since (iso date), finish_state, order_by and limit
+        """
+
+        url = self.url_prefix + "executions"
+
+        res = self.session.post(url, json.dumps({} if query is None else query))
 
         if res.status_code != 200:
             raise NetworkError("%s: Status code %i" % (url, res.status_code))
@@ -141,10 +255,12 @@ class Remote:
         if obj.get("error", None) is not None:
             raise RemoteError(obj["error"])
 
+        return obj["executions"]
+
     def fetch_worker_conf(self):
         url = self.url_prefix + "config/accumulated/worker.json"
 
-        res = requests.get(url)
+        res = self.session.get(url)
 
         if res.status_code != 200:
             raise NetworkError("%s: Status code %i" % (url, res.status_code))
@@ -152,6 +268,15 @@ class Remote:
         return res.json()
 
 
+def if_none_match(digests):
+    """Returns the headers for a conditional request for content with other digests"""
+
+    if len(digests) == 0:
+        return {}
+
+    return {"if-none-match": ", ".join("\"%s\"" % digest for digest in digests)}
+
+
 class NetworkError(Exception):
     pass
 
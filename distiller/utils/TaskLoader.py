@@ -2,86 +2,212 @@ import os
 import importlib.util
 import inspect
 import json
+import hashlib
+import collections
+import time
+import threading
 
 from distiller.utils.PathFinder import PathFinder
 from distiller.api.AbstractTask import AbstractTask
+from distiller.api.SpiritId import SpiritId
 
 
 class TaskLoader:
+    """Loads still definitions and creates spirit instances.
+
+    Loaded definitions are cached and revalidated by the modification time and size of their definition file,
+    at most every `revalidate_interval` seconds per still.
+    Spirit instances are kept in a LRU cache of at most `max_cached_spirits` instances.
+    Cached instances are shared between all callers (and threads), so spirits must not keep state between uses.
+    `init` with cached=False creates a private instance instead, e.g. to execute a spirit on a worker.
+    """
+
+    revalidate_interval = 1
+    max_cached_spirits = 100000
+
+    # Definitions are loaded from different threads (e.g. scheduler and http handlers)
+    lock = threading.RLock()
+
+    # Task id -> CachedTask
     cached_tasks = {}
-    cached_spirits = {}
+    # Spirit id -> spirit instance, in order of last use
+    cached_spirits = collections.OrderedDict()
+    # Task id -> set of its spirit ids in cached_spirits
+    cached_spirit_keys = {}
+    # Task id -> (signatures of its definition files, fingerprint)
+    cached_fingerprints = {}
+    # Task id -> number of invalidations of its definition
+    generations = {}
 
     @classmethod
     def load(cls, task_id, task_root=None):
-        if task_id in cls.cached_tasks:
-            return cls.cached_tasks[task_id]
+        with cls.lock:
+            task_path = PathFinder.get_task_path(task_id, task_root=task_root)
+            task_def = os.path.join(task_path, "definition.py")
 
-        task_path = PathFinder.get_task_path(task_id, task_root=task_root)
-        task_def = os.path.join(task_path, "definition.py")
+            if cls.__revalidate(task_id, task_def):
+                return cls.cached_tasks[task_id].task_class
 
-        if not os.path.isdir(task_path):
-            raise TaskLoadError("Task %s not found" % task_id)
+            if not os.path.isdir(task_path):
+                raise TaskLoadError("Task %s not found" % task_id)
 
-        if not os.path.isfile(task_def):
-            raise TaskLoadError("Definition file for task %s missing" % task_id)
+            if not os.path.isfile(task_def):
+                raise TaskLoadError("Definition file for task %s missing" % task_id)
 
-        spec = importlib.util.spec_from_file_location(task_id, task_def)
-        task_module = importlib.util.module_from_spec(spec)
+            # Signature before execution, a change during loading is detected with the next revalidation
+            signature = file_signature(task_def)
 
-        try:
-            spec.loader.exec_module(task_module)
-        except:
-            raise TaskLoadError("Definition file for task %s is corrupt" % task_id)
+            spec = importlib.util.spec_from_file_location(task_id, task_def)
+            task_module = importlib.util.module_from_spec(spec)
 
-        # FIXME: why does this subclass check work here but for MongoDriver a workaround needs to be built?
-        # FIXME: by creating a class_id.
-        task_classes = [
-            v
-            for (_, v) in inspect.getmembers(task_module, inspect.isclass)
-            if v.__module__ == task_module.__name__ and issubclass(v, AbstractTask)
-        ]
+            try:
+                spec.loader.exec_module(task_module)
+            except:
+                raise TaskLoadError("Definition file for task %s is corrupt" % task_id)
 
-        if len(task_classes) == 0:
-            raise TaskLoadError("Definition file for task %s does not contain a task" % task_id)
+            # FIXME: why does this subclass check work here but for MongoDriver a workaround needs to be built?
+            # FIXME: by creating a class_id.
+            task_classes = [
+                v
+                for (_, v) in inspect.getmembers(task_module, inspect.isclass)
+                if v.__module__ == task_module.__name__ and issubclass(v, AbstractTask)
+            ]
 
-        cls.cached_tasks[task_id] = task_classes[0]
+            if len(task_classes) == 0:
+                raise TaskLoadError("Definition file for task %s does not contain a task" % task_id)
 
-        return task_classes[0]
+            cls.cached_tasks[task_id] = CachedTask(task_classes[0], task_def, signature)
+
+            return task_classes[0]
 
     @classmethod
     def invalidate(cls, task_id):
-        if task_id in cls.cached_tasks:
-            del cls.cached_tasks[task_id]
+        with cls.lock:
+            cls.generations[task_id] = cls.generations.get(task_id, 0) + 1
+
+            if task_id in cls.cached_tasks:
+                del cls.cached_tasks[task_id]
+
+            for key in cls.cached_spirit_keys.pop(task_id, ()):
+                del cls.cached_spirits[key]
 
-        if task_id in cls.cached_spirits:
-            del cls.cached_spirits[task_id]
+            if task_id in cls.cached_fingerprints:
+                del cls.cached_fingerprints[task_id]
 
     @classmethod
-    def init(cls, spirit_id, task_root=None, always_refresh=True, none_on_error=False):
-        still_id, parameters = spirit_id
+    def generation(cls, task_id, task_root=None):
+        """Returns a number that changes whenever the definition of a task is reloaded or invalidated
+        The definition is revalidated first (see `load`).
+        """
 
-        if always_refresh:
-            cls.invalidate(still_id)
+        with cls.lock:
+            cls.load(task_id, task_root=task_root)
 
-        # TODO: this might be a bit inefficient to create json string for every access
-        json_params = json.dumps(parameters, sort_keys=True)
+            return cls.generations.get(task_id, 0)
 
-        if still_id not in cls.cached_spirits:
-            cls.cached_spirits[still_id] = {}
+    @classmethod
+    def __revalidate(cls, task_id, task_def):
+        """Returns if the cached definition of a task is still valid, drops all cached data of the task otherwise"""
 
-        if json_params in cls.cached_spirits[still_id]:
-            return cls.cached_spirits[still_id][json_params]
+        cached = cls.cached_tasks.get(task_id, None)
 
-        if none_on_error:
-            try:
-                spirit_instance = cls.load(still_id, task_root=task_root)(parameters)
-            except TaskLoadError:
-                return None
-        else:
-            spirit_instance = cls.load(still_id, task_root=task_root)(parameters)
-        cls.cached_spirits[still_id][json_params] = spirit_instance
+        if cached is None:
+            return False
+
+        if cached.definition_path == task_def:
+            now = time.monotonic()
+
+            if now - cached.validated_at < cls.revalidate_interval:
+                return True
+
+            if file_signature(task_def) == cached.signature:
+                cached.validated_at = now
+                return True
+
+        cls.invalidate(task_id)
+
+        return False
+
+    @classmethod
+    def fingerprint(cls, spirit, task_root=None):
+        """Returns a digest of the definition file and all declared definition files of a spirit's still
+        Missing files are part of the fingerprint as well.
+        """
+
+        with cls.lock:
+            still_id = spirit.name()
+            task_path = PathFinder.get_task_path(still_id, task_root=task_root)
+            definition_files = ["definition.py"] + sorted(set(spirit.definition_files()))
+            file_paths = [os.path.join(task_path, file_name) for file_name in definition_files]
+
+            # Fingerprints are recomputed only if any of the files changed
+            key = tuple((file_path, file_signature(file_path)) for file_path in file_paths)
+
+            cached = cls.cached_fingerprints.get(still_id, None)
+
+            # Only the fingerprint of the latest files is kept
+            if cached is None or cached[0] != key:
+                fingerprint = hashlib.sha256()
+
+                for file_name, file_path in zip(definition_files, file_paths):
+                    fingerprint.update(file_name.encode("utf-8") + b"\0")
 
-        return spirit_instance
+                    if os.path.isfile(file_path):
+                        with open(file_path, "rb") as f:
+                            fingerprint.update(hashlib.sha256(f.read()).digest())
+                    else:
+                        fingerprint.update(b"missing")
+
+                cached = (key, fingerprint.hexdigest())
+                cls.cached_fingerprints[still_id] = cached
+
+            return cached[1]
+
+    @classmethod
+    def definition_changed(cls, spirit, fingerprint, task_root=None):
+        """Returns if the still definition of spirit differs from the one with the given fingerprint
+        An unknown fingerprint (None) is never considered as changed
+        """
+
+        return fingerprint is not None and fingerprint != cls.fingerprint(spirit, task_root=task_root)
+
+    @classmethod
+    def init(cls, spirit_id, task_root=None, always_refresh=False, none_on_error=False, cached=True):
+        with cls.lock:
+            spirit_id = SpiritId(spirit_id)
+            still_id, parameters = spirit_id
+
+            if always_refresh:
+                cls.invalidate(still_id)
+
+            if none_on_error:
+                try:
+                    task_class = cls.load(still_id, task_root=task_root)
+                except TaskLoadError:
+                    return None
+            else:
+                task_class = cls.load(still_id, task_root=task_root)
+
+            if not cached:
+                return task_class(parameters)
+
+            spirit_instance = cls.cached_spirits.get(spirit_id, None)
+
+            if spirit_instance is not None:
+                cls.cached_spirits.move_to_end(spirit_id)
+                return spirit_instance
+
+            spirit_instance = task_class(parameters)
+
+            cls.cached_spirits[spirit_id] = spirit_instance
+            cls.cached_spirit_keys.setdefault(still_id, set()).add(spirit_id)
+
+            # Drop least recently used spirits
+            while len(cls.cached_spirits) > cls.max_cached_spirits:
+                old_spirit_id, _ = cls.cached_spirits.popitem(last=False)
+                cls.cached_spirit_keys[old_spirit_id.still_id].discard(old_spirit_id)
+
+            return spirit_instance
 
     @classmethod
     def spirit_is_pipe(cls, spirit):
@@ -102,5 +228,25 @@ class TaskLoader:
             for dep in deps
         ]
 
+
+class CachedTask:
+    def __init__(self, task_class, definition_path, signature):
+        self.task_class = task_class
+        self.definition_path = definition_path
+        self.signature = signature
+        self.validated_at = time.monotonic()
+
+
+def file_signature(file_path):
+    """Returns a cheap signature of a file's content (modification time, size), None if the file is missing"""
+
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
 class TaskLoadError(Exception):
     pass
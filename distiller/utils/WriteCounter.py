@@ -0,0 +1,57 @@
+from distiller.api.Writer import Writer, WriteModes
+
+
+class CountingWriteModes(WriteModes):
+    """Wraps the write modes of a driver to count the rows and bytes written by a runner.
+    Bytes are only counted for blob (str/bytes) writes.
+    The content digest of the last committed writer is kept in `digest`.
+    """
+
+    def __init__(self, write_modes):
+        self.write_modes = write_modes
+        self.rows = 0
+        self.bytes = 0
+        self.digest = None
+
+    def replace(self):
+        return CountingWriter(self, self.write_modes.replace())
+
+    def update(self, key):
+        return CountingWriter(self, self.write_modes.update(key))
+
+    def append(self):
+        return CountingWriter(self, self.write_modes.append())
+
+
+class CountingWriter(Writer):
+    def __init__(self, counter, writer):
+        self.counter = counter
+        self.writer = writer
+
+    def write(self, data):
+        self.writer.write(data)
+
+        self.counter.rows += 1
+
+        if isinstance(data, str):
+            self.counter.bytes += len(data.encode("utf-8"))
+        elif isinstance(data, (bytes, bytearray)):
+            self.counter.bytes += len(data)
+
+    def commit(self):
+        result = self.writer.commit()
+
+        self.counter.digest = self.writer.digest()
+
+        return result
+
+    def digest(self):
+        return self.writer.digest()
+
+    def __enter__(self):
+        self.writer.__enter__()
+
+        return self
+
+    def __exit__(self, type, value, traceback):
+        return self.writer.__exit__(type, value, traceback)
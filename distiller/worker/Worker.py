@@ -1,18 +1,25 @@
+import collections
 import tempfile
 import shutil
 import importlib
 import traceback
 import threading
 import time
+import socket
+import os
 
 from distiller.utils.Remote import Remote
 from distiller.core.interfaces.Scheduler import FinishState
 from distiller.utils.TaskLoader import TaskLoader, TaskLoadError
 from distiller.utils.Configuration import Configuration
 from distiller.utils.PathFinder import PathFinder
+from distiller.utils.WriteCounter import CountingWriteModes
 
 
 class Worker:
+    # Maximum number of extracted definition bundles kept between jobs
+    max_cached_bundles = 10
+
     def __init__(self, host, port, auto_conf=False):
         self.remote = Remote(host, port)
 
@@ -28,63 +35,104 @@ class Worker:
 
         self.task_dir = None
 
+        # Extracted task definitions are kept in bundle_root/<digest>, digests in order of last use
+        self.bundle_root = None
+        self.bundle_digests = collections.OrderedDict()
+
+        # Worker id reported with each finished job for the execution history
+        self.worker_id = self.config.get("worker.id", None)
+
+        if self.worker_id is None:
+            self.worker_id = "%s:%i" % (socket.gethostname(), os.getpid())
+
     def run_blocking(self):
         print("Worker running...")
+
+        # Job handed out by the daemon together with the result of the previous one
+        next_job = None
+
         while True:
-            job = self.__request_job()
+            job = next_job if next_job is not None else self.__request_job()
+            next_job = None
 
-            if job is not None:
-                try:
-                    self.__load_tasks()
-                except Exception as e:
-                    print(e)
-                    self.__finish_job(job, FinishState.WORKER_ERROR, e)
-                else:
-                    self.__run_job(job)
+            if job is None:
+                continue
 
-                try:
-                    shutil.rmtree(self.task_dir)
-                except Exception as e:
-                    print(e)
-                finally:
-                    self.task_dir = None
+            try:
+                self.__load_tasks(job)
+            except Exception as e:
+                print(e)
+                next_job = self.__finish_job(job, FinishState.WORKER_ERROR, e)
             else:
-                # TODO: dynamic, wait_until
-                time.sleep(5)
+                next_job = self.__run_job(job)
 
     def __auto_conf(self):
         return Configuration(self.remote.fetch_worker_conf())
 
     def __request_job(self):
+        """Request the next job, the daemon waits up to `worker.long_poll` seconds for one to become runnable
+        Returns None if there is no job (after waiting for it)
+        """
+
+        long_poll = self.config.get("worker.long_poll", 30)
+        poll_interval = self.config.get("worker.poll_interval", 5)
+        started = time.monotonic()
+        wait_until = None
+
         try:
-            res = self.remote.run_next()
+            res = self.remote.run_next(wait=long_poll)
 
             if res.get("transaction_id", None) is not None:
                 return res
 
-            # TODO: wait_until
+            wait_until = res.get("wait_until", None)
         except Exception as e:
             print(e)
 
+        # The daemon answered early without a job if it did not wait (e.g. too many waiting workers or on errors),
+        # poll again once the next spirit is due
+        remaining = long_poll - (time.monotonic() - started)
+
+        if remaining > 0:
+            time.sleep(min(remaining, poll_interval if not wait_until else min(wait_until, poll_interval)))
+
         return None
 
-    def __load_tasks(self):
-        # TODO: preserve downloaded tasks if there was no commit of new scripts
-        self.task_dir = tempfile.mkdtemp()
-        self.remote.download_tasks(self.task_dir)
+    def __load_tasks(self, job):
+        if self.bundle_root is None:
+            self.bundle_root = tempfile.mkdtemp(prefix="distiller-tasks-")
+
+        # Only the definitions needed for the job, they are only downloaded and extracted if none is up to date
+        digest = self.remote.download_spirit_tasks(
+            job["spirit_id"],
+            self.bundle_root,
+            digests=list(self.bundle_digests.keys())
+        )
+
+        self.bundle_digests[digest] = True
+        self.bundle_digests.move_to_end(digest)
+
+        while len(self.bundle_digests) > self.max_cached_bundles:
+            old_digest, _ = self.bundle_digests.popitem(last=False)
+            shutil.rmtree(os.path.join(self.bundle_root, old_digest), ignore_errors=True)
+
+        self.task_dir = os.path.join(self.bundle_root, digest)
 
     def __run_job(self, job):
+        """Run a job, returns the next job handed out by the daemon (see `__finish_job`)"""
+
         try:
-            spirit = TaskLoader.init(job["spirit_id"], task_root=self.task_dir)
+            # A private instance, the spirit might keep state while it is executed
+            spirit = TaskLoader.init(job["spirit_id"], task_root=self.task_dir, cached=False)
         except TaskLoadError:
             trace = traceback.format_exc()
             print("Could not load job %s" % job)
             print(trace)
-            self.__finish_job(job, FinishState.LOAD_ERROR, message=trace)
+            return self.__finish_job(job, FinishState.LOAD_ERROR, message=trace)
         except Exception:
             trace = traceback.format_exc()
             print("Aborted job %s with error %s" % (job, trace))
-            self.__finish_job(job, FinishState.WORKER_ERROR, message=trace)
+            return self.__finish_job(job, FinishState.WORKER_ERROR, message=trace)
         else:
             # Run spirit with runner, and send different finish states
             # depending on if there was an execution error, unit test error, abort, or success
@@ -92,14 +140,16 @@ class Worker:
             try:
                 dep_input = TaskLoader.load_dependencies(spirit, self.config, default_driver=self.default_driver)
 
-                if spirit.stored_in() is None:
-                    writer = self.default_driver.write(spirit, self.config)
-                else:
-                    writer = spirit.stored_in().write(spirit, self.config)
+                driver = spirit.stored_in()
+
+                if driver is None:
+                    driver = self.default_driver
+
+                writer = CountingWriteModes(driver.write(spirit, self.config))
             except Exception:
                 trace = traceback.format_exc()
                 print("Aborted spirit %s with error %s" % (spirit, trace))
-                self.__finish_job(job, FinishState.LOAD_ERROR, message=trace)
+                return self.__finish_job(job, FinishState.LOAD_ERROR, message=trace)
             else:
                 do_heartbeat = True
 
@@ -126,12 +176,31 @@ class Worker:
                 except Exception:
                     trace = traceback.format_exc()
                     print("Aborted spirit %s with error %s" % (spirit, trace))
-                    self.__finish_job(job, FinishState.EXEC_ERROR, message=trace)
+                    next_job = self.__finish_job(job, FinishState.EXEC_ERROR, message=trace)
                 else:
                     print("Completed spirit %s" % spirit)
-                    self.__finish_job(job, FinishState.SUCCESS)
+
+                    cask_size = driver.cask_size(spirit, self.config)
+
+                    next_job = self.__finish_job(job, FinishState.SUCCESS, stats={
+                        "rows": writer.rows,
+                        "bytes": writer.bytes if cask_size is None else cask_size,
+                        "digest": writer.digest
+                    })
 
                 do_heartbeat = False
 
-    def __finish_job(self, job, finish_state, message=None):
-        self.remote.finish_task(job["transaction_id"], finish_state, message)
+                return next_job
+
+    def __finish_job(self, job, finish_state, message=None, stats=None):
+        """Report a finished job, returns the next job if the daemon has one runnable right away"""
+
+        stats = dict(stats or {}, worker=self.worker_id)
+
+        res = self.remote.finish_task(job["transaction_id"], finish_state, message, stats=stats, next_job=True)
+        next_job = res.get("next", None)
+
+        if next_job is None or next_job.get("transaction_id", None) is None:
+            return None
+
+        return next_job